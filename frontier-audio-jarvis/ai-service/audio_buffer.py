@@ -0,0 +1,167 @@
+"""
+Bounded recording buffers
+Per-session caps on recording size and duration, plus a process-wide memory budget
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+
+
+class AudioLimitExceeded(Exception):
+    """Raised by AudioBuffer.append when a chunk would exceed a limit"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason  # "bytes", "duration" or "memory"
+
+
+class AudioMemoryBudget:
+    """
+    Caps the bytes allocated to recording buffers across all sessions.
+    A session that needs more memory waits for others to release theirs; since
+    the waiting happens in the websocket reader, the client is throttled by TCP
+    flow control instead of the process growing without bound.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.waits = 0
+        self.timeouts = 0
+        self._waiting = 0
+        self._released = asyncio.Condition()
+
+    async def acquire(self, size: int, timeout: float) -> bool:
+        """Reserve `size` bytes, waiting up to `timeout` seconds. Returns False on timeout."""
+        if self.used + size <= self.max_bytes:
+            self.used += size
+            return True
+        self.waits += 1
+        self._waiting += 1
+        try:
+            async with self._released:
+                await asyncio.wait_for(
+                    self._released.wait_for(lambda: self.used + size <= self.max_bytes),
+                    timeout
+                )
+                self.used += size
+                return True
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return False
+        finally:
+            self._waiting -= 1
+
+    def release(self, size: int):
+        self.used = max(0, self.used - size)
+        if self._waiting:
+            asyncio.get_running_loop().create_task(self._notify())
+
+    async def _notify(self):
+        async with self._released:
+            self._released.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        return {"used": self.used, "limit": self.max_bytes, "waits": self.waits, "timeouts": self.timeouts}
+
+
+class AudioBuffer:
+    """
+    Recording buffer with a hard size and duration cap.
+
+    Storage is one preallocated bytearray that grows by doubling (so a
+    recording reallocates O(log n) times instead of on every extend) and is
+    reused across recordings. Growth is charged against the shared budget.
+    Slices are zero-copy memoryviews, so Whisper uploads read straight from it.
+    """
+
+    def __init__(self, max_bytes: int, max_seconds: float = 0, budget: Optional[AudioMemoryBudget] = None,
+                 initial_capacity: int = 256 * 1024, backpressure_timeout: float = 5.0):
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.budget = budget
+        self.initial_capacity = min(initial_capacity, max_bytes)
+        self.backpressure_timeout = backpressure_timeout
+        self.started_at: Optional[float] = None
+        self._data = bytearray()
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("AudioBuffer only supports slicing")
+        return memoryview(self._data)[:self._length][index]
+
+    def find(self, sub: bytes, start: int = 0) -> int:
+        return self._data.find(sub, start, self._length)
+
+    def rfind(self, sub: bytes, start: int = 0) -> int:
+        return self._data.rfind(sub, start, self._length)
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    def start(self):
+        """Begin a new recording (clears any leftover audio and restarts the duration clock)"""
+        self.clear()
+        self.started_at = time.monotonic()
+
+    async def append(self, data: bytes):
+        """
+        Args:
+            data: Audio chunk
+
+        Raises:
+            AudioLimitExceeded: The chunk would exceed the size or duration cap, or the
+                memory budget stayed exhausted for `backpressure_timeout` seconds.
+                The chunk is not stored.
+        """
+        needed = self._length + len(data)
+        if needed > self.max_bytes:
+            raise AudioLimitExceeded("bytes", f"Recording exceeds {self.max_bytes} bytes")
+        if self.max_seconds and self.started_at is not None \
+                and time.monotonic() - self.started_at > self.max_seconds:
+            raise AudioLimitExceeded("duration", f"Recording exceeds {self.max_seconds:g} seconds")
+        if needed > len(self._data):
+            await self._grow(needed)
+        self._data[self._length:needed] = data
+        self._length = needed
+
+    async def _grow(self, needed: int):
+        capacity = max(len(self._data), self.initial_capacity)
+        while capacity < needed:
+            capacity *= 2
+        capacity = min(capacity, self.max_bytes)
+        extra = capacity - len(self._data)
+        if self.budget and not await self.budget.acquire(extra, self.backpressure_timeout):
+            raise AudioLimitExceeded("memory", "Audio memory budget exhausted")
+        # A new array rather than an in-place resize: views handed out earlier stay valid
+        data = bytearray(capacity)
+        data[:self._length] = memoryview(self._data)[:self._length]
+        self._data = data
+
+    def clear(self):
+        """Drop the recording; the allocation is kept for the next one unless it grew large"""
+        self._length = 0
+        self.started_at = None
+        if len(self._data) > self.initial_capacity:
+            self._free()
+
+    def close(self):
+        """Release all memory back to the budget (session ended)"""
+        self._length = 0
+        self._free()
+
+    def _free(self):
+        if self.budget and self._data:
+            self.budget.release(len(self._data))
+        self._data = bytearray()
+
+
+def create_audio_budget() -> AudioMemoryBudget:
+    return AudioMemoryBudget(int(os.getenv("AUDIO_MEMORY_BUDGET_BYTES", str(512 * 1024 * 1024))))
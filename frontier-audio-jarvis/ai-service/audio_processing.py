@@ -0,0 +1,343 @@
+"""
+Server-side audio processing
+Voice activity detection on incoming WebM/Opus recordings (end-of-speech
+detection, leading/trailing silence trimming) and transcoding before upload
+"""
+
+import asyncio
+import io
+import resource
+import time
+from concurrent.futures import Executor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydub import AudioSegment
+from pydub.utils import which
+
+from log import get_logger
+from transcription_service import WEBM_CLUSTER_ID
+
+logger = get_logger("audio")
+
+# Matroska Timecode element: the first child of every Cluster (ms at the default timecode scale)
+CLUSTER_TIMECODE_ID = 0xE7
+
+
+def decoder_available() -> bool:
+    """pydub decodes WebM by shelling out to ffmpeg (or avconv)"""
+    return which(AudioSegment.converter) is not None
+
+
+def frame_levels(webm: bytes, frame_ms: int) -> Tuple[List[float], int]:
+    """
+    Decode a WebM fragment and measure its loudness (blocking: runs ffmpeg)
+
+    Args:
+        webm: Stream header followed by one or more clusters
+        frame_ms: Analysis frame length
+
+    Returns:
+        (dBFS of each frame, decoded duration in ms)
+    """
+    # Forcing the codec skips pydub's ffprobe pass; browsers record WebM audio as Opus
+    segment = AudioSegment.from_file(io.BytesIO(webm), format="webm", codec="opus").set_channels(1)
+    levels = [segment[i:i + frame_ms].dBFS for i in range(0, len(segment), frame_ms)]
+    return levels, len(segment)
+
+
+def _first_line(error: Exception) -> str:
+    """pydub decode errors carry ffmpeg's whole stderr; the first line says what failed"""
+    return str(error).strip().split("\n", 1)[0]
+
+
+def _read_vint(data: bytes, pos: int) -> Tuple[Optional[int], int]:
+    """EBML variable-length integer at `pos`; returns (value, length), or (None, 0) if incomplete"""
+    if pos >= len(data) or data[pos] == 0:
+        return None, 0
+    length = 9 - data[pos].bit_length()
+    if pos + length > len(data):
+        return None, 0
+    value = data[pos] & (0xFF >> length)
+    for byte in data[pos + 1:pos + length]:
+        value = (value << 8) | byte
+    return value, length
+
+
+def cluster_timecode(buffer, offset: int) -> Optional[int]:
+    """Timecode of the cluster starting at `offset`, or None if it can't be read"""
+    data = bytes(buffer[offset:offset + 24])
+    pos = len(WEBM_CLUSTER_ID)
+    _, size_length = _read_vint(data, pos)
+    pos += size_length
+    if not size_length or pos >= len(data) or data[pos] != CLUSTER_TIMECODE_ID:
+        return None
+    length, length_size = _read_vint(data, pos + 1)
+    pos += 1 + length_size
+    if not length_size or not length or length > 8 or pos + length > len(data):
+        return None
+    return int.from_bytes(data[pos:pos + length], "big")
+
+
+class VoiceActivityDetector:
+    """
+    Energy-based end-of-speech detection over a WebM recording as it arrives.
+
+    Works on cluster boundaries like StreamingTranscriber: every
+    `interval_seconds` the audio from the last complete cluster onwards is
+    decoded (prefixed with the stream header) and split into frames. A frame
+    louder than `threshold_dbfs` is speech; once `min_speech_ms` of speech
+    has been heard, `end_silence_ms` of silence ends the utterance.
+
+    Every analysed cluster keeps its start time, so silence can be trimmed
+    by dropping whole clusters at either end, without re-encoding.
+    """
+
+    def __init__(
+        self,
+        decode: Callable[[bytes, int], Awaitable[Tuple[List[float], int]]],
+        threshold_dbfs: float = -45.0,
+        end_silence_ms: int = 800,
+        min_speech_ms: int = 250,
+        padding_ms: int = 300,
+        frame_ms: int = 30,
+        interval_seconds: float = 0.3
+    ):
+        self.decode = decode
+        self.threshold_dbfs = threshold_dbfs
+        self.end_silence_ms = end_silence_ms
+        self.min_speech_ms = min_speech_ms
+        self.padding_ms = padding_ms
+        self.frame_ms = frame_ms
+        self.interval_seconds = interval_seconds
+        self.header: Optional[bytes] = None
+        self.clusters: List[Tuple[int, float]] = []  # (byte offset, start ms), in order
+        self.analysed_to = 0  # Start of the last cluster seen, which may still be growing
+        self.analysed_ms = 0.0
+        self.heard_ms = 0.0  # End of the audio decoded so far
+        self.speech_ms = 0  # Speech in the clusters before analysed_to
+        self.first_speech_ms: Optional[float] = None
+        self.last_speech_ms: Optional[float] = None
+        self.speech_ended = False
+        self.failed = False
+        self._first_timecode: Optional[int] = None
+        self._last_run = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def on_audio(self, buffer):
+        """Call after each chunk is appended to the recording buffer; analyses in the background when due"""
+        if self.failed or self.speech_ended or (self._task and not self._task.done()):
+            return
+        if self.header is None:
+            first_cluster = buffer.find(WEBM_CLUSTER_ID)
+            if first_cluster < 0:
+                return
+            self.header = bytes(buffer[:first_cluster])
+            self.analysed_to = first_cluster
+            self.clusters.append((first_cluster, 0.0))
+            self._first_timecode = cluster_timecode(buffer, first_cluster)
+            self._last_run = time.monotonic()
+            return
+        if time.monotonic() - self._last_run < self.interval_seconds:
+            return
+        self._last_run = time.monotonic()
+        self._task = asyncio.create_task(self.analyse(buffer))
+
+    async def finish(self, buffer):
+        """Analyse whatever arrived after the last background pass (call once the recording has ended)"""
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+        if not self.speech_ended:
+            await self.analyse(buffer)
+
+    def cancel(self):
+        if self._task:
+            self._task.cancel()
+
+    async def analyse(self, buffer) -> bool:
+        """
+        Decode and classify the audio since the last complete cluster
+
+        Returns:
+            True once the utterance has ended
+        """
+        end = len(buffer)
+        start, start_ms = self.analysed_to, self.analysed_ms
+        if self.failed or self.header is None or end <= start:
+            return self.speech_ended
+        try:
+            levels, duration = await self.decode(self.header + bytes(buffer[start:end]), self.frame_ms)
+        except Exception as e:
+            # Undecodable audio: stop analysing and leave the recording untouched
+            logger.warning("Voice activity detection disabled for this recording: %s", _first_line(e))
+            self.failed = True
+            return False
+        self.heard_ms = start_ms + duration
+
+        speech = [start_ms + i * self.frame_ms for i, level in enumerate(levels) if level > self.threshold_dbfs]
+        if speech:
+            if self.first_speech_ms is None:
+                self.first_speech_ms = speech[0]
+            self.last_speech_ms = max(self.last_speech_ms or 0.0, speech[-1] + self.frame_ms)
+
+        # Clusters completed in this pass won't be decoded again; the last one may still grow
+        for offset, at in self._cluster_starts(buffer, start, end, start_ms, duration):
+            self.clusters.append((offset, at))
+            self.analysed_to, self.analysed_ms = offset, at
+        completed = sum(self.frame_ms for at in speech if at < self.analysed_ms)
+        self.speech_ms += completed
+        heard_speech = self.speech_ms + len(speech) * self.frame_ms - completed
+
+        if self.last_speech_ms is not None and heard_speech >= self.min_speech_ms \
+                and self.heard_ms - self.last_speech_ms >= self.end_silence_ms:
+            self.speech_ended = True
+        return self.speech_ended
+
+    def _cluster_starts(self, buffer, start: int, end: int, start_ms: float, duration: int):
+        """(offset, start ms) of the clusters beginning after `start`, from their timecodes where readable"""
+        offset = buffer.find(WEBM_CLUSTER_ID, start + 1)
+        while 0 <= offset < end:
+            timecode = cluster_timecode(buffer, offset)
+            if timecode is not None and self._first_timecode is not None:
+                at = float(timecode - self._first_timecode)
+            else:
+                # No usable timecode: assume a roughly constant bitrate across the pass
+                at = start_ms + duration * (offset - start) / (end - start)
+            if start_ms < at <= start_ms + duration:
+                yield offset, at
+            offset = buffer.find(WEBM_CLUSTER_ID, offset + 1)
+
+    @property
+    def no_speech(self) -> bool:
+        """Audio was analysed and none of it was speech"""
+        return not self.failed and self.heard_ms > 0 and self.first_speech_ms is None
+
+    def silent_until(self) -> int:
+        """Byte offset (a cluster start) before which the recording is silence, padding excluded"""
+        if self.failed or not self.clusters:
+            return 0
+        limit = self.first_speech_ms if self.first_speech_ms is not None else self.analysed_ms
+        return max(offset for offset, at in self.clusters if at <= max(0.0, limit - self.padding_ms))
+
+    def trim_range(self, length: int) -> Tuple[int, int]:
+        """
+        Byte range of the recording worth uploading: from the cluster where speech
+        starts to the one after it ends, each widened by `padding_ms`
+
+        Args:
+            length: Recording size in bytes
+
+        Returns:
+            (start, end) offsets; start is either 0 (keep everything) or a cluster
+            start, to be prefixed with `header`
+        """
+        if self.failed or self.first_speech_ms is None:
+            return 0, length
+        start = self.silent_until()
+        if start == self.clusters[0][0]:
+            start = 0
+        end = min((offset for offset, at in self.clusters if at >= self.last_speech_ms + self.padding_ms), default=length)
+        return start, end
+
+    def trimmed(self, buffer):
+        """The recording with leading and trailing silence removed (a zero-copy view when only the tail is cut)"""
+        start, end = self.trim_range(len(buffer))
+        if start == 0:
+            return buffer[:end]
+        return self.header + bytes(buffer[start:end])
+
+
+# Upload file names by transcode format; Whisper picks the container from the extension
+UPLOAD_NAMES = {"opus": "audio.ogg", "flac": "audio.flac"}
+
+
+def _cpu_seconds() -> float:
+    """CPU time of this process plus its finished children (the ffmpeg runs)"""
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def transcode_audio(webm: bytes, fmt: str = "opus", bitrate: str = "24k") -> Tuple[bytes, float, float]:
+    """
+    Re-encode a WebM recording as mono 16 kHz Opus (in Ogg) or FLAC (blocking: runs ffmpeg)
+
+    Args:
+        webm: Complete WebM recording
+        fmt: "opus" or "flac"
+        bitrate: Opus bitrate (FLAC is lossless and ignores it)
+
+    Returns:
+        (encoded audio, CPU seconds spent, audio duration in seconds)
+    """
+    started = _cpu_seconds()
+    segment = AudioSegment.from_file(io.BytesIO(webm), format="webm", codec="opus")
+    # Whisper resamples to 16 kHz mono anyway, so nothing it uses is lost
+    segment = segment.set_channels(1).set_frame_rate(16000)
+    out = io.BytesIO()
+    if fmt == "flac":
+        segment.export(out, format="flac")
+    else:
+        # Complexity 5 halves encoder CPU against the default 10 at the same size for speech
+        segment.export(out, format="ogg", codec="libopus", bitrate=bitrate,
+                       parameters=["-application", "voip", "-compression_level", "5"])
+    return out.getvalue(), _cpu_seconds() - started, segment.duration_seconds
+
+
+class Transcoder:
+    """
+    Shrinks large recordings before they are uploaded to Whisper.
+
+    Recordings of at least `min_bytes` are re-encoded on `executor` (a
+    process pool: decoding and resampling hold the GIL); smaller ones, and
+    any whose re-encoding fails or comes out no smaller, go up unchanged.
+    """
+
+    def __init__(self, executor: Executor, fmt: str = "opus", bitrate: str = "24k", min_bytes: int = 256 * 1024):
+        self.executor = executor
+        self.format = fmt
+        self.bitrate = bitrate
+        self.min_bytes = min_bytes
+        self._stats = {
+            "transcoded": 0, "skipped_small": 0, "skipped_larger": 0, "failed": 0,
+            "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0, "audio_seconds": 0.0
+        }
+
+    async def transcode(self, audio, name: str = "audio.webm"):
+        """
+        Args:
+            audio: WebM recording (bytes-like)
+            name: Upload file name to use if the recording is left as is
+
+        Returns:
+            (audio to upload, its file name)
+        """
+        if len(audio) < self.min_bytes:
+            self._stats["skipped_small"] += 1
+            return audio, name
+        loop = asyncio.get_running_loop()
+        try:
+            data, cpu_seconds, audio_seconds = await loop.run_in_executor(
+                self.executor, transcode_audio, bytes(audio), self.format, self.bitrate
+            )
+        except Exception as e:
+            logger.warning("Transcoding failed, uploading the original recording: %s", _first_line(e))
+            self._stats["failed"] += 1
+            return audio, name
+        self._stats["cpu_seconds"] += cpu_seconds
+        self._stats["audio_seconds"] += audio_seconds
+        if len(data) >= len(audio):
+            self._stats["skipped_larger"] += 1
+            return audio, name
+        self._stats["transcoded"] += 1
+        self._stats["bytes_in"] += len(audio)
+        self._stats["bytes_out"] += len(data)
+        logger.debug("Transcoded %d bytes to %d (%s, %.2fs CPU for %.1fs of audio)",
+                     len(audio), len(data), self.format, cpu_seconds, audio_seconds)
+        return data, UPLOAD_NAMES[self.format]
+
+    def warm_up(self):
+        """Start the worker processes now rather than on the first large upload"""
+        for _ in range(getattr(self.executor, "_max_workers", 1)):
+            self.executor.submit(decoder_available)
+
+    def stats(self) -> Dict[str, float]:
+        return dict(self._stats)
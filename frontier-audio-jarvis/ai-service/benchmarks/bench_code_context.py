@@ -0,0 +1,58 @@
+"""
+GitHub code context: sequential vs. concurrent file fetches
+
+Runs get_code_context against the fake GitHub API in stubs.py, with a fixed
+latency per request, once with a single fetch worker and once with the
+configured pool. Reports wall time, the size of the context in tokens and
+the best-ranked snippet.
+
+Usage:
+    python benchmarks/bench_code_context.py [--files 4] [--latency 0.1] [--query "..."]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import stubs
+from context_window import ContextWindow
+from github_service import GitHubService
+from http_client import HTTPClient
+
+
+def measure(name, workers, args, count_tokens):
+    http = HTTPClient()
+    http.session.mount("https://api.github.com/", stubs.StubHTTPAdapter(stubs.Latency(github=args.latency)))
+    github = GitHubService(http)
+    github.cache = None
+    github.context_files = args.files
+    if workers:
+        github._pool = ThreadPoolExecutor(workers)
+    start = time.perf_counter()
+    context = github.get_code_context(args.query, count_tokens)
+    wall = time.perf_counter() - start
+    tokens = count_tokens(context) if context else 0
+    print(f"{name:<12}{wall * 1000:>10.0f}{tokens:>10}{http.metrics()['api.github.com']['requests']:>10}")
+    return context
+
+
+def main(args):
+    count_tokens = ContextWindow(client=None).count_text_tokens
+    print(f"latency per request: {args.latency * 1000:.0f} ms, files: {args.files}")
+    print(f"{'fetch':<12}{'wall ms':>10}{'tokens':>10}{'requests':>10}")
+    measure("sequential", 1, args, count_tokens)
+    context = measure("concurrent", None, args, count_tokens)
+    if context:
+        print("\n" + context.split("\n\n")[1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds per GitHub request")
+    parser.add_argument("--query", default="show me example code for a websocket server")
+    main(parser.parse_args())
@@ -0,0 +1,246 @@
+"""
+End-to-end latency benchmark for the /ws/ai pipeline
+
+Serves the real FastAPI app with uvicorn in-process, with OpenAI, Tavily,
+DuckDuckGo and GitHub replaced by local stand-ins (see stubs.py). N
+simulated clients stream WebM chunks at a fixed pace, send stop_recording,
+and time each turn from stop_recording to:
+
+    transcription   final transcription message
+    first_text      ai_response message
+    first_audio     first audio_start frame
+    done            last audio_end of the turn
+
+Usage:
+    python benchmarks/bench_e2e.py [--clients 8] [--turns 3] [--scenario mix]
+    python benchmarks/bench_e2e.py --no-stream-responses --token-delay 0.03
+    python benchmarks/bench_e2e.py --tts-cache   # repeated sentences served from a fresh TTS cache
+    python benchmarks/bench_e2e.py --no-tts-policy   # fixed tts-1-hd / MP3 for comparison
+    python benchmarks/bench_e2e.py --scenario code --github-code-search-limit 2 [--no-github-rate-limiter]
+    python benchmarks/bench_e2e.py --scenario tools [--no-parallel-tool-calls]   # web search + weather in one turn
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-stub")
+
+import uvicorn
+import websockets
+
+import main
+import stubs
+from github_cache import GitHubCache
+from github_rate_limit import AUTHENTICATED_LIMITS, GitHubRateLimiter
+from metrics import stage_seconds
+from tts_cache import TTSCache
+from tts_policy import TTSPolicy, tts_first_audio_seconds
+
+EBML_HEADER = b"\x1a\x45\xdf\xa3" + b"\x00" * 60
+CLUSTER_ID = b"\x1f\x43\xb6\x75"
+
+SCENARIOS = {
+    "chat": "tell me something interesting about streaming audio",
+    "search": "search for the latest python release",
+    "code": "show me example code for a websocket server",
+    "tools": "search for the latest python release and the weather in Paris",
+}
+
+
+def webm_chunks(utterance: str, chunks: int, chunk_bytes: int):
+    """Synthetic WebM: EBML header, then one cluster per chunk; the last cluster carries the utterance"""
+    yield EBML_HEADER
+    for i in range(chunks):
+        payload = CLUSTER_ID + bytes(chunk_bytes - len(CLUSTER_ID))
+        if i == chunks - 1:
+            payload += stubs.UTTERANCE_MARKER + utterance.encode() + b"\0"
+        yield payload
+
+
+async def run_turn(ws, utterance, args):
+    for chunk in webm_chunks(utterance, args.chunks, args.chunk_bytes):
+        await ws.send(chunk)
+        await asyncio.sleep(args.chunk_interval)
+
+    start = time.perf_counter()
+    await ws.send(json.dumps({"type": "stop_recording"}))
+    timings = {}
+    open_streams = 0
+    audio_bytes = 0
+
+    while True:
+        try:
+            timeout = args.settle if "first_text" in timings and open_streams == 0 else args.turn_timeout
+            message = await asyncio.wait_for(ws.recv(), timeout)
+        except asyncio.TimeoutError:
+            break
+        now = time.perf_counter() - start
+        if isinstance(message, bytes):
+            audio_bytes += len(message)
+            continue
+        data = json.loads(message)
+        kind = data.get("type")
+        if kind == "transcription" and not data.get("partial"):
+            timings.setdefault("transcription", now)
+        elif kind == "ai_response":
+            timings.setdefault("first_text", now)
+        elif kind == "audio_start":
+            timings.setdefault("first_audio", now)
+            open_streams += 1
+        elif kind == "audio_end":
+            open_streams -= 1
+            timings["done"] = now
+        elif kind == "error":
+            timings["error"] = data.get("message")
+            break
+
+    timings.setdefault("done", timings.get("first_text"))
+    timings["audio_bytes"] = audio_bytes
+    return timings
+
+
+async def run_client(url, index, args):
+    names = list(SCENARIOS) if args.scenario == "mix" else [args.scenario]
+    results = []
+    if args.audio_formats:
+        url += "?audio_formats=" + ",".join(args.audio_formats)
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.recv()  # connection confirmation
+        for turn in range(args.turns):
+            utterance = SCENARIOS[names[(index + turn) % len(names)]]
+            results.append(await run_turn(ws, utterance, args))
+    return results
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def report(results, wall, args):
+    turns = [t for client in results for t in client]
+    errors = [t for t in turns if "error" in t]
+    print(f"\nclients={args.clients} turns/client={args.turns} scenario={args.scenario} "
+          f"stream_responses={main.STREAM_RESPONSES} streaming_transcription={main.STREAMING_TRANSCRIPTION}")
+    print(f"{'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for stage in ("transcription", "first_text", "first_audio", "done"):
+        values = [t[stage] * 1000 for t in turns if isinstance(t.get(stage), float)]
+        if values:
+            print(f"{stage:<16}{percentile(values, 0.5):>10.0f}{percentile(values, 0.95):>10.0f}{max(values):>10.0f}")
+    audio = sum(t["audio_bytes"] for t in turns)
+    print(f"\nturns={len(turns)} errors={len(errors)} wall={wall:.2f}s "
+          f"throughput={len(turns) / wall:.2f} turns/s audio={audio / wall / 1024:.0f} KiB/s "
+          f"llm_calls/turn={main.client.stats['chat_calls'] / max(len(turns), 1):.2f}")
+    for t in errors[:3]:
+        print(f"  error: {t['error']}")
+    if main.voice_service.cache:
+        stats = main.voice_service.cache.stats()
+        print(f"tts cache: memory_hits={stats['memory_hits']} disk_hits={stats['disk_hits']} "
+              f"misses={stats['misses']} served={stats['bytes_served'] / 1024:.0f} KiB")
+    if main.github_service.cache:
+        stats = main.github_service.cache.stats()
+        print(f"github cache: hit_rate={stats['hit_rate']:.0%} fresh={stats['fresh_hits']} "
+              f"revalidated={stats['revalidated']} misses={stats['misses']} "
+              f"rate_limit_saved core={stats['rate_limit_saved_core']} search={stats['rate_limit_saved_search']} "
+              f"code_search={stats['rate_limit_saved_code_search']}")
+    github_context = stage_seconds.percentiles(stage="github_context")
+    if not math.isnan(github_context[0.5]):
+        print(f"github_context: p50={github_context[0.5] * 1000:.0f} ms p95={github_context[0.95] * 1000:.0f} ms")
+    if main.github_service.limiter:
+        for resource, stats in main.github_service.limiter.stats().items():
+            if stats["requests"] or stats["rejected"]:
+                print(f"github {resource}: requests={stats['requests']} rejected_locally={stats['rejected']} "
+                      f"throttled={stats['throttled']} waited={stats['waited_seconds']:.1f}s")
+    if main.voice_service.policy:
+        for (model, fmt), estimate in sorted(main.voice_service.policy.stats().items()):
+            p50 = tts_first_audio_seconds.percentiles(model=model, format=fmt)[0.5]
+            print(f"tts {model:<9} {fmt:<5} first audio p50={p50 * 1000:.0f} ms estimate={estimate:.0f} ms")
+
+
+async def start_server():
+    """Serve main.app on a free local port; returns (server, serve task, websocket URL)"""
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning", ws_max_size=2 ** 24))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, serve, f"ws://127.0.0.1:{port}/ws/ai"
+
+
+async def run(args):
+    stubs.install(main, stubs.Latency(
+        whisper_base=args.whisper_base, whisper_per_mb=args.whisper_per_mb,
+        chat_first_token=args.chat_first_token, token_delay=args.token_delay,
+        tts_first_byte=args.tts_first_byte, tts_per_char=args.tts_per_char, tts_hd_factor=args.tts_hd_factor,
+        search=args.search_latency, github=args.github_latency
+    ), github_limits=None if args.github_code_search_limit is None else {"code_search": args.github_code_search_limit})
+    main.github_service.limiter = None if args.no_github_rate_limiter else GitHubRateLimiter(AUTHENTICATED_LIMITS)
+    main.client.chat.completions.parallel_tool_calls = not args.no_parallel_tool_calls
+    main.STREAM_RESPONSES = not args.no_stream_responses
+    main.STREAMING_TRANSCRIPTION = not args.no_streaming_transcription
+    main.TRANSCRIPTION_WINDOW_SECONDS = args.window
+    main.voice_service.policy = None if args.no_tts_policy else TTSPolicy(budget_ms=args.tts_budget_ms)
+    if args.github_cache:
+        main.github_service.cache = GitHubCache(os.path.join(tempfile.mkdtemp(prefix="bench-github-"), "cache.db"))
+    if args.tts_cache:
+        main.voice_service.cache = TTSCache(directory=tempfile.mkdtemp(prefix="bench-tts-"))
+    if not args.verbose:
+        logging.getLogger("jarvis").setLevel(logging.WARNING)
+
+    server, serve, url = await start_server()
+
+    logs = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else logs):
+        results = await asyncio.gather(*(run_client(url, i, args) for i in range(args.clients)))
+    wall = time.perf_counter() - start
+
+    server.should_exit = True
+    await serve
+    report(results, wall, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--scenario", choices=["mix", *SCENARIOS], default="mix")
+    parser.add_argument("--chunks", type=int, default=12, help="WebM chunks per utterance")
+    parser.add_argument("--chunk-bytes", type=int, default=16000)
+    parser.add_argument("--chunk-interval", type=float, default=0.05, help="Seconds between chunks")
+    parser.add_argument("--window", type=float, default=0.25, help="Streaming transcription window (seconds)")
+    parser.add_argument("--no-stream-responses", action="store_true")
+    parser.add_argument("--no-streaming-transcription", action="store_true")
+    parser.add_argument("--tts-cache", action="store_true", help="Serve repeated sentences from a fresh TTS cache")
+    parser.add_argument("--github-cache", action="store_true", help="Cache GitHub reads in a fresh response cache")
+    parser.add_argument("--github-code-search-limit", type=int, help="Stub GitHub code searches allowed per minute")
+    parser.add_argument("--no-github-rate-limiter", action="store_true", help="Send GitHub calls without scheduling")
+    parser.add_argument("--no-tts-policy", action="store_true", help="Always tts-1-hd / MP3, as before the TTS policy")
+    parser.add_argument("--no-parallel-tool-calls", action="store_true",
+                        help="Stub model requests one tool per response, as the text-command loop did")
+    parser.add_argument("--tts-budget-ms", type=float, default=1200, help="TTS policy time-to-first-audio budget")
+    parser.add_argument("--audio-formats", nargs="*", default=["pcm", "opus", "mp3"],
+                        help="Formats the simulated client declares it can play")
+    parser.add_argument("--whisper-base", type=float, default=0.4)
+    parser.add_argument("--whisper-per-mb", type=float, default=0.5)
+    parser.add_argument("--chat-first-token", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--tts-first-byte", type=float, default=0.25)
+    parser.add_argument("--tts-per-char", type=float, default=0.002)
+    parser.add_argument("--tts-hd-factor", type=float, default=2.0, help="How much slower tts-1-hd is than tts-1")
+    parser.add_argument("--search-latency", type=float, default=0.6)
+    parser.add_argument("--github-latency", type=float, default=0.3)
+    parser.add_argument("--settle", type=float, default=0.5, help="Quiet period that ends a turn")
+    parser.add_argument("--turn-timeout", type=float, default=30)
+    parser.add_argument("--verbose", action="store_true", help="Show service logs")
+    asyncio.run(run(parser.parse_args()))
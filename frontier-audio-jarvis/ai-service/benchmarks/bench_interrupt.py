@@ -0,0 +1,137 @@
+"""
+Interrupt-to-silence benchmark for the /ws/ai pipeline
+
+Runs the real app against the local stand-ins (see stubs.py). Each trial
+streams an utterance, sends stop_recording, waits until the turn reaches
+the chosen stage, then sends an interrupt and measures:
+
+    ack             time until the "Processing interrupted" message
+    silence         time until the last audio frame after the interrupt (0 if none)
+    audio_after     audio bytes the client still received after the interrupt
+    tokens_after    chat tokens generated upstream after the interrupt
+    tts_after       TTS bytes synthesized upstream after the interrupt
+
+Usage:
+    python benchmarks/bench_interrupt.py [--trials 10] [--interrupt-at first_audio]
+    python benchmarks/bench_interrupt.py --interrupt-at search --scenario search
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from bench_e2e import SCENARIOS, main, percentile, start_server, stubs, webm_chunks
+import websockets
+
+TRIGGERS = {
+    "transcription": lambda data: data.get("type") == "transcription" and not data.get("partial"),
+    "thinking": lambda data: data.get("type") == "status" and data.get("message") == "AI is thinking...",
+    "search": lambda data: data.get("type") == "status" and data.get("message", "").startswith("Searching web"),
+    "first_audio": lambda data: data.get("type") == "audio_start",
+}
+
+
+async def run_trial(ws, stub, utterance, args):
+    for chunk in webm_chunks(utterance, args.chunks, args.chunk_bytes):
+        await ws.send(chunk)
+        await asyncio.sleep(args.chunk_interval)
+    await ws.send(json.dumps({"type": "stop_recording"}))
+
+    trigger = TRIGGERS[args.interrupt_at]
+    while True:
+        try:
+            message = await asyncio.wait_for(ws.recv(), args.turn_timeout)
+        except asyncio.TimeoutError:
+            return {"error": f"turn never reached {args.interrupt_at}"}
+        if isinstance(message, str) and trigger(json.loads(message)):
+            break
+
+    before = dict(stub.stats)
+    start = time.perf_counter()
+    await ws.send(json.dumps({"type": "interrupt"}))
+    result = {"silence": 0.0, "audio_after": 0}
+
+    while True:
+        try:
+            message = await asyncio.wait_for(ws.recv(), args.settle)
+        except asyncio.TimeoutError:
+            break
+        now = time.perf_counter() - start
+        if isinstance(message, bytes):
+            result["audio_after"] += len(message)
+            result["silence"] = now
+            continue
+        data = json.loads(message)
+        if data.get("type") == "system" and data.get("message") == "Processing interrupted":
+            result.setdefault("ack", now)
+        elif data.get("type") in ("audio_start", "audio_end"):
+            result["silence"] = now
+
+    result["tokens_after"] = stub.stats["chat_tokens"] - before["chat_tokens"]
+    result["tts_after"] = stub.stats["tts_bytes"] - before["tts_bytes"]
+    if "ack" not in result:
+        result["error"] = "no interrupt acknowledgement"
+    return result
+
+
+def report(results, args):
+    errors = [r for r in results if "error" in r]
+    ok = [r for r in results if "error" not in r]
+    print(f"\ntrials={args.trials} interrupt_at={args.interrupt_at} scenario={args.scenario} "
+          f"stream_responses={main.STREAM_RESPONSES}")
+    print(f"{'metric':<16}{'p50':>10}{'p95':>10}{'max':>10}")
+    for key, scale, unit in (("ack", 1000, "ms"), ("silence", 1000, "ms"), ("audio_after", 1, "B"),
+                             ("tokens_after", 1, ""), ("tts_after", 1, "B")):
+        values = [r[key] * scale for r in ok]
+        if values:
+            label = f"{key} ({unit})" if unit else key
+            print(f"{label:<16}{percentile(values, 0.5):>10.0f}{percentile(values, 0.95):>10.0f}{max(values):>10.0f}")
+    print(f"\nerrors={len(errors)}")
+    for r in errors[:3]:
+        print(f"  error: {r['error']}")
+
+
+async def run(args):
+    stub = stubs.install(main, stubs.Latency(
+        whisper_base=args.whisper_base, chat_first_token=args.chat_first_token,
+        token_delay=args.token_delay, tts_first_byte=args.tts_first_byte,
+        tts_per_char=args.tts_per_char, search=args.search_latency, github=args.github_latency
+    ))
+    main.STREAM_RESPONSES = not args.no_stream_responses
+    if not args.verbose:
+        logging.getLogger("jarvis").setLevel(logging.WARNING)
+
+    server, serve, url = await start_server()
+    results = []
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.recv()  # connection confirmation
+        for _ in range(args.trials):
+            results.append(await run_trial(ws, stub, SCENARIOS[args.scenario], args))
+
+    server.should_exit = True
+    await serve
+    report(results, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--interrupt-at", choices=list(TRIGGERS), default="first_audio")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="chat")
+    parser.add_argument("--chunks", type=int, default=6, help="WebM chunks per utterance")
+    parser.add_argument("--chunk-bytes", type=int, default=16000)
+    parser.add_argument("--chunk-interval", type=float, default=0.02, help="Seconds between chunks")
+    parser.add_argument("--no-stream-responses", action="store_true")
+    parser.add_argument("--whisper-base", type=float, default=0.4)
+    parser.add_argument("--chat-first-token", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--tts-first-byte", type=float, default=0.25)
+    parser.add_argument("--tts-per-char", type=float, default=0.002)
+    parser.add_argument("--search-latency", type=float, default=0.6)
+    parser.add_argument("--github-latency", type=float, default=0.3)
+    parser.add_argument("--settle", type=float, default=1.0, help="Quiet period that ends a trial")
+    parser.add_argument("--turn-timeout", type=float, default=30)
+    parser.add_argument("--verbose", action="store_true", help="Show service logs")
+    asyncio.run(run(parser.parse_args()))
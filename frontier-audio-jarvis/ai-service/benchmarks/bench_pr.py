@@ -0,0 +1,75 @@
+"""
+Pull request creation: per-file contents API chain vs. one Git Data commit
+
+Both flows run against the in-memory fake GitHub API in stubs.py, with a
+fixed latency per request:
+
+    chain       create_branch, then create_file for each file, then
+                create_pull_request (2 + 2N + 1 sequential requests)
+    git data    create_pull_request_with_files: blobs in parallel, one
+                tree, one commit, one ref, one PR
+
+For each file count it reports wall time, the number of requests made, and
+whether the PR branch ends up with exactly the files that were sent.
+
+Usage:
+    python benchmarks/bench_pr.py [--files 1 5 20] [--latency 0.1]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import stubs
+from github_service import GitHubService
+from http_client import HTTPClient
+
+
+def make_files(count: int):
+    return [{"path": f"src/module_{i}.py", "content": f"def f{i}():\n    return {i}\n"} for i in range(count)]
+
+
+def run_chain(github: GitHubService, repo: str, branch: str, files) -> str:
+    if not github.create_branch(repo, branch):
+        return None
+    for f in files:
+        if not github.create_file(repo, f["path"], f["content"], f"Add {f['path']}", branch):
+            return None
+    return github.create_pull_request(repo, "Add modules", "", branch)
+
+
+def run_git_data(github: GitHubService, repo: str, branch: str, files) -> str:
+    return github.create_pull_request_with_files(repo, "Add modules", "", branch, files, "Add modules")
+
+
+def measure(name, flow, args, count):
+    adapter = stubs.StubHTTPAdapter(stubs.Latency(github=args.latency))
+    http = HTTPClient()
+    http.session.mount("https://api.github.com/", adapter)
+    github = GitHubService(http)
+    files = make_files(count)
+    start = time.perf_counter()
+    url = flow(github, "example/project", "jarvis-bench", files)
+    wall = time.perf_counter() - start
+    requests_made = http.metrics()["api.github.com"]["requests"]
+    committed = adapter.git.files("example/project", "jarvis-bench") if url else {}
+    correct = committed == {f["path"]: f["content"] for f in files}
+    print(f"{name:<10}{count:>7}{wall * 1000:>10.0f}{requests_made:>10}  {'ok' if correct else 'MISMATCH'}")
+
+
+def main(args):
+    print(f"latency per request: {args.latency * 1000:.0f} ms")
+    print(f"{'flow':<10}{'files':>7}{'wall ms':>10}{'requests':>10}  branch contents")
+    for count in args.files:
+        measure("chain", run_chain, args, count)
+        measure("git data", run_git_data, args, count)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds per GitHub request")
+    main(parser.parse_args())
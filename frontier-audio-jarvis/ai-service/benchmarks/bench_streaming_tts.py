@@ -0,0 +1,161 @@
+"""
+Time-to-first-audio: streaming sentence-level TTS vs. full-response TTS
+(whole, or split into parts synthesized concurrently)
+
+Runs entirely against stubbed OpenAI chat/TTS clients with injected latencies,
+so it needs no network access or API key.
+
+Usage:
+    python benchmarks/bench_streaming_tts.py [--token-delay 0.02] [--tts-base 0.3] [--tts-per-char 0.004]
+    python benchmarks/bench_streaming_tts.py --long   # ~500-token answer with a code block and links
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-stub")
+
+import main
+from tts_policy import TTSChoice
+from voice_service import AudioFrameSender, SpeechStream, split_for_speech
+
+RESPONSE = (
+    "Boston is currently sunny with a temperature of 64 degrees. "
+    "Winds are light, coming from the west at about eight miles per hour. "
+    "Humidity sits around 40 percent, so it should feel comfortable. "
+    "Later tonight temperatures drop into the low fifties with clear skies. "
+    "Tomorrow looks similar, with a high near 67 and a small chance of showers in the evening. "
+    "If you're heading out, a light jacket should be plenty."
+)
+
+LONG_RESPONSE = (
+    "Here's an overview of how the service handles a voice turn from start to finish. " * 3
+    + "\n\nThe browser records audio with MediaRecorder and streams WebM chunks over the websocket. "
+    "The backend proxy forwards them unchanged, and the AI service appends them to a per-session buffer. "
+    "When you stop talking, the recording is transcribed with Whisper, optionally in segments while you speak. "
+    "The transcript then goes to the chat model together with the recent conversation. "
+    "See https://platform.openai.com/docs/guides/speech-to-text for the transcription details.\n\n"
+    "```python\nasync def handle(websocket):\n    async for message in websocket:\n        await process(message)\n```\n\n"
+    "Replies are spoken sentence by sentence, so the first words play while the rest is still being generated. "
+    "Each sentence is synthesized separately and the audio is sent in order with a sequence number. "
+    "The client queues the streams and plays them back to back without gaps. "
+    "If you interrupt, the turn in progress is cancelled and no more audio is sent. " * 4
+)
+
+
+class StubChatCompletions:
+    def __init__(self, token_delay):
+        self.token_delay = token_delay
+
+    async def create(self, stream=False, **kwargs):
+        tokens = [word + " " for word in RESPONSE.split(" ")]
+        if not stream:
+            await asyncio.sleep(self.token_delay * len(tokens))
+            message = SimpleNamespace(content=RESPONSE)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+        async def token_stream():
+            for token in tokens:
+                await asyncio.sleep(self.token_delay)
+                delta = SimpleNamespace(content=token, tool_calls=None)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+        return token_stream()
+
+
+class StubVoiceService:
+    """
+    TTS latency grows linearly with input length, like the real endpoint.
+    With streaming, the first chunk arrives after the fixed latency and the
+    rest trickle in over the remaining synthesis time.
+    """
+
+    def __init__(self, base, per_char, streaming=True):
+        self.base = base
+        self.per_char = per_char
+        self.streaming = streaming
+
+    def choose(self, text, formats=("mp3",), voice=None, chars=None):
+        return TTSChoice(model="tts-1", voice="shimmer", format="mp3")
+
+    async def stream_speech(self, text, chunks=8, choice=None):
+        audio = b"\xff\xfb" + text.encode()
+        step = max(1, len(audio) // chunks)
+        if not self.streaming:
+            await asyncio.sleep(self.base + self.per_char * len(text))
+            yield audio
+            return
+        await asyncio.sleep(self.base)
+        for i in range(0, len(audio), step):
+            await asyncio.sleep(self.per_char * len(text) / chunks)
+            yield audio[i:i + step]
+
+
+class FirstAudioTimer:
+    def __init__(self, start):
+        self.start = start
+        self.first_audio = None
+
+    async def send_text(self, text):
+        pass
+
+    async def send_bytes(self, data):
+        if self.first_audio is None:
+            self.first_audio = time.perf_counter() - self.start
+
+
+async def run_full(voice, start):
+    timer = FirstAudioTimer(start)
+    response = await main.client.chat.completions.create(messages=[])
+    text = response.choices[0].message.content
+    await AudioFrameSender(timer.send_text, timer.send_bytes).send_stream(voice.stream_speech(text))
+    return timer.first_audio, time.perf_counter() - start
+
+
+async def run_parallel(voice, start):
+    timer = FirstAudioTimer(start)
+    response = await main.client.chat.completions.create(messages=[])
+    speech_stream = SpeechStream(voice, AudioFrameSender(timer.send_text, timer.send_bytes), main.TTS_MAX_CONCURRENCY)
+    for part in split_for_speech(response.choices[0].message.content, main.TTS_CHUNK_CHARS):
+        speech_stream.submit(part)
+    await speech_stream.finish()
+    return timer.first_audio, time.perf_counter() - start
+
+
+async def run_streaming(voice, start):
+    timer = FirstAudioTimer(start)
+    frames = AudioFrameSender(timer.send_text, timer.send_bytes)
+    speech_stream = SpeechStream(voice, frames, main.TTS_MAX_CONCURRENCY)
+    await main.stream_chat_completion([], speech_stream)
+    await speech_stream.finish()
+    return timer.first_audio, time.perf_counter() - start
+
+
+async def run(args):
+    global RESPONSE
+    if args.long:
+        RESPONSE = LONG_RESPONSE
+    main.client.chat.completions = StubChatCompletions(args.token_delay)
+    results = [
+        ("Full response, whole-file TTS", await run_full(StubVoiceService(args.tts_base, args.tts_per_char, streaming=False), time.perf_counter())),
+        ("Full response, chunked TTS", await run_full(StubVoiceService(args.tts_base, args.tts_per_char), time.perf_counter())),
+        ("Full response, parallel parts", await run_parallel(StubVoiceService(args.tts_base, args.tts_per_char), time.perf_counter())),
+        ("Streaming sentence TTS", await run_streaming(StubVoiceService(args.tts_base, args.tts_per_char), time.perf_counter())),
+    ]
+
+    baseline = results[0][1][0]
+    for name, (first, total) in results:
+        print(f"{name:<32} first audio {first * 1000:7.1f} ms  all audio {total * 1000:7.1f} ms  ({baseline / first:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed tokens")
+    parser.add_argument("--tts-base", type=float, default=0.3, help="Fixed TTS latency in seconds")
+    parser.add_argument("--tts-per-char", type=float, default=0.004, help="TTS latency per input character")
+    parser.add_argument("--long", action="store_true", help="Use a ~500-token response with code and URLs")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""
+Upload transcoding benchmark
+
+Synthesizes speech-like test recordings (harmonic tones with a syllable
+rhythm, over background noise), encodes them as browser-style WebM/Opus,
+then re-encodes each one the way Transcoder does and reports:
+
+    in / out        upload size before and after
+    saved           share of bytes saved
+    cpu/s audio     CPU seconds (this process + ffmpeg) per second of audio
+    wall            time for one transcode
+
+The last section runs the recordings concurrently through the process pool
+to show throughput with --workers processes. Needs ffmpeg on PATH.
+
+Usage:
+    python benchmarks/bench_transcode.py [--durations 5 15 60] [--formats opus flac]
+    python benchmarks/bench_transcode.py --source-bitrate 64k --bitrate 16k
+"""
+
+import argparse
+import asyncio
+import io
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pydub.generators import Sine, WhiteNoise
+
+from audio_processing import Transcoder, decoder_available, transcode_audio
+
+
+def speech_like(seconds: float):
+    """Alternating voiced "syllables" and short pauses over low-level noise, as 48 kHz stereo"""
+    ms = int(seconds * 1000)
+    audio = WhiteNoise().to_audio_segment(duration=ms, volume=-50).set_frame_rate(48000).set_channels(2)
+    position, pitch = 0, 0
+    while position < ms:
+        syllable = 180 + 20 * (pitch % 5)
+        tone = Sine(120 + 15 * (pitch % 7)).to_audio_segment(duration=syllable, volume=-18)
+        tone = tone.overlay(Sine(2 * (120 + 15 * (pitch % 7))).to_audio_segment(duration=syllable, volume=-24))
+        audio = audio.overlay(tone.fade_in(20).fade_out(40), position=position)
+        position += syllable + (400 if pitch % 6 == 5 else 60)
+        pitch += 1
+    return audio
+
+
+def browser_webm(seconds: float, bitrate: str) -> bytes:
+    out = io.BytesIO()
+    speech_like(seconds).export(out, format="webm", codec="libopus", bitrate=bitrate)
+    return out.getvalue()
+
+
+def single(recordings, args):
+    print(f"\nsource: webm/opus {args.source_bitrate} 48 kHz stereo; opus target {args.bitrate}")
+    print(f"{'format':<8}{'audio s':>9}{'in KB':>10}{'out KB':>10}{'saved':>8}{'cpu/s audio':>13}{'wall ms':>10}")
+    for fmt in args.formats:
+        for seconds, webm in recordings:
+            cpu, wall = [], []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                data, cpu_seconds, audio_seconds = transcode_audio(webm, fmt, args.bitrate)
+                wall.append(time.perf_counter() - start)
+                cpu.append(cpu_seconds / audio_seconds)
+            print(f"{fmt:<8}{seconds:>9g}{len(webm) / 1024:>10.1f}{len(data) / 1024:>10.1f}"
+                  f"{1 - len(data) / len(webm):>8.0%}{min(cpu):>13.4f}{min(wall) * 1000:>10.0f}")
+
+
+async def pooled(recordings, args):
+    executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    transcoder = Transcoder(executor, fmt=args.formats[0], bitrate=args.bitrate, min_bytes=0)
+    # Warm the workers up so process start-up isn't counted
+    await asyncio.gather(*(transcoder.transcode(recordings[0][1]) for _ in range(args.workers)))
+    jobs = [webm for _, webm in recordings] * args.repeat
+    start = time.perf_counter()
+    await asyncio.gather(*(transcoder.transcode(webm) for webm in jobs))
+    wall = time.perf_counter() - start
+    executor.shutdown()
+    audio = sum(seconds for seconds, _ in recordings) * args.repeat
+    print(f"\npool: workers={args.workers} format={args.formats[0]} jobs={len(jobs)} wall={wall:.2f}s "
+          f"throughput={audio / wall:.0f}x realtime")
+
+
+def main(args):
+    if not decoder_available():
+        sys.exit("ffmpeg not found on PATH")
+    recordings = [(seconds, browser_webm(seconds, args.source_bitrate)) for seconds in args.durations]
+    single(recordings, args)
+    asyncio.run(pooled(recordings, args))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 15, 60], help="Recording lengths (seconds)")
+    parser.add_argument("--formats", nargs="+", choices=["opus", "flac"], default=["opus", "flac"])
+    parser.add_argument("--source-bitrate", default="128k", help="Bitrate of the simulated browser recording")
+    parser.add_argument("--bitrate", default="24k", help="Opus target bitrate")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2)
+    main(parser.parse_args())
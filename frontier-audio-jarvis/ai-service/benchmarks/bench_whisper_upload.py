@@ -0,0 +1,74 @@
+"""
+Whisper upload preparation: temp-file round trip vs. in-memory AudioUpload
+
+Builds the same multipart request body httpx sends to Whisper, once by
+writing the recording to a NamedTemporaryFile and reopening it (the old
+path) and once straight from a memoryview over the bytearray. No network.
+
+Usage:
+    python benchmarks/bench_whisper_upload.py [--sizes 64,256,1024,4096] [--iterations 200]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from transcription_service import AudioUpload
+
+WHISPER_URL = "https://api.openai.com/v1/audio/transcriptions"
+
+
+def build_request(file_obj) -> int:
+    request = httpx.Request("POST", WHISPER_URL, files={"file": file_obj}, data={"model": "whisper-1"})
+    return len(request.read())
+
+
+def temp_file_path(audio_buffer: bytearray) -> int:
+    with tempfile.NamedTemporaryFile(suffix=".webm", delete=False, mode="wb") as temp_audio:
+        temp_audio.write(audio_buffer)
+        temp_audio.flush()
+        temp_audio_path = temp_audio.name
+    try:
+        with open(temp_audio_path, "rb") as audio_file:
+            return build_request(audio_file)
+    finally:
+        os.unlink(temp_audio_path)
+
+
+def in_memory_path(audio_buffer: bytearray) -> int:
+    with AudioUpload(audio_buffer) as audio_file:
+        return build_request(audio_file)
+
+
+def measure(fn, audio_buffer, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(audio_buffer)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def run(args):
+    print(f"{'size':>8}  {'temp file p50/p95 (ms)':>24}  {'in-memory p50/p95 (ms)':>24}  speedup")
+    for size_kb in args.sizes:
+        audio_buffer = bytearray(b"\x1a\x45\xdf\xa3" + os.urandom(size_kb * 1024 - 4))
+        temp_p50, temp_p95 = measure(temp_file_path, audio_buffer, args.iterations)
+        mem_p50, mem_p95 = measure(in_memory_path, audio_buffer, args.iterations)
+        print(f"{size_kb:>6}KB  {temp_p50:>11.3f} / {temp_p95:<10.3f}  {mem_p50:>11.3f} / {mem_p95:<10.3f}  {temp_p50 / mem_p50:5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda v: [int(s) for s in v.split(",")], default=[64, 256, 1024, 4096],
+                        help="Comma-separated recording sizes in KB")
+    parser.add_argument("--iterations", type=int, default=200)
+    run(parser.parse_args())
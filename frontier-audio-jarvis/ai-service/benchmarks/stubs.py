@@ -0,0 +1,441 @@
+"""
+Local stand-ins for the services the AI service talks to
+
+OpenAI (Whisper, chat, TTS), Tavily, DuckDuckGo, Open-Meteo and the GitHub API, each
+with configurable injected latency, so benchmarks can drive the real
+websocket pipeline without network access or API keys.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+# Clients embed what they "said" in the audio so the stub Whisper can recover it
+UTTERANCE_MARKER = b"UTTERANCE:"
+
+ANSWER = (
+    "Here is what I found. The service keeps one connection per client and streams audio as it goes. "
+    "Responses are spoken sentence by sentence, so playback starts early. "
+    "Let me know if you want more detail on any part of it."
+)
+
+# Body of every file served by the stub GitHub contents API
+STUB_FILE = (
+    "# {path}\n"
+    "import asyncio\n\n"
+    "async def handle(websocket):\n"
+    "    async for message in websocket:\n"
+    "        await websocket.send(message)\n"
+)
+
+
+@dataclass
+class Latency:
+    """Injected latencies in seconds"""
+    whisper_base: float = 0.4
+    whisper_per_mb: float = 0.5
+    chat_first_token: float = 0.3
+    token_delay: float = 0.02
+    tts_first_byte: float = 0.25
+    tts_per_char: float = 0.002
+    tts_hd_factor: float = 2.0  # tts-1-hd is this much slower than tts-1
+    search: float = 0.6
+    github: float = 0.3
+
+
+def utterance_from(audio) -> str:
+    data = bytes(audio)
+    index = data.rfind(UTTERANCE_MARKER)
+    if index < 0:
+        return ""
+    return data[index + len(UTTERANCE_MARKER):].split(b"\0", 1)[0].decode()
+
+
+class StubTranscriptions:
+    def __init__(self, latency: Latency, stats: dict):
+        self.latency = latency
+        self.stats = stats
+
+    async def create(self, file=None, **kwargs):
+        self.stats["whisper_calls"] += 1
+        audio = file.read()
+        await asyncio.sleep(self.latency.whisper_base + self.latency.whisper_per_mb * len(audio) / 1_000_000)
+        return SimpleNamespace(text=utterance_from(audio))
+
+
+class StubChatCompletions:
+    """
+    Scripted assistant. When tools are offered and none have run yet this
+    turn, it calls them: web_search for "search for ...", get_weather for
+    "weather in ..." (both at once if the user asks for both, or one per
+    response with `parallel_tool_calls` off). Otherwise it answers with a
+    fixed reply. Tool calls are streamed as deltas like the real API: id and
+    name first, then the arguments in fragments.
+    """
+
+    def __init__(self, latency: Latency, stats: dict):
+        self.latency = latency
+        self.stats = stats
+        self.parallel_tool_calls = True
+
+    def tool_calls_for(self, messages, tools_offered: bool):
+        """[(name, arguments JSON)] the model would request next"""
+        last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+        user_text = messages[last_user]["content"] if last_user >= 0 else ""
+        done = sum(1 for m in messages[last_user + 1:] if m.get("role") == "tool")
+        if not tools_offered or (done and self.parallel_tool_calls):
+            return []
+        calls = []
+        search = re.search(r"search for (.+?)(?: and (?:the )?weather| and what|$)", user_text, re.IGNORECASE)
+        if search:
+            calls.append(("web_search", json.dumps({"query": search.group(1).strip(" ?.")})))
+        weather = re.search(r"weather in ([\w ]+)", user_text, re.IGNORECASE)
+        if weather:
+            calls.append(("get_weather", json.dumps({"location": weather.group(1).strip()})))
+        return calls if self.parallel_tool_calls else calls[done:done + 1]
+
+    async def create(self, messages=None, stream=False, tools=None, tool_choice="auto", **kwargs):
+        self.stats["chat_calls"] += 1
+        calls = self.tool_calls_for(messages or [], bool(tools) and tool_choice != "none")
+        tokens = [] if calls else [word + " " for word in ANSWER.split(" ")]
+        fragments = [(i, arguments[j:j + 8]) for i, (_, arguments) in enumerate(calls)
+                     for j in range(0, len(arguments), 8)]
+        if not stream:
+            await asyncio.sleep(self.latency.chat_first_token
+                                + self.latency.token_delay * (len(tokens) + len(fragments)))
+            tool_calls = [
+                SimpleNamespace(id=f"call_{i}", function=SimpleNamespace(name=name, arguments=arguments))
+                for i, (name, arguments) in enumerate(calls)
+            ]
+            message = SimpleNamespace(content="".join(tokens).strip() or None, tool_calls=tool_calls or None)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")])
+
+        def chunk(content=None, tool_calls=None):
+            delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+            return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+
+        def tool_delta(index, id=None, name=None, arguments=None):
+            return SimpleNamespace(index=index, id=id, function=SimpleNamespace(name=name, arguments=arguments))
+
+        async def token_stream():
+            await asyncio.sleep(self.latency.chat_first_token)
+            for token in tokens:
+                await asyncio.sleep(self.latency.token_delay)
+                self.stats["chat_tokens"] += 1
+                yield chunk(content=token)
+            for i, (name, _) in enumerate(calls):
+                yield chunk(tool_calls=[tool_delta(i, id=f"call_{i}", name=name, arguments="")])
+            for i, fragment in fragments:
+                await asyncio.sleep(self.latency.token_delay)
+                self.stats["chat_tokens"] += 1
+                yield chunk(tool_calls=[tool_delta(i, arguments=fragment)])
+        return token_stream()
+
+
+# Bytes per character of text for each response format, relative to MP3 (~48 kbps)
+FORMAT_SIZE = {"mp3": 1.0, "opus": 0.5, "aac": 0.8, "flac": 3.0, "wav": 4.0, "pcm": 4.0}
+
+
+class StubSpeechResponse:
+    def __init__(self, text: str, latency: Latency, stats: dict, model: str = "tts-1", response_format: str = "mp3"):
+        self.text = text
+        self.latency = latency
+        self.stats = stats
+        self.slowdown = latency.tts_hd_factor if model.endswith("-hd") else 1.0
+        self.size = FORMAT_SIZE.get(response_format, 1.0)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def iter_bytes(self, chunk_size: int = 4096):
+        # Roughly 1 KB of MP3 per 10 characters, delivered as synthesis progresses
+        audio = b"\xff\xfb" + self.text.encode() * int(100 * self.size)
+        await asyncio.sleep(self.latency.tts_first_byte * self.slowdown)
+        chunks = max(1, len(audio) // chunk_size)
+        per_chunk = self.latency.tts_per_char * self.slowdown * len(self.text) / chunks
+        for i in range(0, len(audio), chunk_size):
+            await asyncio.sleep(per_chunk)
+            self.stats["tts_bytes"] += len(audio[i:i + chunk_size])
+            yield audio[i:i + chunk_size]
+
+
+class StubStreamingSpeech:
+    def __init__(self, latency: Latency, stats: dict):
+        self.latency = latency
+        self.stats = stats
+
+    def create(self, input="", model="tts-1", response_format="mp3", **kwargs):
+        return StubSpeechResponse(input, self.latency, self.stats, model, response_format)
+
+
+class StubOpenAI:
+    """Duck-typed AsyncOpenAI covering the calls the service makes; `stats` counts upstream work done"""
+
+    def __init__(self, latency: Latency):
+        self.stats = {"whisper_calls": 0, "chat_calls": 0, "chat_tokens": 0, "tts_bytes": 0}
+        self.chat = SimpleNamespace(completions=StubChatCompletions(latency, self.stats))
+        self.audio = SimpleNamespace(
+            transcriptions=StubTranscriptions(latency, self.stats),
+            speech=SimpleNamespace(with_streaming_response=StubStreamingSpeech(latency, self.stats))
+        )
+
+    async def close(self):
+        pass
+
+
+class StubDDGS:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    def text(self, query, max_results=3, **kwargs):
+        time.sleep(self.latency.search * 1.5)
+        return [
+            {"title": f"{query} result {i}", "body": f"Snippet {i} about {query}.", "href": f"https://example.com/{i}"}
+            for i in range(1, max_results + 1)
+        ]
+
+
+class FakeGitData:
+    """
+    In-memory GitHub Git Data, contents-write and pulls API: refs, blobs,
+    trees (flat path -> blob maps), commits and pull requests per repo.
+    Every repo starts with a "main" branch holding one empty commit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.objects: Dict[str, dict] = {}
+        self.refs: Dict[tuple, str] = {}
+        self.pulls: Dict[str, list] = {}
+
+    def _store(self, obj: dict) -> str:
+        sha = hashlib.sha1(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+        self.objects[sha] = obj
+        return sha
+
+    def _head(self, repo: str, branch: str) -> Optional[str]:
+        if (repo, branch) not in self.refs and branch == "main":
+            tree = self._store({"type": "tree", "entries": {}})
+            self.refs[(repo, branch)] = self._store({"type": "commit", "tree": tree, "parents": [], "message": "Initial"})
+        return self.refs.get((repo, branch))
+
+    def files(self, repo: str, branch: str) -> Dict[str, str]:
+        """Contents of every file at the branch head"""
+        with self._lock:
+            tree = self.objects[self.objects[self._head(repo, branch)]["tree"]]
+            return {path: self.objects[sha]["content"] for path, sha in tree["entries"].items()}
+
+    def _commit(self, tree_entries: dict, parent: str, message: str) -> str:
+        tree = self._store({"type": "tree", "entries": tree_entries})
+        return self._store({"type": "commit", "tree": tree, "parents": [parent], "message": message})
+
+    def handle(self, method: str, repo: str, path: str, body: dict):
+        """(status, response body) for a Git Data / pulls / contents-write call, or None if not one"""
+        with self._lock:
+            match = re.fullmatch(r"git/ref/heads/(.+)", path)
+            if match and method == "GET":
+                sha = self._head(repo, match.group(1))
+                return (200, {"object": {"sha": sha, "type": "commit"}}) if sha else (404, {"message": "Not Found"})
+            match = re.fullmatch(r"git/commits/(\w+)", path)
+            if match and method == "GET":
+                commit = self.objects.get(match.group(1))
+                return (200, {"sha": match.group(1), "tree": {"sha": commit["tree"]}}) if commit \
+                    else (404, {"message": "Not Found"})
+            if path == "git/blobs" and method == "POST":
+                content = base64.b64decode(body["content"]).decode() if body.get("encoding") == "base64" \
+                    else body["content"]
+                return 201, {"sha": self._store({"type": "blob", "content": content})}
+            if path == "git/trees" and method == "POST":
+                entries = dict(self.objects[body["base_tree"]]["entries"]) if body.get("base_tree") else {}
+                for entry in body["tree"]:
+                    if entry.get("content") is not None:
+                        entries[entry["path"]] = self._store({"type": "blob", "content": entry["content"]})
+                    elif entry.get("sha") is None:
+                        entries.pop(entry["path"], None)
+                    else:
+                        entries[entry["path"]] = entry["sha"]
+                return 201, {"sha": self._store({"type": "tree", "entries": entries})}
+            if path == "git/commits" and method == "POST":
+                commit = {"type": "commit", "tree": body["tree"], "parents": body["parents"], "message": body["message"]}
+                return 201, {"sha": self._store(commit)}
+            if path == "git/refs" and method == "POST":
+                branch = body["ref"].removeprefix("refs/heads/")
+                if self._head(repo, branch):
+                    return 422, {"message": "Reference already exists"}
+                self.refs[(repo, branch)] = body["sha"]
+                return 201, {"ref": body["ref"], "object": {"sha": body["sha"]}}
+            match = re.fullmatch(r"contents/(.+)", path)
+            if match and method == "PUT":
+                head = self._head(repo, body["branch"])
+                if not head:
+                    return 404, {"message": "Branch not found"}
+                entries = dict(self.objects[self.objects[head]["tree"]]["entries"])
+                entries[match.group(1)] = self._store({"type": "blob", "content": base64.b64decode(body["content"]).decode()})
+                self.refs[(repo, body["branch"])] = self._commit(entries, head, body["message"])
+                return 201, {"content": {"path": match.group(1), "sha": entries[match.group(1)]}}
+            if path == "pulls" and method == "POST":
+                pulls = self.pulls.setdefault(repo, [])
+                pulls.append(body)
+                return 201, {"number": len(pulls), "html_url": f"https://github.com/{repo}/pull/{len(pulls)}"}
+        return None
+
+
+class StubHTTPAdapter(BaseAdapter):
+    """
+    requests transport answering Tavily, Open-Meteo and GitHub API calls locally.
+    GitHub calls count against `github_limits` (requests per minute per
+    resource, unlimited by default) and carry the X-RateLimit-* headers;
+    over the limit they fail with 403 like the real API.
+    """
+
+    def __init__(self, latency: Latency, github_limits: Optional[Dict[str, int]] = None):
+        super().__init__()
+        self.latency = latency
+        self.github_limits = github_limits or {}
+        self._github_used: Dict[str, int] = {}
+        self._window_start = time.time()
+        self._lock = threading.Lock()
+        self.git = FakeGitData()
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        if parts.netloc == "api.tavily.com":
+            time.sleep(self.latency.search)
+            query = json.loads(request.body or b"{}").get("query", "")
+            body = {"results": [
+                {"title": f"{query} ({i})", "content": f"Result {i} for {query}.", "url": f"https://example.com/t{i}"}
+                for i in range(1, 4)
+            ]}
+            return self._response(request, 200, body)
+        if parts.netloc == "api.github.com":
+            time.sleep(self.latency.github)
+            resource = "code_search" if parts.path == "/search/code" else \
+                "search" if parts.path.startswith("/search/") else "core"
+            headers, exceeded = self._count_github_call(resource)
+            response = self._response(request, 403, {"message": "API rate limit exceeded"}) if exceeded \
+                else self._github(request, parts)
+            response.headers.update(headers)
+            return response
+        if parts.netloc == "geocoding-api.open-meteo.com":
+            time.sleep(self.latency.search / 2)
+            name = re.search(r"name=([^&]*)", parts.query).group(1)
+            return self._response(request, 200, {"results": [
+                {"name": name.title(), "latitude": 48.85, "longitude": 2.35, "admin1": "", "country": "Stubland"}
+            ]})
+        if parts.netloc == "api.open-meteo.com":
+            time.sleep(self.latency.search / 2)
+            return self._response(request, 200, {
+                "current": {"temperature_2m": 64, "apparent_temperature": 63, "relative_humidity_2m": 55,
+                            "wind_speed_10m": 7, "weather_code": 2},
+                "current_units": {"temperature_2m": "°F", "relative_humidity_2m": "%", "wind_speed_10m": "mph"}
+            })
+        return self._response(request, 503, {"message": f"No stub for {parts.netloc}"})
+
+    def _github(self, request, parts) -> requests.Response:
+        match = re.match(r"/repos/([^/]+/[^/]+)/(.+)", parts.path)
+        if match:
+            handled = self.git.handle(request.method, match.group(1), match.group(2), json.loads(request.body or b"{}"))
+            if handled:
+                return self._response(request, *handled)
+        if parts.path == "/search/code":
+            body = {"items": [
+                {"name": f"file{i}.py", "path": f"src/file{i}.py", "score": 1.0 / i,
+                 "repository": {"full_name": "example/project"}, "sha": self._sha(f"src/file{i}.py"),
+                 "html_url": f"https://github.com/example/project/blob/main/src/file{i}.py"}
+                for i in range(1, 4)
+            ]}
+            return self._conditional(request, body)
+        match = re.match(r"/repos/[^/]+/[^/]+/contents/(.+)", parts.path)
+        if match:
+            content = STUB_FILE.format(path=match.group(1))
+            body = {"path": match.group(1), "sha": self._sha(match.group(1)),
+                    "content": base64.b64encode(content.encode()).decode(), "encoding": "base64"}
+            return self._conditional(request, body)
+        return self._response(request, 404, {"message": "Not Found"})
+
+    def _count_github_call(self, resource: str):
+        """Count a call against its resource; returns (rate-limit headers, over the limit)"""
+        limit = self.github_limits.get(resource)
+        if limit is None:
+            return {}, False
+        with self._lock:
+            now = time.time()
+            if now - self._window_start >= 60:
+                self._window_start = now
+                self._github_used.clear()
+            used = self._github_used[resource] = self._github_used.get(resource, 0) + 1
+            reset = int(self._window_start + 60)
+        headers = {
+            "X-RateLimit-Resource": resource, "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": str(max(0, limit - used)), "X-RateLimit-Reset": str(reset)
+        }
+        return headers, used > limit
+
+    @staticmethod
+    def _sha(path: str) -> str:
+        return hashlib.sha1(path.encode()).hexdigest()
+
+    def _conditional(self, request, body) -> requests.Response:
+        """200 with an ETag, or 304 if the client already has this version"""
+        etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            response = self._response(request, 304, None)
+            response._content = b""
+        else:
+            response = self._response(request, 200, body)
+        response.headers["ETag"] = etag
+        return response
+
+    @staticmethod
+    def _response(request, status: int, body) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode()
+        response.headers["Content-Type"] = "application/json"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def install(main_module, latency: Latency, github_limits: Optional[Dict[str, int]] = None):
+    """Point every external dependency of `main` at the local stand-ins (github_limits: see StubHTTPAdapter)"""
+    from http_client import get_http_client
+
+    stub = StubOpenAI(latency)
+    main_module.client = stub
+    main_module.voice_service.client = stub
+    main_module.transcription_service.client = stub
+    main_module.context_window.client = stub
+    # Every turn would hit the TTS and GitHub caches after the first; benchmarks opt back in explicitly
+    main_module.voice_service.cache = None
+    main_module.github_service.cache = None
+
+    adapter = StubHTTPAdapter(latency, github_limits)
+    session = get_http_client().session
+    session.mount("https://api.tavily.com/", adapter)
+    session.mount("https://api.github.com/", adapter)
+    session.mount("https://geocoding-api.open-meteo.com/", adapter)
+    session.mount("https://api.open-meteo.com/", adapter)
+
+    os.environ.setdefault("TAVILY_API_KEY", "benchmark-stub")
+    main_module.search_service.tavily_client = None
+    main_module.search_service.ddgs = StubDDGS(latency)
+    return stub
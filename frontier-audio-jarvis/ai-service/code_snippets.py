@@ -0,0 +1,99 @@
+"""
+Code snippet extraction and ranking for GitHub context
+Line windows around the query terms in fetched files, scored with BM25
+"""
+
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
+
+# Words in spoken questions that say nothing about the code being looked for
+STOPWORDS = {
+    "a", "an", "and", "are", "can", "code", "do", "does", "example", "examples", "for", "from", "give", "how",
+    "i", "in", "is", "it", "me", "my", "of", "on", "or", "please", "show", "some", "that", "the", "this", "to",
+    "use", "using", "what", "when", "where", "which", "with", "write", "you", "your"
+}
+
+_WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+def terms(text: str) -> List[str]:
+    """Lowercase word tokens; identifiers are split at camelCase and snake_case boundaries"""
+    return [w.lower() for w in _WORD.findall(text) if len(w) > 1]
+
+
+def query_terms(query: str) -> Set[str]:
+    return {t for t in terms(query) if t not in STOPWORDS}
+
+
+@dataclass
+class Snippet:
+    repository: str
+    path: str
+    html_url: str
+    start: int  # First line, 1-based
+    end: int  # Last line, inclusive
+    text: str
+    score: float = 0.0
+
+
+def line_windows(lines: List[str], wanted: Set[str], radius: int = 6, max_windows: int = 2) -> List[Tuple[int, int]]:
+    """
+    Windows of `radius` lines around lines mentioning the query terms, merged
+    where they overlap; the `max_windows` with the most matches, in file order
+
+    Returns:
+        (start, end) 0-based line ranges, end exclusive
+    """
+    windows = []
+    for i, line in enumerate(lines):
+        hits = sum(1 for t in terms(line) if t in wanted)
+        if not hits:
+            continue
+        start, end = max(0, i - radius), min(len(lines), i + radius + 1)
+        if windows and start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], end, windows[-1][2] + hits)
+        else:
+            windows.append((start, end, hits))
+    best = sorted(windows, key=lambda w: -w[2])[:max_windows]
+    return [(start, end) for start, end, _ in sorted(best)]
+
+
+def extract_snippets(result: Dict, content: str, wanted: Set[str], radius: int = 6) -> List[Snippet]:
+    """
+    Snippets of one search result's file; the head of the file if no line matches
+
+    Args:
+        result: search_code result (repository, path, html_url)
+        content: File content
+        wanted: Query terms (see query_terms)
+        radius: Lines of context on each side of a match
+    """
+    lines = content.splitlines()
+    windows = line_windows(lines, wanted, radius) or [(0, min(len(lines), 2 * radius + 1))]
+    return [
+        Snippet(result["repository"], result["path"], result["html_url"], start + 1, end,
+                "\n".join(lines[start:end]))
+        for start, end in windows if end > start
+    ]
+
+
+def rank_bm25(snippets: List[Snippet], wanted: Set[str], k1: float = 1.2, b: float = 0.75) -> List[Snippet]:
+    """Score snippets against the query terms with Okapi BM25; best first"""
+    if not snippets:
+        return []
+    documents = [Counter(terms(s.text)) for s in snippets]
+    lengths = [sum(d.values()) for d in documents]
+    average = sum(lengths) / len(lengths) or 1
+    frequency = {t: sum(1 for d in documents if t in d) for t in wanted}
+    for snippet, document, length in zip(snippets, documents, lengths):
+        score = 0.0
+        for t in wanted:
+            tf = document.get(t, 0)
+            if tf:
+                idf = math.log((len(documents) - frequency[t] + 0.5) / (frequency[t] + 0.5) + 1)
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average))
+        snippet.score = score
+    return sorted(snippets, key=lambda s: -s.score)
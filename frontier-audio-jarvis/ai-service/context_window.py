@@ -0,0 +1,199 @@
+"""
+Token-budgeted context window for the thought loop
+Keeps the prompt sent to GPT bounded no matter how long a session runs
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from openai import AsyncOpenAI
+from log import get_logger
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = get_logger("context")
+
+# System messages carrying raw tool output (see the thought loop in main.py and tools.py)
+TOOL_OUTPUT_PREFIXES = ("Search Results for", "Error executing search", "Tool result from")
+
+SUMMARY_PROMPT = (
+    "Summarize the earlier part of this conversation between a user and Jarvis, a voice assistant, "
+    "in under 150 words. Keep facts, names, numbers, user preferences, decisions and open questions. "
+    "Drop pleasantries and raw search output."
+)
+
+
+class ContextWindow:
+    """
+    Builds the message list for each GPT call within a token budget.
+
+    - The leading system prompt is always kept.
+    - Tool outputs from earlier turns are truncated to `tool_output_tokens`.
+    - When the history still doesn't fit, older turns are folded into a
+      per-session rolling summary generated in the background. The turn in
+      progress is always sent verbatim, along with up to `keep_recent`
+      recent messages while they fit. Until the summary is ready, the
+      oldest messages are simply dropped.
+    """
+
+    def __init__(self, client: AsyncOpenAI, budget_tokens: int = 3000, keep_recent: int = 6,
+                 tool_output_tokens: int = 200, summary_model: str = "gpt-4", max_sessions: int = 1000):
+        self.client = client
+        self.budget_tokens = budget_tokens
+        self.keep_recent = keep_recent
+        self.tool_output_tokens = tool_output_tokens
+        self.summary_model = summary_model
+        self.max_sessions = max_sessions
+        self._encoding = None
+        self._token_cache: "OrderedDict[str, int]" = OrderedDict()
+        # session_id -> {"upto": fingerprint of the last folded message, "summary": text}
+        self._summaries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._summarizing: Dict[str, asyncio.Task] = {}
+
+    def load_tokenizer(self):
+        """Load the tiktoken encoding (may download it); falls back to a length heuristic"""
+        if tiktoken is None:
+            return
+        try:
+            self._encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning("Tokenizer unavailable, estimating tokens from length: %s", e)
+
+    def count_text_tokens(self, text: str) -> int:
+        """Tokens in a piece of text; uncached, so safe to call from worker threads"""
+        return len(self._encoding.encode(text)) if self._encoding else len(text) // 4 + 1
+
+    def count_tokens(self, message: Dict) -> int:
+        """Approximate chat tokens for a message (content and tool calls + per-message overhead)"""
+        content = message.get("content") or ""
+        for call in message.get("tool_calls") or ():
+            content += call["function"]["name"] + call["function"]["arguments"]
+        cached = self._token_cache.get(content)
+        if cached is None:
+            cached = len(self._encoding.encode(content)) if self._encoding else len(content) // 4 + 1
+            self._token_cache[content] = cached
+            if len(self._token_cache) > 4096:
+                self._token_cache.popitem(last=False)
+        else:
+            self._token_cache.move_to_end(content)
+        return cached + 4
+
+    @staticmethod
+    def _fingerprint(message: Dict) -> str:
+        return hashlib.sha1(f"{message.get('role')}:{message.get('content')}".encode()).hexdigest()
+
+    def _compress_tool_output(self, message: Dict) -> Dict:
+        content = message.get("content") or ""
+        max_chars = self.tool_output_tokens * 4
+        if len(content) <= max_chars:
+            return message
+        return {**message, "content": content[:max_chars] + "\n[older tool output truncated]"}
+
+    def build(self, session_id: str, messages: List[Dict], extra: Optional[List[Dict]] = None) -> List[Dict]:
+        """
+        Args:
+            session_id: Session the history belongs to (for the cached summary)
+            messages: Full stored history, system prompt first
+            extra: Messages appended after the history (e.g. GitHub context); counted against the budget
+
+        Returns:
+            Messages to send to the chat API
+        """
+        extra = extra or []
+        head = messages[:1] if messages and messages[0].get("role") == "system" else []
+        history = messages[len(head):]
+
+        # Tool outputs are only needed verbatim for the turn in progress
+        last_user = max((i for i, m in enumerate(history) if m.get("role") == "user"), default=len(history))
+        history = [
+            self._compress_tool_output(m)
+            if i < last_user and m.get("role") == "system" and (m.get("content") or "").startswith(TOOL_OUTPUT_PREFIXES)
+            else m
+            for i, m in enumerate(history)
+        ]
+
+        budget = self.budget_tokens - sum(self.count_tokens(m) for m in head + extra)
+        if sum(self.count_tokens(m) for m in history) <= budget:
+            return head + history + extra
+
+        # Fold everything except the most recent messages (and always the turn in progress) into the summary
+        cut = max(min(len(history) - self.keep_recent, last_user), 0)
+        folded, recent = history[:cut], history[cut:]
+        droppable = last_user - cut
+
+        summary_message = []
+        unsummarized = folded
+        cached = self._summaries.get(session_id)
+        if cached:
+            fingerprints = [self._fingerprint(m) for m in folded]
+            if cached["upto"] not in fingerprints:
+                # The history no longer contains what the summary ends with: summarize it again from scratch
+                # rather than folding the same messages in twice
+                del self._summaries[session_id]
+                cached = None
+        if cached:
+            unsummarized = folded[fingerprints.index(cached["upto"]) + 1:]
+            summary_message = [{"role": "system", "content": f"Summary of the earlier conversation:\n{cached['summary']}"}]
+            self._summaries.move_to_end(session_id)
+
+        if unsummarized:
+            self._schedule_summary(session_id, cached["summary"] if cached else None, unsummarized)
+
+        # Whatever isn't summarized yet goes in verbatim, newest first, while it fits
+        budget -= sum(self.count_tokens(m) for m in summary_message + recent)
+        kept = []
+        for message in reversed(unsummarized):
+            cost = self.count_tokens(message)
+            if cost > budget:
+                break
+            kept.insert(0, message)
+            budget -= cost
+
+        # The turn in progress is always sent; older recent messages go first if it doesn't fit
+        while droppable > 0 and budget < 0:
+            budget += self.count_tokens(recent.pop(0))
+            droppable -= 1
+
+        return head + summary_message + kept + recent + extra
+
+    def _schedule_summary(self, session_id: str, previous: Optional[str], messages: List[Dict]):
+        if session_id in self._summarizing:
+            return
+        task = asyncio.create_task(self._summarize(session_id, previous, messages))
+        self._summarizing[session_id] = task
+        task.add_done_callback(lambda _: self._summarizing.pop(session_id, None))
+
+    async def _summarize(self, session_id: str, previous: Optional[str], messages: List[Dict]):
+        transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in messages)
+        if previous:
+            transcript = f"Summary so far:\n{previous}\n\nNewer messages:\n{transcript}"
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.summary_model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": transcript}
+                ],
+                max_tokens=250,
+                temperature=0.2
+            )
+            summary = response.choices[0].message.content
+        except Exception as e:
+            logger.error("Error summarizing conversation %s: %s", session_id, e)
+            return
+
+        self._summaries[session_id] = {"upto": self._fingerprint(messages[-1]), "summary": summary}
+        self._summaries.move_to_end(session_id)
+        while len(self._summaries) > self.max_sessions:
+            self._summaries.popitem(last=False)
+
+    def forget(self, session_id: str):
+        """Drop the cached summary for a session"""
+        self._summaries.pop(session_id, None)
+        task = self._summarizing.pop(session_id, None)
+        if task:
+            task.cancel()
@@ -0,0 +1,270 @@
+"""
+Conversation history storage for Jarvis
+Bounded per-session message history with TTL/LRU eviction and pluggable backends
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+class ConversationStore:
+    """
+    Base class for conversation backends.
+
+    Sessions expire after `ttl_seconds` without activity, the least recently
+    used session is evicted once `max_sessions` is exceeded, and each session
+    keeps at most `max_messages` messages / `max_bytes` of content. When a
+    session is trimmed, its leading system prompt is always kept.
+
+    `blocking` backends do disk I/O; async callers should run their
+    methods off the event loop.
+    """
+
+    blocking = False
+
+    def __init__(self, ttl_seconds: float = 3600, max_sessions: int = 1000,
+                 max_messages: int = 50, max_bytes: int = 256 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "ttl_evictions": 0,
+            "lru_evictions": 0,
+            "trimmed_messages": 0
+        }
+
+    def get(self, session_id: str) -> Optional[List[Dict]]:
+        """Return a copy of the session's messages, or None if it doesn't exist"""
+        raise NotImplementedError
+
+    def create(self, session_id: str, messages: List[Dict]):
+        """Start (or replace) a session with the given messages"""
+        raise NotImplementedError
+
+    def append(self, session_id: str, message: Dict):
+        """Append a message to an existing session, trimming it to the caps"""
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def __contains__(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def metrics(self) -> Dict:
+        """Counters plus current size, for health/metrics endpoints"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _message_size(message: Dict) -> int:
+        return len(message.get("content") or "")
+
+    def _trim(self, messages: List[Dict]) -> List[Dict]:
+        """Drop the oldest non-system-prompt messages until the session fits its caps"""
+        keep_head = 1 if messages and messages[0].get("role") == "system" else 0
+        size = sum(self._message_size(m) for m in messages)
+        drop = 0
+        while len(messages) - drop > max(self.max_messages, keep_head + 1) or \
+                (size > self.max_bytes and len(messages) - drop > keep_head + 1):
+            size -= self._message_size(messages[keep_head + drop])
+            drop += 1
+        if drop:
+            self.stats["trimmed_messages"] += drop
+            messages = messages[:keep_head] + messages[keep_head + drop:]
+        return messages
+
+
+class InMemoryConversationStore(ConversationStore):
+    """In-process backend: an OrderedDict kept in LRU order"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        # Oldest-touched sessions sit at the front, so expired ones are found first
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session["touched_at"] > self.ttl_seconds:
+                self._sessions.popitem(last=False)
+                self.stats["ttl_evictions"] += 1
+            elif len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats["lru_evictions"] += 1
+            else:
+                break
+
+    def _touch(self, session_id: str) -> Optional[Dict]:
+        now = time.monotonic()
+        self._evict(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        session["touched_at"] = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def get(self, session_id: str) -> Optional[List[Dict]]:
+        with self._lock:
+            session = self._touch(session_id)
+            return list(session["messages"]) if session else None
+
+    def create(self, session_id: str, messages: List[Dict]):
+        with self._lock:
+            self._sessions[session_id] = {
+                "messages": self._trim(list(messages)),
+                "touched_at": time.monotonic()
+            }
+            self._sessions.move_to_end(session_id)
+            self._evict(time.monotonic())
+
+    def append(self, session_id: str, message: Dict):
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                return
+            session["messages"].append(message)
+            session["messages"] = self._trim(session["messages"])
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            self._evict(time.monotonic())
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            messages = sum(len(s["messages"]) for s in self._sessions.values())
+            size = sum(self._message_size(m) for s in self._sessions.values() for m in s["messages"])
+        return {"backend": "memory", "sessions": len(self._sessions), "messages": messages, "bytes": size, **self.stats}
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    SQLite backend: sessions survive restarts. Runs in WAL mode with
+    synchronous=NORMAL so appends don't fsync on every turn.
+
+    Expired sessions are ignored on read; the TTL/LRU sweep only runs when
+    a session is created, since that is the only way the table grows.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = "conversations.db", **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, touched_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched_at)")
+
+    def _evict(self, now: float):
+        expired = self._db.execute("DELETE FROM sessions WHERE touched_at < ?", (now - self.ttl_seconds,)).rowcount
+        self.stats["ttl_evictions"] += max(expired, 0)
+        overflow = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM sessions WHERE session_id IN "
+                "(SELECT session_id FROM sessions ORDER BY touched_at LIMIT ?)", (overflow,)
+            )
+            self.stats["lru_evictions"] += overflow
+
+    def _load(self, session_id: str) -> Optional[List[Dict]]:
+        now = time.time()
+        row = self._db.execute(
+            "SELECT messages FROM sessions WHERE session_id = ? AND touched_at >= ?",
+            (session_id, now - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self._db.execute("UPDATE sessions SET touched_at = ? WHERE session_id = ?", (now, session_id))
+        return json.loads(row[0])
+
+    def _save(self, session_id: str, messages: List[Dict]):
+        self._db.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, messages, touched_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(messages), time.time())
+        )
+
+    def get(self, session_id: str) -> Optional[List[Dict]]:
+        with self._lock:
+            return self._load(session_id)
+
+    def create(self, session_id: str, messages: List[Dict]):
+        with self._lock:
+            self._save(session_id, self._trim(list(messages)))
+            self._evict(time.time())
+
+    def append(self, session_id: str, message: Dict):
+        with self._lock:
+            messages = self._load(session_id)
+            if messages is None:
+                return
+            messages.append(message)
+            self._save(session_id, self._trim(messages))
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ? AND touched_at >= ?",
+                (session_id, time.time() - self.ttl_seconds)
+            ).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM sessions WHERE touched_at >= ?", (time.time() - self.ttl_seconds,)
+            ).fetchone()[0]
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            sessions, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(messages)), 0) FROM sessions WHERE touched_at >= ?",
+                (time.time() - self.ttl_seconds,)
+            ).fetchone()
+        return {"backend": "sqlite", "sessions": sessions, "bytes": size, **self.stats}
+
+
+def create_conversation_store() -> ConversationStore:
+    """Build the store configured by CONVERSATION_STORE (memory | sqlite)"""
+    options = {
+        "ttl_seconds": float(os.getenv("CONVERSATION_TTL_SECONDS", "3600")),
+        "max_sessions": int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000")),
+        "max_messages": int(os.getenv("CONVERSATION_MAX_MESSAGES", "50")),
+        "max_bytes": int(os.getenv("CONVERSATION_MAX_BYTES", str(256 * 1024)))
+    }
+    backend = os.getenv("CONVERSATION_STORE", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteConversationStore(os.getenv("CONVERSATION_DB_PATH", "conversations.db"), **options)
+    return InMemoryConversationStore(**options)
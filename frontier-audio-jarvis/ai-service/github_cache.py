@@ -0,0 +1,173 @@
+"""
+Persistent cache for GitHub API reads
+Conditional requests (ETag / Last-Modified) with per-endpoint TTLs, plus blob content by SHA
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+from log import get_logger
+
+logger = get_logger("github_cache")
+
+# How long a response is served without asking GitHub at all (seconds); after
+# that it is revalidated with a conditional request. Keys are endpoint names
+# used by GitHubService.
+DEFAULT_TTLS = {
+    "search/code": 600,
+    "search/repositories": 1800,
+    "contents": 300,
+    "ref": 0,  # Always revalidated: branches are created from it
+    "commit": 30 * 86400,  # Addressed by SHA, so never changes
+}
+
+
+@dataclass
+class CachedResponse:
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    age: float
+
+
+class GitHubCache:
+    """
+    SQLite-backed response and blob cache; entries survive restarts.
+
+    Responses are keyed by URL and query. Within the endpoint's TTL they are
+    served locally. Once stale, the caller revalidates with If-None-Match /
+    If-Modified-Since. GitHub answers an unchanged resource with 304, which
+    doesn't count against the rate limit. Blob content is keyed by its git
+    SHA, so it is immutable and never expires.
+
+    Both tables are capped at `max_bytes` each and evict least recently used
+    rows first.
+    """
+
+    def __init__(self, path: str, ttls: Optional[Dict[str, float]] = None, max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body TEXT NOT NULL, etag TEXT, "
+            "last_modified TEXT, fetched_at REAL NOT NULL, touched_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (sha TEXT PRIMARY KEY, content TEXT NOT NULL, touched_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_touched ON responses (touched_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS blobs_touched ON blobs (touched_at)")
+        self._stats = {
+            "fresh_hits": 0, "revalidated": 0, "misses": 0, "blob_hits": 0, "blob_misses": 0,
+            "rate_limit_saved_core": 0, "rate_limit_saved_search": 0, "rate_limit_saved_code_search": 0
+        }
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict] = None) -> str:
+        return f"{url}?{urlencode(sorted(params.items()))}" if params else url
+
+    def ttl(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, 60)
+
+    def lookup(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            self._db.execute("UPDATE responses SET touched_at = ? WHERE key = ?", (now, key))
+        body, etag, last_modified, fetched_at = row
+        return CachedResponse(body, etag, last_modified, now - fetched_at)
+
+    def store(self, key: str, body: str, etag: Optional[str], last_modified: Optional[str]):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, body, etag, last_modified, fetched_at, touched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (key, body, etag, last_modified, now, now)
+            )
+            self._evict("responses", "key", "body")
+
+    def revalidated(self, key: str, resource: str):
+        """GitHub answered 304: the stored body is current again"""
+        with self._lock:
+            self._db.execute("UPDATE responses SET fetched_at = ? WHERE key = ?", (time.time(), key))
+            self._stats["revalidated"] += 1
+            self._stats[f"rate_limit_saved_{resource}"] += 1
+
+    def record(self, outcome: str, resource: str):
+        """Count a fresh hit (no request made, one saved against `resource`) or a miss"""
+        with self._lock:
+            if outcome == "fresh":
+                self._stats["fresh_hits"] += 1
+                self._stats[f"rate_limit_saved_{resource}"] += 1
+            else:
+                self._stats["misses"] += 1
+
+    def get_blob(self, sha: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT content FROM blobs WHERE sha = ?", (sha,)).fetchone()
+            if row is None:
+                self._stats["blob_misses"] += 1
+                return None
+            self._db.execute("UPDATE blobs SET touched_at = ? WHERE sha = ?", (time.time(), sha))
+            self._stats["blob_hits"] += 1
+            self._stats["rate_limit_saved_core"] += 1
+        return row[0]
+
+    def put_blob(self, sha: str, content: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO blobs (sha, content, touched_at) VALUES (?, ?, ?)", (sha, content, time.time())
+            )
+            self._evict("blobs", "sha", "content")
+
+    def _evict(self, table: str, key_column: str, size_column: str):
+        """Caller holds the lock"""
+        size = self._db.execute(f"SELECT COALESCE(SUM(LENGTH({size_column})), 0) FROM {table}").fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        for key, length in self._db.execute(
+                f"SELECT {key_column}, LENGTH({size_column}) FROM {table} ORDER BY touched_at").fetchall():
+            self._db.execute(f"DELETE FROM {table} WHERE {key_column} = ?", (key,))
+            size -= length
+            if size <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            counters = dict(self._stats)
+            counters["responses"] = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            counters["blobs"] = self._db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        lookups = counters["fresh_hits"] + counters["revalidated"] + counters["misses"]
+        counters["hit_rate"] = (counters["fresh_hits"] + counters["revalidated"]) / lookups if lookups else 0.0
+        return counters
+
+
+def create_github_cache() -> Optional[GitHubCache]:
+    """Configured from GITHUB_CACHE, GITHUB_CACHE_PATH, GITHUB_CACHE_MAX_BYTES and GITHUB_CACHE_TTLS"""
+    if os.getenv("GITHUB_CACHE", "true").lower() != "true":
+        return None
+    ttls = {}
+    # e.g. GITHUB_CACHE_TTLS="search/code=300,contents=60"
+    for override in filter(None, os.getenv("GITHUB_CACHE_TTLS", "").split(",")):
+        endpoint, _, ttl = override.partition("=")
+        ttls[endpoint.strip()] = float(ttl)
+    path = os.getenv("GITHUB_CACHE_PATH", os.path.join(tempfile.gettempdir(), "jarvis-github-cache.db"))
+    try:
+        return GitHubCache(path, ttls, max_bytes=int(os.getenv("GITHUB_CACHE_MAX_BYTES", str(64 * 1024 * 1024))))
+    except sqlite3.Error as e:
+        logger.warning("GitHub cache unavailable (%s): %s", path, e)
+        return None
@@ -0,0 +1,144 @@
+"""
+Client-side scheduling of GitHub API calls against the rate limit
+Token bucket per resource class, kept in sync with the X-RateLimit-* and Retry-After headers
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from log import get_logger
+
+logger = get_logger("github_rate_limit")
+
+# Requests that must not lose to background work (user-initiated PR writes)
+PRIORITY_INTERACTIVE = 0
+# Context fetches that can simply be skipped when the budget is tight
+PRIORITY_BACKGROUND = 1
+
+# GitHub's limits per resource (as named by X-RateLimit-Resource): (requests, window seconds)
+AUTHENTICATED_LIMITS = {"core": (5000, 3600), "search": (30, 60), "code_search": (10, 60)}
+ANONYMOUS_LIMITS = {"core": (60, 3600), "search": (10, 60), "code_search": (10, 60)}
+
+
+class RateLimited(requests.RequestException):
+    """Rejected locally: the rate-limit budget for this resource is used up"""
+
+
+class TokenBucket:
+    def __init__(self, capacity: int, window_seconds: float):
+        self.capacity = capacity
+        self.rate = capacity / window_seconds
+        self.tokens = float(capacity)
+        self.updated = time.time()
+        # Set from X-RateLimit-Reset / Retry-After: nothing goes out before this (epoch seconds)
+        self.blocked_until = 0.0
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class GitHubRateLimiter:
+    """
+    Every GitHub request takes a token from its resource's bucket first.
+
+    Background requests may not dip into the last `reserve` share of a
+    bucket and never wait: if no token is available they fail immediately
+    with RateLimited, without a round trip that is bound to fail.
+    Interactive requests can use the whole bucket and wait up to `max_wait`
+    seconds for a token.
+
+    Responses correct the local estimate. X-RateLimit-Remaining caps the
+    tokens. Remaining 0 blocks the resource until X-RateLimit-Reset.
+    Retry-After (secondary limits) blocks it for that long.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[int, float]], reserve: float = 0.2, max_wait: float = 2.0):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self._buckets = {resource: TokenBucket(*limit) for resource, limit in limits.items()}
+        self._lock = threading.Lock()
+        self._stats = {resource: {"requests": 0, "rejected": 0, "throttled": 0, "waited_seconds": 0.0}
+                       for resource in limits}
+
+    def acquire(self, resource: str, priority: int = PRIORITY_BACKGROUND):
+        """
+        Take a token for one request, waiting if allowed
+
+        Args:
+            resource: Resource class ("core", "search", "code_search")
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND
+
+        Raises:
+            RateLimited: No token within the wait this priority allows
+        """
+        bucket = self._buckets.get(resource)
+        if bucket is None:
+            return
+        interactive = priority == PRIORITY_INTERACTIVE
+        floor = 0 if interactive else self.reserve * bucket.capacity
+        start = time.time()
+        deadline = start + (self.max_wait if interactive else 0)
+        while True:
+            with self._lock:
+                now = time.time()
+                bucket.refill(now)
+                if bucket.blocked_until <= now and bucket.tokens >= floor + 1:
+                    bucket.tokens -= 1
+                    stats = self._stats[resource]
+                    stats["requests"] += 1
+                    stats["waited_seconds"] += now - start
+                    return
+                ready_at = max(bucket.blocked_until, now + (floor + 1 - bucket.tokens) / bucket.rate)
+                if ready_at > deadline:
+                    self._stats[resource]["rejected"] += 1
+                    raise RateLimited(f"GitHub {resource} rate limit reached; retry in {ready_at - now:.0f}s")
+            time.sleep(ready_at - now)
+
+    def observe(self, resource: str, response: requests.Response):
+        """Update the bucket from a response's rate-limit headers"""
+        headers = response.headers
+        resource = headers.get("X-RateLimit-Resource", resource)
+        bucket = self._buckets.get(resource)
+        if bucket is None:
+            return
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        retry_after = headers.get("Retry-After")
+        with self._lock:
+            if remaining is not None and remaining.isdigit():
+                bucket.tokens = min(bucket.capacity, int(remaining))
+                if int(remaining) == 0 and reset and reset.isdigit():
+                    bucket.blocked_until = max(bucket.blocked_until, float(reset))
+            if response.status_code in (403, 429) and (retry_after or remaining == "0"):
+                self._stats[resource]["throttled"] += 1
+                if retry_after and retry_after.isdigit():
+                    bucket.blocked_until = max(bucket.blocked_until, time.time() + int(retry_after))
+                logger.warning("GitHub %s rate limit hit; blocked for %.0fs", resource,
+                               max(0.0, bucket.blocked_until - time.time()))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Counters plus current tokens and block time per resource"""
+        with self._lock:
+            now = time.time()
+            result = {}
+            for resource, bucket in self._buckets.items():
+                bucket.refill(now)
+                result[resource] = {**self._stats[resource], "tokens": bucket.tokens,
+                                    "blocked_seconds": max(0.0, bucket.blocked_until - now)}
+            return result
+
+
+def create_github_rate_limiter(authenticated: bool) -> Optional[GitHubRateLimiter]:
+    """Configured from GITHUB_RATE_LIMITER, GITHUB_RATE_RESERVE and GITHUB_RATE_MAX_WAIT"""
+    if os.getenv("GITHUB_RATE_LIMITER", "true").lower() != "true":
+        return None
+    return GitHubRateLimiter(
+        AUTHENTICATED_LIMITS if authenticated else ANONYMOUS_LIMITS,
+        reserve=float(os.getenv("GITHUB_RATE_RESERVE", "0.2")),
+        max_wait=float(os.getenv("GITHUB_RATE_MAX_WAIT", "2"))
+    )
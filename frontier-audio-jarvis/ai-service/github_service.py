@@ -3,22 +3,121 @@ GitHub Integration Service for Jarvis
 Provides code search and repository querying capabilities
 """
 
+import base64
+import contextvars
+import json
 import os
-from typing import Optional, List, Dict
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, List, Dict
 from dotenv import load_dotenv
+from code_snippets import extract_snippets, query_terms, rank_bm25
+from github_cache import GitHubCache
+from github_rate_limit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, GitHubRateLimiter, RateLimited
+from http_client import HTTPClient, get_http_client
+from log import get_logger
+
+logger = get_logger("github")
 
 load_dotenv()
 
 class GitHubService:
-    def __init__(self):
+    def __init__(self, http: Optional[HTTPClient] = None, cache: Optional[GitHubCache] = None,
+                 limiter: Optional[GitHubRateLimiter] = None):
+        self.http = http or get_http_client()
+        # Optional response/blob cache for reads (see github_cache.py)
+        self.cache = cache
+        # Optional client-side rate-limit scheduling (see github_rate_limit.py)
+        self.limiter = limiter
+        # Bounded fan-out for blob uploads (multi-file PRs) and file fetches (code context)
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("GITHUB_CONCURRENCY", "8")),
+            thread_name_prefix="jarvis-github"
+        )
+        # Files fetched for code context, and its size in tokens
+        self.context_files = int(os.getenv("GITHUB_CONTEXT_FILES", "4"))
+        self.context_tokens = int(os.getenv("GITHUB_CONTEXT_TOKENS", "800"))
         self.token = os.getenv("GITHUB_TOKEN", "")
         self.base_url = "https://api.github.com"
+        # A 429 goes straight to the limiter (which blocks the resource until it resets)
+        # instead of being retried and slept on in the HTTP layer
+        self.http.mount_without_throttle_retries(self.base_url + "/")
         self.headers = {
             "Accept": "application/vnd.github.v3+json"
         }
         if self.token:
             self.headers["Authorization"] = f"token {self.token}"
+
+    @staticmethod
+    def _resource(endpoint: str) -> str:
+        """GitHub rate-limit resource an endpoint counts against"""
+        if endpoint == "search/code":
+            return "code_search"
+        return "search" if endpoint.startswith("search/") else "core"
+
+    def _request(self, method: str, endpoint: str, url: str, priority: int = PRIORITY_BACKGROUND, **kwargs):
+        """
+        Send one request through the rate limiter
+
+        Raises:
+            RateLimited: The budget for this endpoint is used up (nothing was sent)
+        """
+        resource = self._resource(endpoint)
+        if self.limiter:
+            self.limiter.acquire(resource, priority)
+        kwargs.setdefault("headers", self.headers)
+        response = self.http.request(method, url, **kwargs)
+        if self.limiter:
+            self.limiter.observe(resource, response)
+        return response
+
+    def _get_json(self, endpoint: str, url: str, params: Optional[Dict] = None, priority: int = PRIORITY_BACKGROUND):
+        """
+        GET a JSON resource through the cache: served locally within the
+        endpoint's TTL, otherwise fetched with a conditional request so an
+        unchanged resource comes back as a (rate-limit-free) 304
+
+        Args:
+            endpoint: Endpoint name selecting the TTL (e.g. "search/code")
+            url: Request URL
+            params: Query parameters
+            priority: Rate-limit priority (github_rate_limit.PRIORITY_*)
+
+        Returns:
+            Decoded JSON body; raises requests.HTTPError on error statuses
+        """
+        if not self.cache:
+            response = self._request("GET", endpoint, url, priority, params=params)
+            response.raise_for_status()
+            return response.json()
+
+        resource = self._resource(endpoint)
+        key = self.cache.key(url, params)
+        cached = self.cache.lookup(key)
+        if cached and cached.age < self.cache.ttl(endpoint):
+            self.cache.record("fresh", resource)
+            return json.loads(cached.body)
+
+        headers = self.headers
+        if cached:
+            headers = dict(self.headers)
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        try:
+            response = self._request("GET", endpoint, url, priority, headers=headers, params=params)
+        except RateLimited:
+            if not cached:
+                raise
+            logger.info("GitHub %s rate limited; using a %.0fs old cached response", resource, cached.age)
+            return json.loads(cached.body)
+        if cached and response.status_code == 304:
+            self.cache.revalidated(key, resource)
+            return json.loads(cached.body)
+        response.raise_for_status()
+        self.cache.record("miss", resource)
+        self.cache.store(key, response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return response.json()
     
     def search_code(self, query: str, max_results: int = 5) -> List[Dict]:
         """
@@ -38,10 +137,7 @@ class GitHubService:
                 "per_page": max_results
             }
             
-            response = requests.get(url, headers=self.headers, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._get_json("search/code", url, params)
             results = []
             
             for item in data.get("items", [])[:max_results]:
@@ -50,38 +146,49 @@ class GitHubService:
                     "path": item.get("path"),
                     "repository": item.get("repository", {}).get("full_name"),
                     "html_url": item.get("html_url"),
-                    "score": item.get("score")
+                    "score": item.get("score"),
+                    "sha": item.get("sha")
                 })
             
             return results
+        except RateLimited as e:
+            logger.warning("GitHub code search skipped: %s", e)
+            return []
         except Exception as e:
-            print(f"Error searching GitHub code: {e}")
+            logger.error("Error searching GitHub code: %s", e)
             return []
     
-    def get_file_content(self, repo: str, path: str) -> Optional[str]:
+    def get_file_content(self, repo: str, path: str, sha: Optional[str] = None) -> Optional[str]:
         """
         Get the content of a specific file from a repository
         
         Args:
             repo: Repository name (e.g., "facebook/react")
             path: File path within the repository
+            sha: Blob SHA if known (e.g. from search_code); cached content is then used without a request
             
         Returns:
             File content as string, or None if error
         """
         try:
+            if sha and self.cache:
+                content = self.cache.get_blob(sha)
+                if content is not None:
+                    return content
+
             url = f"{self.base_url}/repos/{repo}/contents/{path}"
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._get_json("contents", url)
             
             # GitHub API returns base64 encoded content
-            import base64
             content = base64.b64decode(data.get("content", "")).decode("utf-8")
+            if self.cache and data.get("sha"):
+                self.cache.put_blob(data["sha"], content)
             return content
+        except RateLimited as e:
+            logger.warning("GitHub file fetch skipped: %s", e)
+            return None
         except Exception as e:
-            print(f"Error fetching file content: {e}")
+            logger.error("Error fetching file content: %s", e)
             return None
     
     def search_repositories(self, query: str, max_results: int = 5) -> List[Dict]:
@@ -104,10 +211,7 @@ class GitHubService:
                 "per_page": max_results
             }
             
-            response = requests.get(url, headers=self.headers, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._get_json("search/repositories", url, params)
             results = []
             
             for item in data.get("items", [])[:max_results]:
@@ -120,8 +224,11 @@ class GitHubService:
                 })
             
             return results
+        except RateLimited as e:
+            logger.warning("GitHub repository search skipped: %s", e)
+            return []
         except Exception as e:
-            print(f"Error searching repositories: {e}")
+            logger.error("Error searching repositories: %s", e)
             return []
     
     def is_code_related_query(self, text: str) -> bool:
@@ -144,31 +251,56 @@ class GitHubService:
         text_lower = text.lower()
         return any(keyword in text_lower for keyword in code_keywords)
     
-    def get_code_context(self, query: str) -> Optional[str]:
+    def get_code_context(self, query: str, count_tokens: Optional[Callable[[str], int]] = None) -> Optional[str]:
         """
-        Get relevant code context for a query
+        Get relevant code context for a query: the matching files are fetched
+        concurrently, the line windows around the query terms are ranked with
+        BM25, and the best ones are included up to `context_tokens`
         
         Args:
             query: User's question
+            count_tokens: Token counter for the budget (default: ~4 characters per token)
             
         Returns:
             Formatted string with code examples and links, or None
         """
-        if not self.is_code_related_query(query):
-            return None
-        
         # Search for relevant code
-        code_results = self.search_code(query, max_results=3)
+        code_results = self.search_code(query, max_results=self.context_files)
         
         if not code_results:
             return None
         
+        count_tokens = count_tokens or (lambda text: len(text) // 4 + 1)
+        wanted = query_terms(query)
+        fetches = [self._submit(self.get_file_content, r["repository"], r["path"], r.get("sha")) for r in code_results]
+        snippets = []
+        for result, fetch in zip(code_results, fetches):
+            content = fetch.result()
+            if content:
+                snippets.extend(extract_snippets(result, content, wanted))
+        
         context = "I found some relevant code examples on GitHub:\n\n"
+        used = count_tokens(context)
+        shown = set()
+        for snippet in rank_bm25(snippets, wanted):
+            block = (f"**{snippet.path}** in {snippet.repository} (lines {snippet.start}-{snippet.end})\n"
+                     f"Link: {snippet.html_url}#L{snippet.start}-L{snippet.end}\n"
+                     f"```\n{snippet.text}\n```\n\n")
+            tokens = count_tokens(block)
+            if used + tokens > self.context_tokens:
+                continue
+            context += block
+            used += tokens
+            shown.add((snippet.repository, snippet.path))
         
-        for idx, result in enumerate(code_results, 1):
-            context += f"{idx}. **{result['name']}** in {result['repository']}\n"
-            context += f"   Link: {result['html_url']}\n"
-            context += f"   Path: {result['path']}\n\n"
+        # Matches whose content couldn't be fetched or didn't fit are still worth a link
+        others = [r for r in code_results if (r["repository"], r["path"]) not in shown]
+        for idx, result in enumerate(others, 1):
+            line = f"{idx}. **{result['name']}** in {result['repository']}\n   Link: {result['html_url']}\n"
+            if used + count_tokens(line) > self.context_tokens:
+                break
+            context += line
+            used += count_tokens(line)
         
         return context
 
@@ -177,9 +309,7 @@ class GitHubService:
         try:
             # Get SHA of base branch
             url = f"{self.base_url}/repos/{repo}/git/ref/heads/{base_branch}"
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            sha = response.json()["object"]["sha"]
+            sha = self._get_json("ref", url, priority=PRIORITY_INTERACTIVE)["object"]["sha"]
             
             # Create new branch
             url = f"{self.base_url}/repos/{repo}/git/refs"
@@ -187,11 +317,11 @@ class GitHubService:
                 "ref": f"refs/heads/{branch_name}",
                 "sha": sha
             }
-            response = requests.post(url, headers=self.headers, json=data)
+            response = self._request("POST", "refs", url, PRIORITY_INTERACTIVE, json=data)
             response.raise_for_status()
             return True
         except Exception as e:
-            print(f"Error creating branch: {e}")
+            logger.error("Error creating branch: %s", e)
             return False
 
     def create_file(self, repo: str, path: str, content: str, message: str, branch: str) -> bool:
@@ -202,13 +332,12 @@ class GitHubService:
             # Check if file exists to get SHA (for update)
             sha = None
             try:
-                resp = requests.get(url, headers=self.headers, params={"ref": branch})
+                resp = self._request("GET", "contents", url, PRIORITY_INTERACTIVE, params={"ref": branch})
                 if resp.status_code == 200:
                     sha = resp.json()["sha"]
             except:
                 pass
 
-            import base64
             content_b64 = base64.b64encode(content.encode("utf-8")).decode("utf-8")
             
             data = {
@@ -219,13 +348,79 @@ class GitHubService:
             if sha:
                 data["sha"] = sha
                 
-            response = requests.put(url, headers=self.headers, json=data)
+            response = self._request("PUT", "contents", url, PRIORITY_INTERACTIVE, json=data)
             response.raise_for_status()
             return True
         except Exception as e:
-            print(f"Error creating file: {e}")
+            logger.error("Error creating file: %s", e)
             return False
 
+    def _post_json(self, endpoint: str, url: str, payload: Dict):
+        response = self._request("POST", endpoint, url, PRIORITY_INTERACTIVE, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def _submit(self, func, *args):
+        # One context copy per task: a Context can only be entered by one thread at a time
+        return self._pool.submit(contextvars.copy_context().run, func, *args)
+
+    def _create_blob(self, repo: str, content: str) -> str:
+        payload = {"content": base64.b64encode(content.encode("utf-8")).decode("utf-8"), "encoding": "base64"}
+        return self._post_json("blobs", f"{self.base_url}/repos/{repo}/git/blobs", payload)["sha"]
+
+    def create_pull_request_with_files(self, repo: str, title: str, body: str, branch: str, files: List[Dict],
+                                       commit_message: str, base: str = "main") -> Optional[str]:
+        """
+        Open a pull request with any number of file changes in a single
+        commit, through the Git Data API: base ref -> blobs (concurrently,
+        alongside the base commit lookup) -> one tree -> one commit -> new
+        branch ref -> pull request. The number of sequential round trips
+        doesn't grow with the number of files.
+
+        Args:
+            repo: Repository name (e.g., "owner/repo")
+            title: PR title
+            body: PR description
+            branch: New branch to create for the commit
+            files: [{"path": ..., "content": ...}]; a content of None deletes the file
+            commit_message: Message of the commit
+            base: Branch to branch off and merge into
+
+        Returns:
+            URL of the pull request, or None if error
+        """
+        try:
+            repo_url = f"{self.base_url}/repos/{repo}"
+            base_ref = self._get_json("ref", f"{repo_url}/git/ref/heads/{base}", priority=PRIORITY_INTERACTIVE)
+            base_sha = base_ref["object"]["sha"]
+            base_commit = self._submit(
+                self._get_json, "commit", f"{repo_url}/git/commits/{base_sha}", None, PRIORITY_INTERACTIVE
+            )
+            blobs = [self._submit(self._create_blob, repo, f["content"]) if f.get("content") is not None else None
+                     for f in files]
+
+            tree = [{"path": f["path"], "mode": "100644", "type": "blob", "sha": blob.result() if blob else None}
+                    for f, blob in zip(files, blobs)]
+            tree_sha = self._post_json("trees", f"{repo_url}/git/trees", {
+                "base_tree": base_commit.result()["tree"]["sha"],
+                "tree": tree
+            })["sha"]
+            commit_sha = self._post_json("commits", f"{repo_url}/git/commits", {
+                "message": commit_message,
+                "tree": tree_sha,
+                "parents": [base_sha]
+            })["sha"]
+            self._post_json("refs", f"{repo_url}/git/refs", {"ref": f"refs/heads/{branch}", "sha": commit_sha})
+            return self._post_json("pulls", f"{repo_url}/pulls", {
+                "title": title,
+                "body": body,
+                "head": branch,
+                "base": base
+            })["html_url"]
+        except Exception as e:
+            logger.error("Error creating PR with %d files: %s", len(files), e)
+            return None
+
     def create_pull_request(self, repo: str, title: str, body: str, head: str, base: str = "main") -> Optional[str]:
         """Create a pull request"""
         try:
@@ -236,9 +431,9 @@ class GitHubService:
                 "head": head,
                 "base": base
             }
-            response = requests.post(url, headers=self.headers, json=data)
+            response = self._request("POST", "pulls", url, PRIORITY_INTERACTIVE, json=data)
             response.raise_for_status()
             return response.json()["html_url"]
         except Exception as e:
-            print(f"Error creating PR: {e}")
+            logger.error("Error creating PR: %s", e)
             return None
@@ -0,0 +1,166 @@
+"""
+Shared HTTP layer for Jarvis services
+Keep-alive connection pools per host, default timeouts, retry with backoff and usage metrics
+"""
+
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Set per call by the caller's context (see run_blocking in main.py); once the
+# event is set, new requests fail fast instead of going upstream
+http_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("http_cancel_event", default=None)
+
+
+class RequestCancelled(requests.RequestException):
+    """The work this request belonged to was cancelled before it was sent"""
+
+
+class BoundedRetry(Retry):
+    """Retry that never sleeps longer than `max_retry_after` on a Retry-After header"""
+
+    max_retry_after = 5.0
+
+    def get_retry_after(self, response) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_retry_after)
+
+
+class HTTPClient:
+    """
+    Thin wrapper around one requests.Session shared by GitHubService and
+    SearchService. Connections are reused per host (TCP + TLS handshake
+    once), every request gets a default timeout, and idempotent requests
+    are retried with exponential backoff on 429/5xx. Hosts whose callers
+    schedule around rate limits themselves can opt out of the 429 retries
+    (see mount_without_throttle_retries).
+    """
+
+    def __init__(self, pool_connections: int = 16, pool_maxsize: int = 16, timeout: float = 10,
+                 retries: int = 2, backoff_factor: float = 0.3):
+        self.timeout = timeout
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.session = requests.Session()
+        self.retry = BoundedRetry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        # pool_connections = number of hosts kept, pool_maxsize = keep-alive connections per host
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=self.retry)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self._adapters = [self.adapter]
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, float]] = {}
+
+    def mount_without_throttle_retries(self, prefix: str):
+        """
+        Requests to `prefix` (e.g. "https://api.github.com/") still retry
+        connection errors and 5xx, but get 429s back immediately, without
+        sleeping on Retry-After, so the caller's rate limiter sees them
+        """
+        if prefix in self.session.adapters:
+            # Already routed: mounted before, or a transport of its own (e.g. a benchmark stub)
+            return
+        retry = self.retry.new(status_forcelist=(500, 502, 503, 504), respect_retry_after_header=False)
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize, max_retries=retry)
+        self.session.mount(prefix, adapter)
+        with self._lock:
+            self._adapters.append(adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        cancelled = http_cancel_event.get()
+        if cancelled is not None and cancelled.is_set():
+            raise RequestCancelled(f"{method} {url} cancelled")
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+        start = time.perf_counter()
+        response = None
+        try:
+            response = self.session.request(method, url, **kwargs)
+            return response
+        finally:
+            self._record(host, time.perf_counter() - start, response)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PATCH", url, **kwargs)
+
+    def _record(self, host: str, elapsed: float, response: Optional[requests.Response]):
+        retries = 0
+        if response is not None and response.raw is not None and getattr(response.raw, "retries", None):
+            retries = len(response.raw.retries.history)
+        with self._lock:
+            stats = self._hosts.setdefault(host, {
+                "requests": 0, "errors": 0, "retries": 0, "seconds_total": 0.0
+            })
+            stats["requests"] += 1
+            stats["retries"] += retries
+            stats["seconds_total"] += elapsed
+            if response is None or response.status_code >= 400:
+                stats["errors"] += 1
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """Per-host request counters plus connection pool usage"""
+        with self._lock:
+            hosts = {host: dict(stats) for host, stats in self._hosts.items()}
+        with self._lock:
+            adapters = list(self._adapters)
+        pool_list = []
+        for adapter in adapters:
+            pools = adapter.poolmanager.pools
+            with pools.lock:
+                pool_list.extend(pools._container.values())
+        for pool in pool_list:
+            host = pool.host if pool.port in (None, 80, 443) else f"{pool.host}:{pool.port}"
+            stats = hosts.setdefault(host, {"requests": 0, "errors": 0, "retries": 0, "seconds_total": 0.0})
+            # A host can have a pool in more than one adapter (see mount_without_throttle_retries)
+            stats["connections_opened"] = stats.get("connections_opened", 0) + pool.num_connections
+            stats["pool_requests"] = stats.get("pool_requests", 0) + pool.num_requests
+            # The pool queue holds None placeholders for connections not opened yet
+            idle = sum(1 for conn in list(pool.pool.queue) if conn) if pool.pool else 0
+            stats["idle_connections"] = stats.get("idle_connections", 0) + idle
+        return hosts
+
+    def close(self):
+        self.session.close()
+
+
+_shared_client: Optional[HTTPClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_http_client() -> HTTPClient:
+    """Process-wide client configured from HTTP_* environment variables"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HTTPClient(
+                pool_connections=int(os.getenv("HTTP_POOL_HOSTS", "16")),
+                pool_maxsize=int(os.getenv("HTTP_POOL_SIZE", "16")),
+                timeout=float(os.getenv("HTTP_TIMEOUT", "10")),
+                retries=int(os.getenv("HTTP_RETRIES", "2")),
+                backoff_factor=float(os.getenv("HTTP_BACKOFF", "0.3"))
+            )
+        return _shared_client
@@ -0,0 +1,121 @@
+"""
+Structured, non-blocking logging for the AI service
+
+Records are handed to a bounded queue and written by a background thread,
+so the event loop never blocks on stdout. Hot-path messages (per audio
+chunk, per token) go through log_sampled() and are emitted 1 in N.
+"""
+
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_sample_counts: Dict[str, int] = {}
+_sample_lock = threading.Lock()
+SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "50"))
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or raising"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may be mutated later); traceback formatting stays on the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    `text`: "time LEVEL logger: message key=value ..."
+    `json`: one JSON object per line
+    Extra fields are passed as logger.info("msg", extra={"fields": {...}}).
+    """
+
+    def __init__(self, fmt: str = "text"):
+        super().__init__()
+        self.json = fmt == "json"
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        message = record.getMessage()
+        if record.exc_info:
+            fields = {**fields, "exc": self.formatException(record.exc_info)}
+        if self.json:
+            return json.dumps({
+                "ts": round(record.created, 3),
+                "level": record.levelname,
+                "logger": record.name,
+                "msg": message,
+                **fields
+            }, default=str)
+        timestamp = time.strftime("%H:%M:%S", time.localtime(record.created))
+        extra = "".join(f" {k}={v}" for k, v in fields.items())
+        return f"{timestamp} {record.levelname:<7} {record.name}: {message}{extra}"
+
+
+def configure_logging():
+    """
+    Route the `jarvis` loggers through a background writer thread.
+    Configured from LOG_LEVEL, LOG_FORMAT (text|json) and LOG_QUEUE_SIZE.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(StructuredFormatter(os.getenv("LOG_FORMAT", "text")))
+    log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+
+    root = logging.getLogger("jarvis")
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"jarvis.{name}")
+
+
+def log_sampled(logger: logging.Logger, level: int, key: str, msg: str, *args, every: int = 0, **fields):
+    """
+    Log only every Nth call for `key` (the first call always logs).
+    The level check comes first, so disabled hot-path logs cost one comparison.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    every = every or SAMPLE_EVERY
+    with _sample_lock:
+        count = _sample_counts.get(key, 0)
+        _sample_counts[key] = count + 1
+    if count % every == 0:
+        logger.log(level, msg, *args, extra={"fields": {**fields, "sampled": f"1/{every}"}})
@@ -1,19 +1,55 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from dotenv import load_dotenv
 import json
-import io
-from openai import OpenAI
-from pydub import AudioSegment
-import tempfile
+import logging
+import asyncio
+import contextvars
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from contextlib import asynccontextmanager
+from openai import AsyncOpenAI
+from audio_buffer import AudioBuffer, AudioLimitExceeded, create_audio_budget
+from audio_processing import Transcoder, VoiceActivityDetector, decoder_available, frame_levels
+from context_window import ContextWindow
+from conversation_store import create_conversation_store
+from github_cache import create_github_cache
+from github_rate_limit import create_github_rate_limiter
 from github_service import GitHubService
+from http_client import get_http_client, http_cancel_event
+from log import configure_logging, get_logger, log_sampled, shutdown_logging
+from metrics import TurnTrace, registry
 from search_service import SearchService
-from voice_service import VoiceService
+from tools import ToolCall, accumulate_tool_calls, assistant_message, create_tool_registry
+from transcription_service import TranscriptionService, StreamingTranscriber
+from tts_cache import create_tts_cache
+from tts_policy import FORMATS_BY_LATENCY, create_tts_policy
+from voice_service import VoiceService, AudioFrameSender, SentenceBuffer, SpeechStream, split_for_speech
 
 load_dotenv()
+configure_logging()
+logger = get_logger("main")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The tokenizer may need a download; load it off the loop without delaying startup
+    asyncio.get_running_loop().run_in_executor(blocking_executor, context_window.load_tokenizer)
+    if transcoder:
+        transcoder.warm_up()
+    yield
+    # Release pooled connections and worker threads on shutdown
+    blocking_executor.shutdown(wait=False, cancel_futures=True)
+    if transcode_executor:
+        transcode_executor.shutdown(wait=False, cancel_futures=True)
+    await client.close()
+    shutdown_logging()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS configuration for production
 allowed_origins = [
@@ -34,22 +70,464 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Initialize OpenAI client (async so Whisper/GPT/TTS calls never block the event loop)
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Bounded thread pool for the remaining blocking I/O (search providers, GitHub API).
+# Sized independently of the event loop so one slow provider can't starve other sessions.
+blocking_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BLOCKING_IO_WORKERS", "16")),
+    thread_name_prefix="jarvis-io"
+)
 
-# Initialize GitHub service
-github_service = GitHubService()
+# Initialize GitHub service (reads go through a persistent cache with conditional requests;
+# every call is scheduled against the rate limit, PR writes first)
+github_cache = create_github_cache()
+github_rate_limiter = create_github_rate_limiter(authenticated=bool(os.getenv("GITHUB_TOKEN")))
+github_service = GitHubService(cache=github_cache, limiter=github_rate_limiter)
 
 # Initialize Search service
 search_service = SearchService()
 
-# Initialize Voice service
-voice_service = VoiceService(client)
+# Initialize Voice service (repeated phrases are served from the TTS cache; model, voice
+# and format are picked per sentence by the TTS policy)
+tts_cache = create_tts_cache()
+tts_policy = create_tts_policy()
+voice_service = VoiceService(client, tts_cache, policy=tts_policy)
+
+# Optionally re-encode large recordings as mono 16 kHz Opus/FLAC before upload (off | opus | flac)
+TRANSCODE_FORMAT = os.getenv("TRANSCODE_FORMAT", "off").lower()
+if TRANSCODE_FORMAT != "off" and not decoder_available():
+    logger.warning("TRANSCODE_FORMAT needs ffmpeg; uploads are sent as recorded")
+    TRANSCODE_FORMAT = "off"
+transcode_executor = None
+transcoder = None
+if TRANSCODE_FORMAT != "off":
+    # Worker processes, since decoding and resampling in pydub hold the GIL; spawned so
+    # they don't inherit this process's threads
+    transcode_executor = ProcessPoolExecutor(
+        max_workers=int(os.getenv("TRANSCODE_WORKERS", "2")),
+        mp_context=multiprocessing.get_context("spawn")
+    )
+    transcoder = Transcoder(
+        transcode_executor,
+        fmt=TRANSCODE_FORMAT,
+        bitrate=os.getenv("TRANSCODE_BITRATE", "24k"),
+        min_bytes=int(os.getenv("TRANSCODE_MIN_BYTES", str(256 * 1024)))
+    )
+
+# Initialize Transcription service
+transcription_service = TranscriptionService(client, transcoder)
+
+# Stream GPT tokens and synthesize each sentence as soon as it is complete
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "3"))
+# Longest part a complete (non-streamed) response is split into for concurrent synthesis
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "300"))
+
+# Transcribe finished segments in the background while the user is still talking
+STREAMING_TRANSCRIPTION = os.getenv("STREAMING_TRANSCRIPTION", "true").lower() == "true"
+TRANSCRIPTION_WINDOW_SECONDS = float(os.getenv("TRANSCRIPTION_WINDOW_SECONDS", "5"))
+
+# Leading system message of every conversation (also when an evicted session is recreated)
+SYSTEM_PROMPT = """You are Jarvis, a helpful and intelligent voice assistant. Follow these guidelines:
+            
+1. Provide concise, accurate, and friendly responses.
+2. Always cite your sources when using external information.
+3. If you're uncertain about something, clearly state "I'm not certain" or "I don't know".
+4. When providing code examples, include links to documentation or GitHub repositories.
+5. Express confidence levels when appropriate (e.g., "I'm confident that...", "Based on the documentation...").
+6. Avoid speculation - stick to facts you can verify.
+7. If a question is outside your knowledge, suggest where the user might find the answer.
+
+You have access to the following tools and capabilities:
+- **Web Search**: Search the web for real-time information. Use this when asked about current events, facts, or things you don't know.
+  - **IMPORTANT**: If the user asks about "my anime list" or "MAL", they are referring to the public website `myanimelist.net`. You SHOULD search this website for ratings and information. It is NOT a private file.
+- **GitHub Integration**: Search public GitHub repositories for code examples.
+- **Weather**: Look up the current weather for a place.
+- **Real-time Interaction**: You can be interrupted by the user at any time.
+- **PR Creation**: Create a pull request when the user asks for one.
+These are available as tools. When a question needs several lookups, request them all at once.
+
+Your limitations:
+- You cannot access the user's private files or local system unless explicitly provided.
+- You cannot perform actions on the user's behalf outside of this chat interface.
+- PR creation requires a valid GitHub token with write access.
+"""
+
+# Store conversation history per session (bounded, TTL/LRU-evicted; see conversation_store.py)
+conversations = create_conversation_store()
+# Token-budgeted prompt assembly with rolling summaries of older turns
+context_window = ContextWindow(
+    client,
+    budget_tokens=int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000")),
+    keep_recent=int(os.getenv("CONTEXT_KEEP_RECENT", "6")),
+    tool_output_tokens=int(os.getenv("CONTEXT_TOOL_OUTPUT_TOKENS", "200")),
+    summary_model=os.getenv("SUMMARY_MODEL", os.getenv("GPT_MODEL", "gpt-4"))
+)
+
+# Tools offered to the model through function calling (web search, GitHub code search, PRs, weather)
+tools = create_tool_registry(search_service, github_service, context_window.count_text_tokens)
+# Most model calls per turn: each one may request tools, the last one has to answer
+MAX_TOOL_ROUNDS = int(os.getenv("MAX_TOOL_ROUNDS", "3"))
 
-# Store conversation history per connection
-conversations = {}
-# Store interrupt flags per connection
-interrupt_flags = {}
+# Recording limits: per-session caps, what to do when one is hit, and a shared memory budget
+AUDIO_MAX_BYTES = int(os.getenv("AUDIO_MAX_BYTES", str(20 * 1024 * 1024)))
+AUDIO_MAX_SECONDS = float(os.getenv("AUDIO_MAX_SECONDS", "300"))
+AUDIO_LIMIT_POLICY = os.getenv("AUDIO_LIMIT_POLICY", "finalize")  # finalize | reject
+AUDIO_BACKPRESSURE_TIMEOUT = float(os.getenv("AUDIO_BACKPRESSURE_TIMEOUT", "5"))
+audio_budget = create_audio_budget()
+
+# Optional server-side voice activity detection: end the utterance after a pause and trim silence
+SERVER_VAD = os.getenv("SERVER_VAD", "false").lower() == "true"
+if SERVER_VAD and not decoder_available():
+    logger.warning("SERVER_VAD needs ffmpeg to decode audio; voice activity detection is disabled")
+    SERVER_VAD = False
+VAD_THRESHOLD_DBFS = float(os.getenv("VAD_THRESHOLD_DBFS", "-45"))
+VAD_END_SILENCE_MS = int(os.getenv("VAD_END_SILENCE_MS", "800"))
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "250"))
+VAD_PADDING_MS = int(os.getenv("VAD_PADDING_MS", "300"))
+VAD_INTERVAL_SECONDS = float(os.getenv("VAD_INTERVAL_SECONDS", "0.3"))
+
+# Live audio buffers per connection (for the audio_buffer_bytes gauge)
+audio_buffers = {}
+
+vad_finalized = registry.counter("jarvis_vad_finalized_total", "Utterances ended by server-side voice activity detection")
+vad_trimmed_bytes = registry.counter("jarvis_vad_trimmed_bytes_total", "Recorded audio bytes not uploaded because they were silence")
+
+registry.gauge("jarvis_active_sessions", "Open websocket sessions", lambda: len(audio_buffers))
+registry.gauge("jarvis_conversations", "Sessions held in the conversation store", lambda: len(conversations))
+registry.gauge("jarvis_audio_buffer_bytes", "Bytes of buffered, unprocessed audio across sessions",
+               lambda: sum(len(buffer) for buffer in list(audio_buffers.values())))
+registry.gauge("jarvis_audio_memory_bytes", "Recording buffer memory budget",
+               lambda: {(("stat", k),): v for k, v in audio_budget.stats().items()})
+registry.gauge("jarvis_conversation_store", "Conversation store size and eviction counters",
+               lambda: {(("stat", k),): v for k, v in conversations.metrics().items() if isinstance(v, (int, float))})
+registry.gauge("jarvis_search_cache", "Search result cache counters",
+               lambda: {(("stat", k),): v for k, v in search_service.cache.stats().items()})
+if transcoder:
+    registry.gauge("jarvis_transcode", "Upload transcoding counters",
+                   lambda: {(("stat", k),): v for k, v in transcoder.stats().items()})
+if tts_cache:
+    registry.gauge("jarvis_tts_cache", "TTS cache tiers and hit counters",
+                   lambda: {(("stat", k),): v for k, v in tts_cache.stats().items()})
+if github_cache:
+    registry.gauge("jarvis_github_cache", "GitHub response/blob cache hits and rate-limit calls saved",
+                   lambda: {(("stat", k),): v for k, v in github_cache.stats().items()})
+if github_rate_limiter:
+    registry.gauge("jarvis_github_rate_limit", "GitHub rate-limit buckets: tokens, requests, local rejections",
+                   lambda: {(("resource", resource), ("stat", k)): v
+                            for resource, stats in github_rate_limiter.stats().items() for k, v in stats.items()})
+if tts_policy:
+    registry.gauge("jarvis_tts_first_audio_estimate_ms", "TTS policy time-to-first-audio estimate per choice",
+                   lambda: {(("model", model), ("format", fmt)): v for (model, fmt), v in tts_policy.stats().items()})
+registry.gauge("jarvis_http_requests", "Outbound HTTP requests per host (pooled client)",
+               lambda: {(("host", host), ("stat", k)): v
+                        for host, stats in get_http_client().metrics().items() for k, v in stats.items()})
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking call on the bounded I/O pool and await its result.
+    
+    If the awaiting task is cancelled, the call is dropped if it hasn't
+    started yet; if it has, the pooled HTTP client refuses any further
+    requests from it (the one in flight finishes within its timeout).
+    """
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+    context = contextvars.copy_context()
+    context.run(http_cancel_event.set, cancelled)
+    try:
+        return await loop.run_in_executor(blocking_executor, partial(context.run, func, *args, **kwargs))
+    except asyncio.CancelledError:
+        cancelled.set()
+        raise
+
+def tool_options(final: bool) -> dict:
+    """Chat API tool parameters; the last call of a turn may not request more tools"""
+    if not len(tools):
+        return {}
+    return {"tools": tools.schemas(), "tool_choice": "none" if final else "auto"}
+
+async def conversation_call(method, *args):
+    """Call a conversation store method, off the event loop for backends that hit the disk"""
+    if conversations.blocking:
+        return await run_blocking(method, *args)
+    return method(*args)
+
+async def stream_chat_completion(messages, speech_stream: SpeechStream, trace: TurnTrace = None,
+                                 final: bool = False):
+    """
+    Stream a chat completion and hand each finished sentence to TTS as it arrives.
+    Tool calls arrive as structured deltas alongside the text, so any prose
+    the model says before calling tools ("Let me check that") is spoken too.
+    
+    Returns:
+        (response text, tool calls requested)
+    """
+    stream = await client.chat.completions.create(
+        model=os.getenv("GPT_MODEL", "gpt-4"),
+        messages=messages,
+        max_tokens=500,
+        temperature=0.7,
+        stream=True,
+        **tool_options(final)
+    )
+    
+    sentences = SentenceBuffer()
+    parts = []
+    calls = {}
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.tool_calls:
+            accumulate_tool_calls(calls, delta.tool_calls)
+        if not delta.content:
+            continue
+        parts.append(delta.content)
+        if trace:
+            trace.mark("first_text")
+        for sentence in sentences.feed(delta.content):
+            speech_stream.submit(sentence)
+    
+    remainder = sentences.flush()
+    if remainder:
+        speech_stream.submit(remainder)
+    
+    return "".join(parts), [calls[index] for index in sorted(calls)]
+
+async def send_partial_transcription(websocket: WebSocket, segment: int, text: str):
+    """Forward a finished segment transcript while recording continues"""
+    await websocket.send_text(json.dumps({
+        "type": "transcription",
+        "text": text,
+        "partial": True,
+        "segment": segment
+    }))
+
+async def process_turn(websocket: WebSocket, connection_id: str, audio: AudioBuffer,
+                       transcriber, audio_frames: AudioFrameSender, recording_started_at=None,
+                       vad: VoiceActivityDetector = None):
+    """
+    Transcribe a finished recording, run the thought loop and speak the reply.
+
+    Runs as its own task so the websocket reader keeps going meanwhile;
+    an interrupt cancels the task, which aborts the in-flight OpenAI request
+    and stops further tool calls (see run_blocking).
+    """
+    trace = TurnTrace(connection_id)
+    if recording_started_at is not None:
+        trace.record("buffering", time.perf_counter() - recording_started_at, bytes=len(audio))
+    audio_frames.on_first_audio = partial(trace.mark, "first_audio")
+    speech_stream = None
+    outcome = "interrupted"
+    try:
+        # Send transcribing status
+        await websocket.send_text(json.dumps({
+            "type": "status",
+            "message": "Transcribing audio..."
+        }))
+        
+        # Drop leading and trailing silence so it is neither uploaded nor billed
+        trim_start, trim_end = 0, len(audio)
+        if vad:
+            vad_started = time.perf_counter()
+            await vad.finish(audio)
+            if vad.no_speech:
+                logger.info("No speech detected in %d bytes of audio; skipping transcription", len(audio))
+                outcome = "no_speech"
+                await websocket.send_text(json.dumps({
+                    "type": "error",
+                    "message": "No speech detected"
+                }))
+                return
+            trim_start, trim_end = vad.trim_range(len(audio))
+            trimmed = len(audio) - trim_end + (trim_start - len(vad.header) if trim_start else 0)
+            vad_trimmed_bytes.inc(trimmed)
+            trace.record("vad", time.perf_counter() - vad_started, trimmed_bytes=trimmed)
+        
+        # Whisper accepts WebM natively; large uploads may be re-encoded first (TRANSCODE_FORMAT)
+        with trace.span("transcription", streaming=transcriber is not None):
+            if transcriber:
+                # Earlier segments are already transcribed (or in flight); only the tail is left
+                transcriber.skip_to(trim_start)
+                transcribed_text = await transcriber.finish(audio, end=trim_end)
+                transcriber = None
+            else:
+                transcribed_text = await transcription_service.transcribe(vad.trimmed(audio) if vad else audio[:])
+        trace.mark("transcription")
+        
+        logger.info("Transcription: %s", transcribed_text)
+        
+        # Send transcription to frontend
+        await websocket.send_text(json.dumps({
+            "type": "transcription",
+            "text": transcribed_text
+        }))
+        
+        # Ensure conversation history exists before adding to it: an idle or least
+        # recently used session may have been evicted since the socket opened
+        if not await conversation_call(conversations.__contains__, connection_id):
+            logger.warning("Conversation history missing for %s, reinitializing", connection_id)
+            await conversation_call(conversations.create, connection_id, [{"role": "system", "content": SYSTEM_PROMPT}])
+        
+        # Add to conversation history
+        await conversation_call(conversations.append, connection_id, {
+            "role": "user",
+            "content": transcribed_text
+        })
+        
+        # Check for GitHub context
+        github_context = None
+        if github_service.is_code_related_query(transcribed_text):
+            logger.info("Detected code-related query, fetching GitHub context")
+            with trace.span("github_context"):
+                github_context = await run_blocking(
+                    github_service.get_code_context, transcribed_text, context_window.count_text_tokens
+                )
+        
+        # Send thinking status
+        await websocket.send_text(json.dumps({
+            "type": "status",
+            "message": "AI is thinking..."
+        }))
+        
+        # Generate AI response with GPT-4
+        logger.debug("Generating GPT-4 response")
+        
+        # --- Main Processing Loop (Thought Loop) ---
+        # Each round is one model call; tools it requests all run at once and their
+        # results go back in the next call. Tool exchanges of this turn are sent as
+        # extra messages and stored as system notes once the turn is answered.
+        final_response_text = ""
+        pr_url = None
+        github_sourced = bool(github_context)
+        tool_exchange = []
+        tool_notes = []
+        if STREAM_RESPONSES:
+            speech_stream = SpeechStream(voice_service, audio_frames, TTS_MAX_CONCURRENCY)
+        
+        async def send_status(message: str):
+            await websocket.send_text(json.dumps({"type": "status", "message": message}))
+        
+        for iteration in range(1, MAX_TOOL_ROUNDS + 1):
+            final = iteration == MAX_TOOL_ROUNDS
+            logger.debug("Iteration %d/%d", iteration, MAX_TOOL_ROUNDS)
+            
+            # Prepare messages (within the token budget) with GitHub context if available
+            extra_context = []
+            if github_context:
+                extra_context.append({
+                    "role": "system",
+                    "content": f"Additional context from GitHub:\n{github_context}\n\nUse this information to provide accurate code examples and include the GitHub links in your response."
+                })
+            messages_for_gpt = context_window.build(
+                connection_id,
+                await conversation_call(conversations.get, connection_id) or [],
+                extra=extra_context + tool_exchange
+            )
+            
+            with trace.span("llm", iteration=iteration, messages=len(messages_for_gpt)):
+                if speech_stream:
+                    ai_response, tool_calls = await stream_chat_completion(messages_for_gpt, speech_stream, trace, final)
+                else:
+                    response = await client.chat.completions.create(
+                        model=os.getenv("GPT_MODEL", "gpt-4"),
+                        messages=messages_for_gpt,
+                        max_tokens=500, # Increased for search results
+                        temperature=0.7,
+                        **tool_options(final)
+                    )
+                    
+                    message = response.choices[0].message
+                    ai_response = message.content or ""
+                    tool_calls = [ToolCall(call.id, call.function.name, call.function.arguments)
+                                  for call in message.tool_calls or ()]
+                    trace.mark("first_text")
+            logger.info("AI response (iter %d): %d chars, %d tool calls", iteration, len(ai_response), len(tool_calls))
+            logger.debug("AI response text: %s", ai_response)
+            
+            # No tool calls: this is the final response
+            if not tool_calls:
+                final_response_text = ai_response
+                break
+            
+            with trace.span("tools", iteration=iteration, calls=len(tool_calls)):
+                results = await tools.execute(tool_calls, run_blocking, send_status)
+            tool_exchange.append(assistant_message(ai_response, tool_calls))
+            tool_exchange.extend(result.message() for result in results)
+            if ai_response:
+                tool_notes.append({"role": "assistant", "content": ai_response})
+            tool_notes.extend(result.history_message() for result in results)
+            for result in results:
+                if result.call.name == "create_pull_request" and result.value:
+                    pr_url = result.value
+                elif result.call.name == "search_github_code" and result.value:
+                    github_sourced = True
+        
+        # --- End of Loop ---
+
+        # Add the tool results and the final response to history
+        for note in tool_notes:
+            await conversation_call(conversations.append, connection_id, note)
+        await conversation_call(conversations.append, connection_id, {
+            "role": "assistant",
+            "content": final_response_text
+        })
+        
+        # Prepare response with metadata
+        response_data = {
+            "type": "ai_response",
+            "text": final_response_text
+        }
+        
+        # Add source metadata if GitHub context was used or PR was created
+        if github_sourced or pr_url:
+            response_data["has_sources"] = True
+            response_data["source_type"] = "github"
+        
+        # Send text response
+        with trace.span("send"):
+            await websocket.send_text(json.dumps(response_data))
+        
+        # Stream voice audio to the client as it is synthesized
+        # (already in flight sentence by sentence when streaming)
+        with trace.span("tts", streaming=speech_stream is not None):
+            if not speech_stream:
+                # Synthesize the response in parts concurrently; they still play in order
+                speech_stream = SpeechStream(voice_service, audio_frames, TTS_MAX_CONCURRENCY,
+                                             expected_chars=len(final_response_text))
+                for part in split_for_speech(final_response_text, TTS_CHUNK_CHARS):
+                    speech_stream.submit(part)
+            await speech_stream.finish()
+            speech_stream = None
+        outcome = "ok"
+        
+    except Exception as e:
+        outcome = "error"
+        logger.exception("Error processing audio: %s", e)
+        await websocket.send_text(json.dumps({
+            "type": "error",
+            "message": f"Error processing audio: {str(e)}"
+        }))
+    finally:
+        # On interrupt (task cancelled) or error, stop whatever is still in flight
+        if transcriber:
+            transcriber.cancel()
+        if speech_stream:
+            speech_stream.cancel()
+        if vad:
+            vad.cancel()
+        # The recording is done with either way; its buffer goes back to the session
+        audio.clear()
+        audio_frames.on_first_audio = None
+        trace.finish(outcome)
+
+def log_turn_failure(task: asyncio.Task):
+    """Surface errors that escaped process_turn (e.g. the socket closed while reporting one)"""
+    if not task.cancelled() and task.exception():
+        logger.error("Turn failed: %s", task.exception())
 
 @app.get("/")
 async def root():
@@ -64,6 +542,12 @@ async def health():
         "version": "1.0.0"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: per-stage latency summaries and service gauges"""
+    # Some gauges query SQLite (conversation store, GitHub cache)
+    return PlainTextResponse(await run_blocking(registry.render), media_type="text/plain; version=0.0.4")
+
 @app.websocket("/ws/ai")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -72,46 +556,49 @@ async def websocket_endpoint(websocket: WebSocket):
     session_id = websocket.query_params.get("session_id")
     connection_id = session_id if session_id else str(id(websocket))
     
-    print(f"Backend connected to AI Service (ID: {connection_id})")
+    logger.info("Backend connected to AI Service (ID: %s)", connection_id)
     
     # Initialize conversation history if new session
-    if connection_id not in conversations:
-        conversations[connection_id] = [
-            {
-                "role": "system",
-                "content": """You are Jarvis, a helpful and intelligent voice assistant. Follow these guidelines:
-            
-1. Provide concise, accurate, and friendly responses.
-2. Always cite your sources when using external information.
-3. If you're uncertain about something, clearly state "I'm not certain" or "I don't know".
-4. When providing code examples, include links to documentation or GitHub repositories.
-5. Express confidence levels when appropriate (e.g., "I'm confident that...", "Based on the documentation...").
-6. Avoid speculation - stick to facts you can verify.
-7. If a question is outside your knowledge, suggest where the user might find the answer.
-
-You have access to the following tools and capabilities:
-- **Web Search**: You can search the web for real-time information. Use this when asked about current events, facts, or things you don't know.
-  SEARCH_WEB: {"query": "search query here"}
-  - **IMPORTANT**: If the user asks about "my anime list" or "MAL", they are referring to the public website `myanimelist.net`. You SHOULD search this website for ratings and information. It is NOT a private file.
-- **GitHub Integration**: You can search public GitHub repositories for code and documentation.
-- **Real-time Interaction**: You can be interrupted by the user at any time.
-- **PR Creation**: If the user asks you to create a pull request, you can do so by responding with a special command format:
-  CREATE_PR: {"repo": "owner/repo", "title": "PR title", "body": "PR description", "branch": "branch-name", "file_path": "path/to/file", "file_content": "file content", "commit_message": "commit message"}
-
-Your limitations:
-- You cannot access the user's private files or local system unless explicitly provided.
-- You cannot perform actions on the user's behalf outside of this chat interface.
-- PR creation requires a valid GitHub token with write access.
-"""
-            }
-        ]
+    if not await conversation_call(conversations.__contains__, connection_id):
+        await conversation_call(conversations.create, connection_id, [{"role": "system", "content": SYSTEM_PROMPT}])
     else:
-        print(f"Restoring session {connection_id}")
-    interrupt_flags[connection_id] = False
+        logger.info("Restoring session %s", connection_id)
     
-    # Buffer for audio chunks
-    audio_buffer = bytearray()
+    # Buffers for audio chunks: one receives the next recording while a turn processes the other
+    new_audio_buffer = partial(
+        AudioBuffer,
+        max_bytes=AUDIO_MAX_BYTES,
+        max_seconds=AUDIO_MAX_SECONDS,
+        budget=audio_budget,
+        backpressure_timeout=AUDIO_BACKPRESSURE_TIMEOUT
+    )
+    audio_buffer, spare_buffer = new_audio_buffer(), new_audio_buffer()
+    audio_buffers[connection_id] = audio_buffer
+    finalize_recording = False  # Set when a recording limit or end of speech auto-ends the utterance
+    finalized_early = False  # The client's own stop_recording for that utterance is then a no-op
+    recording_started_at = None
+    transcriber = None
+    vad = None  # Server-side voice activity detection for the current recording (SERVER_VAD)
+    # Framed audio output (audio_start / binary chunks / audio_end)
+    audio_frames = AudioFrameSender(websocket.send_text, websocket.send_bytes)
+    # Playback capabilities from the query: audio_formats=pcm,opus,... (formats the client can decode) and voice
+    audio_frames.formats |= {f for f in websocket.query_params.get("audio_formats", "").split(",") if f in FORMATS_BY_LATENCY}
+    audio_frames.voice = websocket.query_params.get("voice")
     is_recording = False  # Track if we're actively recording
+    turn_task = None  # Turn in progress (see process_turn)
+    
+    async def cancel_turn() -> bool:
+        """Cancel the turn in progress and wait until it has stopped; True if one was running"""
+        nonlocal turn_task
+        task, turn_task = turn_task, None
+        if task is None or task.done():
+            return False
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return True
     
     try:
         # Send connection confirmation
@@ -121,15 +608,24 @@ Your limitations:
         }))
         
         while True:
-            message = await websocket.receive()
+            if finalize_recording:
+                # A recording limit was hit: process what we have as if the client stopped
+                finalize_recording = False
+                message = {"type": "websocket.receive", "text": json.dumps({"type": "stop_recording"})}
+            else:
+                message = await websocket.receive()
+            
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
             
             if "text" in message:
                 data = json.loads(message["text"])
                 
                 # Handle interrupt signal
                 if data.get("type") == "interrupt":
-                    print(f"Interrupt signal received for connection {connection_id}")
-                    interrupt_flags[connection_id] = True
+                    logger.info("Interrupt signal received for connection %s", connection_id)
+                    if await cancel_turn():
+                        logger.info("Turn in progress cancelled")
                     await websocket.send_text(json.dumps({
                         "type": "system",
                         "message": "Processing interrupted"
@@ -138,257 +634,22 @@ Your limitations:
                 
                 # Handle stop recording signal
                 if data.get("type") == "stop_recording":
-                    print(f"Stop recording signal received. Buffer size: {len(audio_buffer)} bytes")
-                    
-                    # Reset interrupt flag for new request
-                    interrupt_flags[connection_id] = False
+                    logger.info("Stop recording signal received. Buffer size: %d bytes", len(audio_buffer))
                     
                     if len(audio_buffer) > 0:
-                        # Send transcribing status
-                        await websocket.send_text(json.dumps({
-                            "type": "status",
-                            "message": "Transcribing audio..."
-                        }))
-                        
-                        # Check for interrupt before processing
-                        if interrupt_flags[connection_id]:
-                            print("Interrupted before transcription")
-                            audio_buffer.clear()
-                            continue
-                        
-                        try:
-                            # Whisper API supports WebM format natively - no conversion needed!
-                            # Save audio buffer directly to temporary WebM file
-                            with tempfile.NamedTemporaryFile(suffix=".webm", delete=False, mode='wb') as temp_audio:
-                                temp_audio.write(audio_buffer)
-                                temp_audio.flush()  # Ensure all data is written
-                                temp_audio_path = temp_audio.name
-                            # File is now closed and fully written
-                            
-                            # Check for interrupt before API call
-                            if interrupt_flags[connection_id]:
-                                print("Interrupted before Whisper API call")
-                                os.unlink(temp_audio_path)
-                                audio_buffer.clear()
-                                continue
-                            
-                            # Transcribe with Whisper
-                            print("Sending to Whisper API...")
-                            with open(temp_audio_path, "rb") as audio_file:
-                                transcription = client.audio.transcriptions.create(
-                                    model="whisper-1",
-                                    file=audio_file,
-                                    language="en",
-                                    prompt="The following is a conversation with Jarvis, an AI assistant. The user discusses coding, tech news, pop culture, and current events like the Super Bowl or elections."
-                                )
-                            
-                            # Clean up temp file
-                            os.unlink(temp_audio_path)
-                            
-                            # Check for interrupt after transcription
-                            if interrupt_flags[connection_id]:
-                                print("Interrupted after transcription")
-                                audio_buffer.clear()
-                                continue
-                            
-                            transcribed_text = transcription.text
-                            print(f"Transcription: {transcribed_text}")
-                            
-                            # Send transcription to frontend
-                            await websocket.send_text(json.dumps({
-                                "type": "transcription",
-                                "text": transcribed_text
-                            }))
-                            
-                            # Add to conversation history
-                            conversations[connection_id].append({
-                                "role": "user",
-                                "content": transcribed_text
-                            })
-                            
-                            # Check for GitHub context
-                            github_context = None
-                            if github_service.is_code_related_query(transcribed_text):
-                                print("Detected code-related query, fetching GitHub context...")
-                                github_context = github_service.get_code_context(transcribed_text)
-                            
-                            # Send thinking status
-                            await websocket.send_text(json.dumps({
-                                "type": "status",
-                                "message": "AI is thinking..."
-                            }))
-                            
-                            # Check for interrupt before GPT call
-                            if interrupt_flags[connection_id]:
-                                print("Interrupted before GPT-4 call")
-                                audio_buffer.clear()
-                                continue
-                            
-                            # Generate AI response with GPT-4
-                            print("Generating GPT-4 response...")
-                            
-                            # Ensure conversation history exists (safety check for reconnections)
-                            if connection_id not in conversations:
-                                print(f"Warning: Conversation history missing for {connection_id}, reinitializing")
-                                conversations[connection_id] = [
-                                    {
-                                        "role": "system",
-                                        "content": "You are Jarvis, a helpful and intelligent voice assistant."
-                                    }
-                                ]
-                            
-                            # --- Main Processing Loop (Thought Loop) ---
-                            max_iterations = 3
-                            iteration = 0
-                            final_response_text = ""
-                            pr_url = None
-                            
-                            while iteration < max_iterations:
-                                iteration += 1
-                                print(f"Iteration {iteration}/{max_iterations}")
-                                
-                                # Prepare messages with GitHub context if available
-                                messages_for_gpt = conversations[connection_id].copy()
-                                if github_context:
-                                    messages_for_gpt.append({
-                                        "role": "system",
-                                        "content": f"Additional context from GitHub:\n{github_context}\n\nUse this information to provide accurate code examples and include the GitHub links in your response."
-                                    })
-                                
-                                response = client.chat.completions.create(
-                                    model=os.getenv("GPT_MODEL", "gpt-4"),
-                                    messages=messages_for_gpt,
-                                    max_tokens=500, # Increased for search results
-                                    temperature=0.7
-                                )
-                                
-                                ai_response = response.choices[0].message.content
-                                print(f"AI Response (Iter {iteration}): {ai_response}")
-                                
-                                # Check for SEARCH_WEB command
-                                if "SEARCH_WEB:" in ai_response:
-                                    try:
-                                        import re
-                                        # Try to match JSON first
-                                        json_match = re.search(r'SEARCH_WEB:\s*({.*?})', ai_response, re.DOTALL)
-                                        if json_match:
-                                            search_data = json.loads(json_match.group(1))
-                                            query = search_data.get("query")
-                                        else:
-                                            # Fallback to plain text capture
-                                            text_match = re.search(r'SEARCH_WEB:\s*(.+)', ai_response, re.DOTALL)
-                                            if text_match:
-                                                query = text_match.group(1).strip()
-                                            else:
-                                                query = None
-                                        
-                                        if query:
-                                            
-                                            # Send status update
-                                            await websocket.send_text(json.dumps({
-                                                "type": "status",
-                                                "message": f"Searching web for: {query}..."
-                                            }))
-                                            
-                                            # Execute search
-                                            search_results = search_service.search(query)
-                                            
-                                            # Add search results to conversation history
-                                            conversations[connection_id].append({
-                                                "role": "assistant",
-                                                "content": ai_response # Keep the thought process
-                                            })
-                                            conversations[connection_id].append({
-                                                "role": "system",
-                                                "content": f"Search Results for '{query}':\n{search_results}"
-                                            })
-                                            
-                                            # Continue to next iteration to let AI use the results
-                                            continue
-                                    except Exception as e:
-                                        print(f"Error executing search: {e}")
-                                        conversations[connection_id].append({
-                                            "role": "system",
-                                            "content": f"Error executing search: {str(e)}"
-                                        })
-                                        continue
-
-                                # Check for PR creation command (existing logic)
-                                if "CREATE_PR:" in ai_response:
-                                    # ... (existing PR logic) ...
-                                    try:
-                                        import re
-                                        pr_match = re.search(r'CREATE_PR:\s*({.*?})', ai_response, re.DOTALL)
-                                        if pr_match:
-                                            pr_data = json.loads(pr_match.group(1))
-                                            repo = pr_data.get("repo")
-                                            title = pr_data.get("title")
-                                            body = pr_data.get("body")
-                                            branch = pr_data.get("branch")
-                                            file_path = pr_data.get("file_path")
-                                            file_content = pr_data.get("file_content")
-                                            commit_message = pr_data.get("commit_message")
-                                            
-                                            if github_service.create_branch(repo, branch):
-                                                if github_service.create_file(repo, file_path, file_content, commit_message, branch):
-                                                    pr_url = github_service.create_pull_request(repo, title, body, branch)
-                                                    if pr_url:
-                                                        ai_response = ai_response.replace(pr_match.group(0), f"\n\nI've created a pull request: {pr_url}")
-                                    except Exception as e:
-                                        print(f"Error creating PR: {e}")
-                                
-                                # If no tool commands, this is the final response
-                                final_response_text = ai_response
-                                break
-                            
-                            # --- End of Loop ---
-
-                            # Add final response to history
-                            conversations[connection_id].append({
-                                "role": "assistant",
-                                "content": final_response_text
-                            })
-                            
-                            # Generate Voice Audio
-                            audio_response = None
-                            try:
-                                # Filter out code blocks or long text if needed, but for now just TTS everything
-                                # Maybe skip TTS if it's just a PR confirmation? No, let's speak it.
-                                audio_response = voice_service.generate_speech(final_response_text)
-                            except Exception as e:
-                                print(f"Error generating voice: {e}")
-
-                            # Prepare response with metadata
-                            response_data = {
-                                "type": "ai_response",
-                                "text": final_response_text
-                            }
-                            
-                            # Add source metadata if GitHub context was used or PR was created
-                            if github_context or pr_url:
-                                response_data["has_sources"] = True
-                                response_data["source_type"] = "github"
-                            
-                            # Send text response
-                            await websocket.send_text(json.dumps(response_data))
-                            
-                            # Send audio response (as binary)
-                            if audio_response:
-                                await websocket.send_bytes(audio_response)
-                            
-                        except Exception as e:
-                            print(f"Error processing audio: {e}")
-                            # CRITICAL: Clear buffer even on error to prevent corruption on next request
-                            audio_buffer.clear()
-                            is_recording = False
-                            await websocket.send_text(json.dumps({
-                                "type": "error",
-                                "message": f"Error processing audio: {str(e)}"
-                            }))
-                        
-                        # Clear buffer after successful processing
-                        audio_buffer.clear()
+                        # A new utterance supersedes a reply still in progress
+                        await cancel_turn()
+                        # The turn takes this recording; keep receiving into the spare buffer
+                        audio_buffer, spare_buffer = spare_buffer, audio_buffer
+                        audio_buffers[connection_id] = audio_buffer
+                        turn_task = asyncio.create_task(process_turn(
+                            websocket, connection_id, spare_buffer, transcriber, audio_frames, recording_started_at, vad
+                        ))
+                        turn_task.add_done_callback(log_turn_failure)
+                        transcriber = vad = None
                         is_recording = False  # Reset for next recording
+                    elif finalized_early:
+                        finalized_early = False
                     else:
                         await websocket.send_text(json.dumps({
                             "type": "error",
@@ -404,27 +665,97 @@ Your limitations:
                     # Check for WebM EBML ID: 1A 45 DF A3
                     if len(data) >= 4 and data[:4] == b'\x1a\x45\xdf\xa3':
                         if len(audio_buffer) > 0:
-                            print(f"Warning: Clearing leftover buffer data ({len(audio_buffer)} bytes) from previous request")
-                            audio_buffer.clear()
+                            logger.warning("Clearing leftover buffer data (%d bytes) from previous request", len(audio_buffer))
+                        audio_buffer.start()
+                        finalized_early = False
+                        if transcriber:
+                            transcriber.cancel()
+                        if vad:
+                            vad.cancel()
+                        transcriber = vad = None
+                        if SERVER_VAD:
+                            vad = VoiceActivityDetector(
+                                partial(run_blocking, frame_levels),
+                                threshold_dbfs=VAD_THRESHOLD_DBFS,
+                                end_silence_ms=VAD_END_SILENCE_MS,
+                                min_speech_ms=VAD_MIN_SPEECH_MS,
+                                padding_ms=VAD_PADDING_MS,
+                                interval_seconds=VAD_INTERVAL_SECONDS
+                            )
+                        if STREAMING_TRANSCRIPTION:
+                            transcriber = StreamingTranscriber(
+                                transcription_service,
+                                on_partial=partial(send_partial_transcription, websocket),
+                                window_seconds=TRANSCRIPTION_WINDOW_SECONDS
+                            )
                         is_recording = True
-                        print("New WebM stream detected")
+                        recording_started_at = time.perf_counter()
+                        logger.debug("New WebM stream detected")
                     else:
-                        print(f"Warning: Ignoring trailing chunk ({len(data)} bytes) - not a WebM header")
+                        log_sampled(logger, logging.WARNING, "trailing_chunk", "Ignoring trailing chunk (%d bytes) - not a WebM header", len(data))
                         continue
                 
-                audio_buffer.extend(data)
-                print(f"Buffered audio chunk: {len(data)} bytes (total: {len(audio_buffer)} bytes)")
+                try:
+                    # May wait for the shared memory budget, which stops this reader (backpressure)
+                    await audio_buffer.append(data)
+                except AudioLimitExceeded as e:
+                    logger.warning("Recording limit reached for %s (%s): %s", connection_id, e.reason, e)
+                    is_recording = False  # Audio after the limit is ignored until the next recording
+                    if AUDIO_LIMIT_POLICY == "finalize" and len(audio_buffer) > 0:
+                        finalize_recording = finalized_early = True
+                        await websocket.send_text(json.dumps({
+                            "type": "status",
+                            "message": f"{e} - processing what was recorded"
+                        }))
+                    else:
+                        await websocket.send_text(json.dumps({
+                            "type": "error",
+                            "message": f"{e} - further audio is ignored"
+                        }))
+                    continue
+                log_sampled(logger, logging.DEBUG, "audio_chunk", "Buffered audio chunk: %d bytes (total: %d bytes)", len(data), len(audio_buffer))
+                if vad:
+                    if vad.speech_ended:
+                        # The user stopped talking: finalize without waiting for the client's stop_recording
+                        logger.info("End of speech detected for %s after %d bytes", connection_id, len(audio_buffer))
+                        vad_finalized.inc()
+                        is_recording = False
+                        finalize_recording = finalized_early = True
+                        await websocket.send_text(json.dumps({"type": "utterance_end"}))
+                        continue
+                    vad.on_audio(audio_buffer)
+                    if transcriber:
+                        # Leading silence never goes into a streamed segment
+                        transcriber.skip_to(vad.silent_until())
+                if transcriber:
+                    transcriber.on_audio(audio_buffer)
 
     except WebSocketDisconnect:
-        print(f"Backend disconnected (ID: {connection_id})")
-        # Clean up conversation history and interrupt flag
-        if connection_id in conversations:
-            del conversations[connection_id]
-        if connection_id in interrupt_flags:
-            del interrupt_flags[connection_id]
+        logger.info("Backend disconnected (ID: %s)", connection_id)
+        # Nobody is listening any more: stop the turn in progress
+        await cancel_turn()
+        if transcriber:
+            transcriber.cancel()
+        if vad:
+            vad.cancel()
+        audio_buffers.pop(connection_id, None)
+        audio_buffer.close()
+        spare_buffer.close()
+        # Clean up conversation history
+        # (sessions with a session_id stay in the store so a reconnect can restore them; TTL expires them)
+        if not session_id:
+            await conversation_call(conversations.delete, connection_id)
+            context_window.forget(connection_id)
     except Exception as e:
-        print(f"Connection error: {e}")
-        if connection_id in conversations:
-            del conversations[connection_id]
-        if connection_id in interrupt_flags:
-            del interrupt_flags[connection_id]
+        logger.error("Connection error: %s", e)
+        await cancel_turn()
+        if transcriber:
+            transcriber.cancel()
+        if vad:
+            vad.cancel()
+        audio_buffers.pop(connection_id, None)
+        audio_buffer.close()
+        spare_buffer.close()
+        if not session_id:
+            await conversation_call(conversations.delete, connection_id)
+            context_window.forget(connection_id)
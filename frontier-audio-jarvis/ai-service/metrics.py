@@ -0,0 +1,201 @@
+"""
+In-process metrics for the AI service
+Per-turn stage spans, sliding-window latency summaries and Prometheus text exposition
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+from log import get_logger
+
+logger = get_logger("metrics")
+
+
+def _escape_label(value) -> str:
+    """Label value as the text exposition format expects it: backslash, quote and newline escaped"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{k}="{_escape_label(v)}"' for k, v in sorted(labels.items()))
+    return "{" + pairs + "}"
+
+
+class Summary:
+    """
+    Latency summary per label set: quantiles over the last `window`
+    observations plus all-time sum and count.
+    """
+
+    quantiles = (0.5, 0.95, 0.99)
+
+    def __init__(self, name: str, help_text: str, window: int = 1024):
+        self.name = name
+        self.help_text = help_text
+        self.window = window
+        self._series: Dict[Tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"samples": deque(maxlen=self.window), "sum": 0.0, "count": 0}
+            series["samples"].append(value)
+            series["sum"] += value
+            series["count"] += 1
+
+    def percentiles(self, **labels) -> Dict[float, float]:
+        with self._lock:
+            series = self._series.get(tuple(sorted(labels.items())))
+            samples = sorted(series["samples"]) if series else []
+        return {q: self._quantile(samples, q) for q in self.quantiles}
+
+    @staticmethod
+    def _quantile(samples: List[float], q: float) -> float:
+        if not samples:
+            return math.nan
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} summary"]
+        with self._lock:
+            snapshot = [(dict(key), sorted(s["samples"]), s["sum"], s["count"]) for key, s in self._series.items()]
+        for labels, samples, total, count in snapshot:
+            for q in self.quantiles:
+                lines.append(f"{self.name}{_format_labels({**labels, 'quantile': q})} {self._quantile(samples, q)}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(dict(key))} {value}")
+        return lines
+
+
+class Gauge:
+    """
+    Value read at scrape time. The callback returns a number, or a dict
+    mapping label dicts (as tuples of pairs) to numbers.
+    """
+
+    def __init__(self, name: str, help_text: str, callback: Callable):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.error("Error reading gauge %s: %s", self.name, e)
+            return lines
+        if isinstance(value, dict):
+            for key, v in value.items():
+                lines.append(f"{self.name}{_format_labels(dict(key))} {v}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def summary(self, name: str, help_text: str) -> Summary:
+        metric = Summary(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, callback: Callable) -> Gauge:
+        metric = Gauge(name, help_text, callback)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+stage_seconds = registry.summary("jarvis_stage_seconds", "Time spent per pipeline stage")
+turn_mark_seconds = registry.summary("jarvis_turn_mark_seconds", "Time from turn start to a milestone (first_text, first_audio, ...)")
+turn_seconds = registry.summary("jarvis_turn_seconds", "End-to-end time per turn, from stop_recording to last audio sent")
+turns_total = registry.counter("jarvis_turns_total", "Turns processed, by outcome")
+
+
+class TurnTrace:
+    """
+    Structured timing for one turn. Each stage is a span; spans are
+    recorded into the stage summary and logged together when the turn ends.
+    Marks (time since the turn started) go into their own summary.
+    """
+
+    def __init__(self, connection_id: str):
+        self.connection_id = connection_id
+        self.started_at = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.marks: Dict[str, float] = {}
+
+    @contextmanager
+    def span(self, stage: str, **attributes):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, **attributes)
+
+    def record(self, stage: str, seconds: float, **attributes):
+        """Add a span measured elsewhere (e.g. audio buffering before the turn started)"""
+        stage_seconds.observe(seconds, stage=stage)
+        self.spans.append({"stage": stage, "ms": round(seconds * 1000, 1), **attributes})
+
+    def mark(self, name: str):
+        """Record time-since-turn-start once (e.g. first_text, first_audio)"""
+        if name not in self.marks:
+            elapsed = time.perf_counter() - self.started_at
+            self.marks[name] = elapsed
+            turn_mark_seconds.observe(elapsed, mark=name)
+
+    def finish(self, outcome: str = "ok"):
+        total = time.perf_counter() - self.started_at
+        turn_seconds.observe(total)
+        turns_total.inc(outcome=outcome)
+        logger.info("Turn finished", extra={"fields": {
+            "connection_id": self.connection_id,
+            "outcome": outcome,
+            "total_ms": round(total * 1000, 1),
+            "marks_ms": {k: round(v * 1000, 1) for k, v in self.marks.items()},
+            "spans": self.spans
+        }})
@@ -1,4 +1,3 @@
-import requests
 from bs4 import BeautifulSoup
 from duckduckgo_search import DDGS
 import os
@@ -6,11 +5,48 @@ from tavily import TavilyClient
 from googlesearch import search as google_search
 from fake_useragent import UserAgent
 import random
+import contextvars
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import wikipedia
+from http_client import RequestCancelled, get_http_client, http_cancel_event
+from ttl_cache import TTLCache
+from log import get_logger
+
+logger = get_logger("search")
+
+# Result cache TTLs (seconds) per provider; failures are never cached
+DEFAULT_CACHE_TTLS = {
+    "open-meteo": 300,
+    "tavily": 900,
+    "ddg": 900,
+    "google": 900,
+    "scraper": 900,
+    "wikipedia": 86400,
+}
+
+# How often a race checks whether the caller was cancelled
+CANCEL_POLL_SECONDS = 0.1
 
 class SearchService:
     def __init__(self):
+        self.cache = TTLCache(max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "512")))
+        self.cache_ttls = dict(DEFAULT_CACHE_TTLS)
+        # e.g. SEARCH_CACHE_TTLS="open-meteo=120,wikipedia=3600"
+        for override in filter(None, os.getenv("SEARCH_CACHE_TTLS", "").split(",")):
+            provider, _, ttl = override.partition("=")
+            self.cache_ttls[provider.strip()] = float(ttl)
+        # "sequential" tries providers one by one; "race" runs them concurrently (see _race_providers)
+        self.mode = os.getenv("SEARCH_MODE", "race").lower()
+        self.race_width = int(os.getenv("SEARCH_RACE_WIDTH", "2"))
+        self.hedge_delay = float(os.getenv("SEARCH_HEDGE_DELAY", "1.5"))
+        self.race_timeout = float(os.getenv("SEARCH_TIMEOUT", "10"))
+        self._race_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SEARCH_POOL_WORKERS", "12")),
+            thread_name_prefix="jarvis-search"
+        )
+        self.http = get_http_client()
         self.ddgs = DDGS()
         self.ua = UserAgent()
         self.tavily_client = None
@@ -18,11 +54,32 @@ class SearchService:
         if tavily_key:
             try:
                 self.tavily_client = TavilyClient(api_key=tavily_key)
-                print("Tavily Search API initialized.")
+                logger.info("Tavily Search API initialized")
             except Exception as e:
-                print(f"Failed to initialize Tavily: {e}")
+                logger.warning("Failed to initialize Tavily: %s", e)
 
     def search(self, query, max_results=3):
+        """
+        Performs a web search, serving repeats of a normalized query from the
+        result cache. Concurrent identical queries share one upstream search.
+
+        Raises:
+            RequestCancelled: The caller's turn was cancelled (see run_blocking)
+        """
+        key = (self._normalize_query(query), max_results)
+        provider_result = self.cache.get_or_load(
+            key,
+            lambda: self._search_providers(query, max_results),
+            ttl_for=lambda pr: self.cache_ttls.get(pr[0], 0),
+            retry_on=(RequestCancelled,)
+        )
+        return provider_result[1]
+
+    @staticmethod
+    def _normalize_query(query):
+        return " ".join(query.lower().split()).strip(" ?.,!")
+
+    def _search_providers(self, query, max_results):
         """
         Performs a web search using a hybrid strategy:
         1. Open-Meteo for weather queries (Free, Robust).
@@ -31,154 +88,221 @@ class SearchService:
         4. Wikipedia (Reliable for facts).
         5. Google Search (Fallback).
         6. Custom HTML Scraper (Last Resort).
+
+        In "sequential" mode the providers are tried one after another. In
+        "race" mode the first `race_width` providers start at once, another
+        one starts every `hedge_delay` seconds (or as soon as one fails), and
+        the first good result wins; worst-case latency is one provider timeout.
+
+        Returns (provider, formatted results); provider is None when every method failed.
         """
         try:
-            print(f"Searching web for: {query}")
-            errors = []
-            
-            # 1. Special handling for weather queries (Open-Meteo)
-            if "weather" in query.lower():
-                try:
-                    weather_result = self._get_weather(query)
-                    if weather_result:
-                        return weather_result
-                    else:
-                        errors.append("Open-Meteo: No results or failed")
-                except Exception as e:
-                    print(f"Open-Meteo failed: {e}")
-                    errors.append(f"Open-Meteo Error: {str(e)}")
-
-            # 2. Tavily API (Best for general search)
-            # 2. Tavily API (Best for general search)
-            if self.tavily_client:
-                try:
-                    print("Using Tavily Search API (Client)...")
-                    response = self.tavily_client.search(query, max_results=max_results)
-                    return self._format_tavily_results(response.get("results", []))
-                except Exception as e:
-                    print(f"Tavily Client failed: {e}. Trying direct HTTP...")
-                    try:
-                        # Direct HTTP Fallback
-                        payload = {
-                            "api_key": os.getenv("TAVILY_API_KEY"),
-                            "query": query,
-                            "search_depth": "basic",
-                            "include_answer": False,
-                            "include_images": False,
-                            "include_raw_content": False,
-                            "max_results": max_results
-                        }
-                        response = requests.post("https://api.tavily.com/search", json=payload, timeout=10)
-                        response.raise_for_status()
-                        data = response.json()
-                        return self._format_tavily_results(data.get("results", []))
-                    except Exception as http_e:
-                         print(f"Tavily HTTP failed: {http_e}")
-                         errors.append(f"Tavily Error: {str(e)} | HTTP: {str(http_e)}")
-            else:
-                # Try direct HTTP even if client init failed (e.g. library issue) but key exists
-                tavily_key = os.getenv("TAVILY_API_KEY")
-                if tavily_key:
-                     try:
-                        print("Tavily Client missing, trying direct HTTP...")
-                        payload = {
-                            "api_key": tavily_key,
-                            "query": query,
-                            "search_depth": "basic",
-                            "max_results": max_results
-                        }
-                        response = requests.post("https://api.tavily.com/search", json=payload, timeout=10)
-                        response.raise_for_status()
-                        data = response.json()
-                        return self._format_tavily_results(data.get("results", []))
-                     except Exception as http_e:
-                         print(f"Tavily HTTP failed: {http_e}")
-                         errors.append(f"Tavily Error: Key exists but client/HTTP failed. {str(http_e)}")
-                else:
-                    errors.append("Tavily: Key not configured")
-
-            # 3. DuckDuckGo Library (Lite backend)
-            try:
-                print("Using DuckDuckGo (ddgs)...")
-                results = list(self.ddgs.text(query, max_results=max_results, backend="lite"))
-                if results:
-                    return self._format_results(results)
-                else:
-                    errors.append("DDG: No results found")
-            except Exception as e:
-                print(f"DDG Library search failed: {e}")
-                errors.append(f"DDG Lib Error: {str(e)}")
-            
-            # 4. Wikipedia (Reliable for facts)
+            logger.info("Searching web for: %s", query)
+            providers = self._providers_for(query)
+            if self.mode == "race":
+                return self._race_providers(providers, query, max_results)
+            return self._run_providers_in_sequence(providers, query, max_results)
+        except RequestCancelled as e:
+            # Not a result: callers coalesced on this query retry on their own
+            logger.info("%s", e)
+            raise
+        except Exception as e:
+            logger.error("Search error: %s", e)
+            return None, f"Critical Search Error: {str(e)}"
+
+    def _providers_for(self, query):
+        """Ordered (name, method) pairs eligible for this query"""
+        providers = []
+        # 1. Special handling for weather queries (Open-Meteo)
+        if "weather" in query.lower():
+            providers.append(("open-meteo", self._search_weather))
+        # 2. Tavily API (Best for general search), client or direct HTTP
+        if self.tavily_client or os.getenv("TAVILY_API_KEY"):
+            providers.append(("tavily", self._search_tavily))
+        providers.extend([
+            ("ddg", self._search_ddg),
+            ("wikipedia", self._search_wikipedia),
+            ("google", self._search_google),
+            ("scraper", self._search_scraper),
+        ])
+        return providers
+
+    def _run_providers_in_sequence(self, providers, query, max_results):
+        errors = [] if any(name == "tavily" for name, _ in providers) else ["Tavily: Key not configured"]
+        for name, provider in providers:
             try:
-                print("Falling back to Wikipedia...")
-                wiki_result = self._wikipedia_search(query)
-                if wiki_result:
-                    return wiki_result
-                else:
-                    errors.append("Wikipedia: No results found")
+                result = provider(query, max_results, threading.Event())
+                if result:
+                    return name, result
+                errors.append(f"{name}: No results found")
             except Exception as e:
-                print(f"Wikipedia search failed: {e}")
-                errors.append(f"Wikipedia Error: {str(e)}")
+                logger.warning("%s search failed: %s", name, e)
+                errors.append(f"{name} Error: {str(e)}")
+
+        # If we get here, all methods failed
+        error_summary = "; ".join(errors)
+        logger.warning("All search methods failed. Errors: %s", error_summary)
+        return None, f"Unable to perform search. Details: {error_summary}"
+
+    def _race_providers(self, providers, query, max_results):
+        cancelled = threading.Event()
+        # The caller's turn may be cancelled (interrupt); then stop racing and launching providers
+        caller_cancelled = http_cancel_event.get()
+        deadline = time.monotonic() + self.race_timeout
+        pending = {}
+        errors = []
+        remaining = list(providers)
+        next_hedge_at = 0.0
+
+        def launch():
+            nonlocal next_hedge_at
+            next_hedge_at = time.monotonic() + self.hedge_delay
+            name, provider = remaining.pop(0)
+            # One context copy per provider: a Context can only be entered by one thread at a time
+            context = contextvars.copy_context()
+            pending[self._race_pool.submit(context.run, provider, query, max_results, cancelled)] = name
+
+        for _ in range(min(self.race_width, len(remaining))):
+            launch()
 
-            # 5. Google Search (Fallback)
+        try:
+            while pending:
+                if caller_cancelled is not None and caller_cancelled.is_set():
+                    raise RequestCancelled(f"Search for '{query}' cancelled")
+                now = time.monotonic()
+                timeout = deadline - now
+                if timeout <= 0:
+                    break
+                if remaining:
+                    timeout = min(timeout, max(0.0, next_hedge_at - now))
+                if caller_cancelled is not None:
+                    timeout = min(timeout, CANCEL_POLL_SECONDS)
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    try:
+                        result = future.result()
+                        if result:
+                            logger.info("Search race won by %s", name)
+                            return name, result
+                        errors.append(f"{name}: No results found")
+                    except Exception as e:
+                        logger.warning("%s search failed: %s", name, e)
+                        errors.append(f"{name} Error: {str(e)}")
+                # Hedge: a provider failed or the hedge delay passed without a winner
+                # (a wait that only timed out to poll for cancellation launches nothing)
+                now = time.monotonic()
+                if remaining and now < deadline and (done or now >= next_hedge_at):
+                    launch()
+        finally:
+            # Losers' results are discarded; queued ones never start and running ones stop waiting
+            cancelled.set()
+            for future in pending:
+                future.cancel()
+
+        errors.extend(f"{name}: Timed out" for name in pending.values())
+        error_summary = "; ".join(errors)
+        logger.warning("All search methods failed. Errors: %s", error_summary)
+        return None, f"Unable to perform search. Details: {error_summary}"
+
+    def _search_weather(self, query, max_results, cancelled):
+        return self._get_weather(query)
+
+    def _search_tavily(self, query, max_results, cancelled):
+        if self.tavily_client:
             try:
-                print("Falling back to Google Search...")
-                results = self._google_search(query, max_results)
-                if results:
-                    return self._format_results(results)
-                else:
-                    errors.append("Google: No results found")
+                logger.debug("Using Tavily Search API (client)")
+                response = self.tavily_client.search(query, max_results=max_results)
+                return self._format_tavily_results(response.get("results", []))
             except Exception as e:
-                print(f"Google search failed: {e}")
-                errors.append(f"Google Error: {str(e)}")
+                logger.warning("Tavily client failed: %s. Trying direct HTTP", e)
+        else:
+            # Try direct HTTP even if client init failed (e.g. library issue) but key exists
+            logger.debug("Tavily client missing, trying direct HTTP")
 
-            # 6. Custom HTML Scraper (Last Resort)
-            print("Falling back to custom HTML scraping...")
-            scraper_result = self._custom_search(query, max_results)
-            
-            # Check if scraper returned a valid string result (success) or error message
-            if "Search Results:" in scraper_result:
-                return scraper_result
-            else:
-                errors.append(f"Scraper Error: {scraper_result}")
-            
-            # If we get here, all methods failed
-            error_summary = "; ".join(errors)
-            print(f"All search methods failed. Errors: {error_summary}")
-            return f"Unable to perform search. Details: {error_summary}"
-            
-        except Exception as e:
-            print(f"Search error: {e}")
-            return f"Critical Search Error: {str(e)}"
+        payload = {
+            "api_key": os.getenv("TAVILY_API_KEY"),
+            "query": query,
+            "search_depth": "basic",
+            "include_answer": False,
+            "include_images": False,
+            "include_raw_content": False,
+            "max_results": max_results
+        }
+        response = self.http.post("https://api.tavily.com/search", json=payload)
+        response.raise_for_status()
+        data = response.json()
+        return self._format_tavily_results(data.get("results", []))
+
+    def _search_ddg(self, query, max_results, cancelled):
+        # DuckDuckGo Library (Lite backend)
+        logger.debug("Using DuckDuckGo (ddgs)")
+        results = list(self.ddgs.text(query, max_results=max_results, backend="lite"))
+        return self._format_results(results) if results else None
+
+    def _search_wikipedia(self, query, max_results, cancelled):
+        logger.debug("Falling back to Wikipedia")
+        return self._wikipedia_search(query)
+
+    def _search_google(self, query, max_results, cancelled):
+        logger.debug("Falling back to Google Search")
+        results = self._google_search(query, max_results)
+        return self._format_results(results) if results else None
+
+    def _search_scraper(self, query, max_results, cancelled):
+        logger.debug("Falling back to custom HTML scraping")
+        scraper_result = self._custom_search(query, max_results, cancelled)
+        # Check if scraper returned a valid string result (success) or error message
+        if "Search Results:" in scraper_result:
+            return scraper_result
+        raise RuntimeError(scraper_result)
+
+    def get_weather(self, location):
+        """
+        Current weather for a place name (Open-Meteo), served from the result
+        cache when asked again within the open-meteo TTL
+
+        Returns:
+            Weather report, or None if the place isn't found or the API fails
+        """
+        key = ("weather", self._normalize_query(location))
+        return self.cache.get_or_load(
+            key,
+            lambda: self._weather_report(location),
+            ttl_for=lambda report: self.cache_ttls["open-meteo"] if report else 0,
+            retry_on=(RequestCancelled,)
+        )
 
     def _get_weather(self, query):
         """
         Extracts location and queries Open-Meteo API.
         """
+        # Robust location extraction using regex
+        import re
+        # Match "weather in [Location]" or "forecast for [Location]"
+        match = re.search(r'(?:weather|forecast)\s+(?:in|for)\s+(.+)', query, re.IGNORECASE)
+        
+        if match:
+            clean_query = match.group(1).strip(" ?.,!")
+        else:
+            # Fallback: simple cleanup if regex doesn't match
+            clean_query = query.lower().replace("weather", "").replace("current", "").replace("forecast", "").replace(" in ", " ").strip(" ?.,!")
+        return self._weather_report(clean_query)
+
+    def _weather_report(self, clean_query):
+        """Geocode a place name and fetch its current conditions from Open-Meteo"""
         try:
-            # Robust location extraction using regex
-            import re
-            # Match "weather in [Location]" or "forecast for [Location]"
-            match = re.search(r'(?:weather|forecast)\s+(?:in|for)\s+(.+)', query, re.IGNORECASE)
-            
-            if match:
-                clean_query = match.group(1).strip(" ?.,!")
-            else:
-                # Fallback: simple cleanup if regex doesn't match
-                clean_query = query.lower().replace("weather", "").replace("current", "").replace("forecast", "").replace(" in ", " ").strip(" ?.,!")
-            
             # Open-Meteo often fails with "City, State" format. 
             # It prefers just "City". Let's try to clean it further.
             if "," in clean_query:
                 clean_query = clean_query.split(",")[0].strip()
                 
-            print(f"Extracted location for weather: '{clean_query}'")
+            logger.debug("Extracted location for weather: '%s'", clean_query)
             
             # Geocoding
             geo_url = f"https://geocoding-api.open-meteo.com/v1/search?name={clean_query}&count=1&language=en&format=json"
             headers = {"User-Agent": self.ua.random}
-            geo_res = requests.get(geo_url, headers=headers, timeout=5).json()
+            geo_res = self.http.get(geo_url, headers=headers, timeout=5).json()
             
             if not geo_res.get("results"):
                 return None
@@ -192,7 +316,7 @@ class SearchService:
             
             # Weather Data
             weather_url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,wind_speed_10m&daily=weather_code,temperature_2m_max,temperature_2m_min&temperature_unit=fahrenheit&wind_speed_unit=mph&precipitation_unit=inch&timezone=auto"
-            w_res = requests.get(weather_url, headers=headers, timeout=5).json()
+            w_res = self.http.get(weather_url, headers=headers, timeout=5).json()
             
             current = w_res.get("current", {})
             current_units = w_res.get("current_units", {})
@@ -217,8 +341,10 @@ class SearchService:
             
             return report
             
+        except RequestCancelled:
+            raise
         except Exception as e:
-            print(f"Open-Meteo error: {e}")
+            logger.warning("Open-Meteo error: %s", e)
             return None
 
     def _format_tavily_results(self, results):
@@ -243,7 +369,7 @@ class SearchService:
             
             # Remove extra spaces
             clean_query = " ".join(clean_query.split())
-            print(f"Cleaned Wikipedia query: '{clean_query}'")
+            logger.debug("Cleaned Wikipedia query: '%s'", clean_query)
 
             # Search for pages
             search_results = wikipedia.search(clean_query, results=1)
@@ -257,16 +383,16 @@ class SearchService:
                 page = wikipedia.page(page_title, auto_suggest=False)
                 summary = wikipedia.summary(page_title, sentences=3, auto_suggest=False)
             except wikipedia.DisambiguationError as e:
-                print(f"Wikipedia disambiguation for '{page_title}', trying: {e.options[0]}")
+                logger.debug("Wikipedia disambiguation for '%s', trying: %s", page_title, e.options[0])
                 page_title = e.options[0]
                 try:
                     page = wikipedia.page(page_title, auto_suggest=False)
                     summary = wikipedia.summary(page_title, sentences=3, auto_suggest=False)
                 except Exception as e2:
-                    print(f"Failed to resolve disambiguation: {e2}")
+                    logger.warning("Failed to resolve disambiguation: %s", e2)
                     return None
             except wikipedia.PageError:
-                print(f"Wikipedia page not found: {page_title}")
+                logger.debug("Wikipedia page not found: %s", page_title)
                 return None
             
             formatted_result = "Search Results (via Wikipedia):\n\n"
@@ -274,7 +400,7 @@ class SearchService:
             
             return formatted_result
         except Exception as e:
-            print(f"Wikipedia internal error: {e}")
+            logger.warning("Wikipedia internal error: %s", e)
             return None
 
     def _google_search(self, query, max_results):
@@ -292,11 +418,11 @@ class SearchService:
                     "body": res.description
                 })
         except Exception as e:
-            print(f"Google search internal error: {e}")
+            logger.warning("Google search internal error: %s", e)
             return None
         return results
 
-    def _custom_search(self, query, max_results):
+    def _custom_search(self, query, max_results, cancelled=None):
         # Rotate User-Agents to avoid blocking
         headers = {
             "User-Agent": self.ua.random
@@ -305,9 +431,15 @@ class SearchService:
         
         try:
             # Add a small random delay to be polite and avoid rate limits
-            time.sleep(random.uniform(0.5, 1.5))
+            # (only in sequential mode; in race mode the scraper is already a late hedge)
+            if self.mode != "race":
+                cancelled = cancelled or threading.Event()
+                if cancelled.wait(random.uniform(0.5, 1.5)):
+                    return "Search cancelled"
+            elif cancelled and cancelled.is_set():
+                return "Search cancelled"
             
-            response = requests.post("https://html.duckduckgo.com/html/", data=payload, headers=headers, timeout=10)
+            response = self.http.post("https://html.duckduckgo.com/html/", data=payload, headers=headers)
             response.raise_for_status()
             
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -338,7 +470,7 @@ class SearchService:
             return self._format_results(results)
             
         except Exception as e:
-            print(f"Custom search error: {e}")
+            logger.warning("Custom search error: %s", e)
             return f"Error performing search: {str(e)}"
 
     def _format_results(self, results):
@@ -0,0 +1,234 @@
+"""
+Tools the assistant calls through the chat API's function calling
+Registry of tool schemas and handlers; the calls from one model turn run concurrently
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from log import get_logger
+from metrics import registry
+
+logger = get_logger("tools")
+
+tool_seconds = registry.summary("jarvis_tool_seconds", "Tool call duration per tool")
+tool_calls_total = registry.counter("jarvis_tool_calls_total", "Tool calls, by tool and outcome")
+
+
+@dataclass
+class Tool:
+    name: str
+    description: str
+    parameters: Dict  # JSON Schema of the arguments
+    handler: Callable[..., Any]  # Blocking; called with the arguments as keywords
+    render: Optional[Callable[[Any, Dict], str]] = None  # Handler result -> text for the model (default: str)
+    status: Optional[Callable[[Dict], str]] = None  # Progress message shown to the user while it runs
+
+    def schema(self) -> Dict:
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters}
+        }
+
+
+@dataclass
+class ToolCall:
+    id: str
+    name: str
+    arguments: str = ""  # JSON, as generated by the model
+
+    def message(self) -> Dict:
+        return {"id": self.id, "type": "function", "function": {"name": self.name, "arguments": self.arguments}}
+
+
+@dataclass
+class ToolResult:
+    call: ToolCall
+    output: str  # What the model gets back
+    value: Any = None  # Handler's return value; None if the call failed
+    ok: bool = True
+
+    def message(self) -> Dict:
+        return {"role": "tool", "tool_call_id": self.call.id, "content": self.output}
+
+    def history_message(self) -> Dict:
+        """The result as kept in the stored conversation (see context_window.TOOL_OUTPUT_PREFIXES)"""
+        return {"role": "system", "content": f"Tool result from {self.call.name}({self.call.arguments}):\n{self.output}"}
+
+
+def assistant_message(content: Optional[str], calls: List[ToolCall]) -> Dict:
+    """The assistant turn that requested `calls`, as the chat API expects it before their results"""
+    return {"role": "assistant", "content": content or None, "tool_calls": [call.message() for call in calls]}
+
+
+def accumulate_tool_calls(calls: Dict[int, ToolCall], deltas) -> None:
+    """Merge streamed tool_call deltas (id and name first, then argument fragments) by index"""
+    for delta in deltas:
+        call = calls.setdefault(delta.index, ToolCall("", ""))
+        if delta.id:
+            call.id = delta.id
+        function = delta.function
+        if function:
+            if function.name:
+                call.name += function.name
+            if function.arguments:
+                call.arguments += function.arguments
+
+
+class ToolRegistry:
+    """
+    Tools offered to the model, by name.
+
+    `execute` runs every call from one model turn at once, each on the
+    blocking I/O pool, and returns the results in call order so they can go
+    back to the model in a single follow-up request. A failing call (bad
+    arguments, unknown tool, handler error) becomes an error result the
+    model can react to; it doesn't affect the other calls.
+    """
+
+    def __init__(self, tools: Iterable[Tool] = ()):
+        self._tools: Dict[str, Tool] = {}
+        for tool in tools:
+            self.register(tool)
+
+    def register(self, tool: Tool):
+        self._tools[tool.name] = tool
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def schemas(self) -> List[Dict]:
+        """Tool definitions for the chat API's `tools` parameter"""
+        return [tool.schema() for tool in self._tools.values()]
+
+    async def execute(self, calls: List[ToolCall], run_blocking,
+                      notify: Optional[Callable[[str], Awaitable]] = None) -> List[ToolResult]:
+        """
+        Args:
+            calls: Tool calls from one model response
+            run_blocking: Coroutine function running a blocking call off the event loop
+            notify: Sends a tool's status message to the user as it starts
+
+        Returns:
+            One result per call, in call order
+        """
+        return list(await asyncio.gather(*(self._execute(call, run_blocking, notify) for call in calls)))
+
+    async def _execute(self, call: ToolCall, run_blocking, notify) -> ToolResult:
+        tool = self._tools.get(call.name)
+        if tool is None:
+            # The name comes from the model: keep it out of the label set
+            tool_calls_total.inc(tool="unknown", outcome="unknown")
+            return ToolResult(call, f"Error: there is no tool named {call.name}", ok=False)
+        try:
+            arguments = json.loads(call.arguments or "{}")
+            if not isinstance(arguments, dict):
+                raise ValueError("arguments must be a JSON object")
+        except ValueError as e:
+            tool_calls_total.inc(tool=call.name, outcome="bad_arguments")
+            return ToolResult(call, f"Error: invalid arguments for {call.name}: {e}", ok=False)
+        missing = [name for name in tool.parameters.get("required", []) if name not in arguments]
+        if missing:
+            tool_calls_total.inc(tool=call.name, outcome="bad_arguments")
+            return ToolResult(call, f"Error: {call.name} needs {', '.join(missing)}", ok=False)
+        # Arguments the schema doesn't declare are dropped rather than failing the call
+        arguments = {k: v for k, v in arguments.items() if k in tool.parameters.get("properties", {})}
+
+        if notify and tool.status:
+            await notify(tool.status(arguments))
+        start = time.perf_counter()
+        try:
+            value = await run_blocking(tool.handler, **arguments)
+        except Exception as e:
+            logger.error("Error running tool %s: %s", call.name, e)
+            tool_calls_total.inc(tool=call.name, outcome="error")
+            return ToolResult(call, f"Error running {call.name}: {e}", ok=False)
+        finally:
+            tool_seconds.observe(time.perf_counter() - start, tool=call.name)
+        tool_calls_total.inc(tool=call.name, outcome="ok")
+        return ToolResult(call, tool.render(value, arguments) if tool.render else str(value), value=value)
+
+
+def create_tool_registry(search_service, github_service, count_tokens: Callable[[str], int]) -> ToolRegistry:
+    """
+    Web search, GitHub code search, pull request creation and weather
+
+    Args:
+        search_service: SearchService
+        github_service: GitHubService
+        count_tokens: Token counter for the GitHub context budget
+    """
+    return ToolRegistry([
+        Tool(
+            name="web_search",
+            description="Search the web for current events, facts, prices, ratings or anything you don't know. "
+                        "For 'my anime list' or 'MAL', search the public website myanimelist.net.",
+            parameters={
+                "type": "object",
+                "properties": {"query": {"type": "string", "description": "Search query"}},
+                "required": ["query"]
+            },
+            handler=search_service.search,
+            status=lambda args: f"Searching web for: {args['query']}..."
+        ),
+        Tool(
+            name="search_github_code",
+            description="Search public GitHub repositories for code examples. Returns ranked snippets with links.",
+            parameters={
+                "type": "object",
+                "properties": {"query": {"type": "string", "description": "What the code should do, or identifiers in it"}},
+                "required": ["query"]
+            },
+            handler=lambda query: github_service.get_code_context(query, count_tokens),
+            render=lambda context, args: context or f"No code found on GitHub for '{args['query']}'.",
+            status=lambda args: f"Searching GitHub for: {args['query']}..."
+        ),
+        Tool(
+            name="create_pull_request",
+            description="Open a pull request that adds or changes files in a GitHub repository. "
+                        "List every file to add or change; they are committed together.",
+            parameters={
+                "type": "object",
+                "properties": {
+                    "repo": {"type": "string", "description": "owner/repo"},
+                    "title": {"type": "string"},
+                    "body": {"type": "string", "description": "PR description"},
+                    "branch": {"type": "string", "description": "New branch name"},
+                    "files": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {"path": {"type": "string"}, "content": {"type": "string"}},
+                            "required": ["path", "content"]
+                        }
+                    },
+                    "commit_message": {"type": "string"}
+                },
+                "required": ["repo", "title", "branch", "files"]
+            },
+            handler=lambda repo, title, branch, files, body="", commit_message="": (
+                github_service.create_pull_request_with_files(
+                    repo, title, body, branch, files, commit_message or title
+                )
+            ),
+            render=lambda url, args: f"Pull request created: {url}" if url else
+                "The pull request could not be created. The repository may not exist, "
+                "or the GitHub token lacks write access.",
+            status=lambda args: f"Creating pull request in {args['repo']}..."
+        ),
+        Tool(
+            name="get_weather",
+            description="Current weather for a place.",
+            parameters={
+                "type": "object",
+                "properties": {"location": {"type": "string", "description": "City name, e.g. 'Paris'"}},
+                "required": ["location"]
+            },
+            handler=search_service.get_weather,
+            render=lambda report, args: report or f"No weather data found for {args['location']}.",
+            status=lambda args: f"Checking the weather in {args['location']}..."
+        ),
+    ])
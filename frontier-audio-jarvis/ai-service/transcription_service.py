@@ -0,0 +1,196 @@
+"""
+Speech-to-text for Jarvis
+Wraps Whisper transcription and the incremental (during-recording) mode
+"""
+
+import asyncio
+import io
+import time
+from typing import Awaitable, Callable, List, Optional
+from openai import AsyncOpenAI
+from log import get_logger
+
+logger = get_logger("transcription")
+
+WHISPER_PROMPT = "The following is a conversation with Jarvis, an AI assistant. The user discusses coding, tech news, pop culture, and current events like the Super Bowl or elections."
+
+# Matroska/WebM Cluster element ID. Everything before the first cluster is the
+# stream header (EBML + Segment info + Tracks), which every segment needs to decode.
+WEBM_CLUSTER_ID = b'\x1f\x43\xb6\x75'
+
+
+class AudioUpload(io.RawIOBase):
+    """
+    Read-only named file object over a memoryview of the recording, so
+    Whisper uploads stream straight from memory: no temp file, no fsync,
+    no full copy of the buffer and nothing left behind in /tmp on errors.
+    """
+
+    def __init__(self, data, name: str = "audio.webm"):
+        self._view = memoryview(data)
+        self._pos = 0
+        self.name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        chunk = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return chunk
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, min(offset, len(self._view)))
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        # Release the export so the underlying bytearray can be cleared/resized again
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+class TranscriptionService:
+    def __init__(self, client: AsyncOpenAI, transcoder=None):
+        self.client = client
+        # Optional audio_processing.Transcoder applied to each upload
+        self.transcoder = transcoder
+
+    async def transcribe(self, audio, prompt: str = WHISPER_PROMPT) -> str:
+        """
+        Transcribe a complete WebM recording with Whisper
+
+        Args:
+            audio: WebM bytes-like object (bytes, bytearray or memoryview); it is
+                uploaded in place, so don't resize it until this returns
+            prompt: Whisper prompt used to bias vocabulary
+
+        Returns:
+            Transcribed text
+        """
+        name = "audio.webm"
+        if self.transcoder:
+            audio, name = await self.transcoder.transcode(audio, name)
+        logger.debug("Sending %d bytes to Whisper API (%s)", len(audio), name)
+        with AudioUpload(audio, name) as audio_file:
+            transcription = await self.client.audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                language="en",
+                prompt=prompt
+            )
+
+        return transcription.text
+
+
+class StreamingTranscriber:
+    """
+    Transcribes a recording in segments while it is still being captured.
+
+    Every `window_seconds` the audio received since the last cut is split off
+    at the most recent WebM cluster boundary, prefixed with the stream header
+    and sent to Whisper in the background. At stop, the tail segment is
+    transcribed and the partial transcripts are stitched in order.
+    """
+
+    def __init__(
+        self,
+        service: TranscriptionService,
+        on_partial: Optional[Callable[[int, str], Awaitable[None]]] = None,
+        window_seconds: float = 5.0,
+        min_segment_bytes: int = 4096
+    ):
+        self.service = service
+        self.on_partial = on_partial
+        self.window_seconds = window_seconds
+        self.min_segment_bytes = min_segment_bytes
+        self.header: Optional[bytes] = None
+        self.segment_start = 0
+        self.segment_started_at = time.monotonic()
+        self.segments: List[asyncio.Task] = []
+
+    def on_audio(self, buffer):
+        """Call after each chunk is appended to the recording buffer (bytearray or AudioBuffer)"""
+        if self.header is None:
+            first_cluster = buffer.find(WEBM_CLUSTER_ID)
+            if first_cluster < 0:
+                return
+            self.header = bytes(buffer[:first_cluster])
+            self.segment_start = first_cluster
+            self.segment_started_at = time.monotonic()
+            return
+
+        if time.monotonic() - self.segment_started_at < self.window_seconds:
+            return
+
+        # Cut at the last cluster that has started, so the segment only holds whole clusters
+        cut = buffer.rfind(WEBM_CLUSTER_ID, self.segment_start + 1)
+        if cut < 0 or cut - self.segment_start < self.min_segment_bytes:
+            return
+
+        self._start_segment(bytes(buffer[self.segment_start:cut]))
+        self.segment_start = cut
+        self.segment_started_at = time.monotonic()
+
+    def skip_to(self, offset: int):
+        """Leave the audio before `offset` (a cluster start, e.g. leading silence) out of the next segment"""
+        if self.header is not None and offset > self.segment_start:
+            self.segment_start = offset
+
+    def _start_segment(self, body: bytes):
+        index = len(self.segments)
+        self.segments.append(asyncio.create_task(self._transcribe_segment(index, self.header + body)))
+
+    async def _transcribe_segment(self, index: int, audio: bytes) -> str:
+        try:
+            text = (await self.service.transcribe(audio)).strip()
+        except Exception as e:
+            logger.error("Error transcribing segment %d: %s", index, e)
+            return ""
+        logger.debug("Partial transcription %d: %s", index, text)
+        if text and self.on_partial:
+            try:
+                await self.on_partial(index, text)
+            except Exception as e:
+                logger.error("Error sending partial transcription: %s", e)
+        return text
+
+    async def finish(self, buffer, end: Optional[int] = None) -> str:
+        """
+        Transcribe whatever is left after the last cut and stitch all segments
+
+        Args:
+            buffer: The recording
+            end: Ignore audio from this offset on (e.g. trailing silence)
+        """
+        end = len(buffer) if end is None else end
+        if self.header is None:
+            # Never saw a cluster; fall back to transcribing the whole recording
+            return await self.service.transcribe(buffer[:end])
+
+        if end > self.segment_start:
+            self._start_segment(bytes(buffer[self.segment_start:end]))
+        texts = await asyncio.gather(*self.segments)
+        return " ".join(text for text in texts if text)
+
+    def cancel(self):
+        """Abandon in-flight segment transcriptions"""
+        for task in self.segments:
+            task.cancel()
@@ -0,0 +1,122 @@
+"""
+Thread-safe TTL + LRU cache with single-flight loading
+Used by the services whose blocking calls run on the I/O thread pool
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Type
+
+
+class TTLCache:
+    """
+    LRU cache where every entry carries its own TTL.
+
+    get_or_load() deduplicates concurrent loads of the same key: the first
+    caller runs the loader, everyone else waits for its result instead of
+    issuing an identical upstream request.
+    """
+
+    def __init__(self, max_entries: int = 1024, default_ttl: float = 300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _get_locked(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None, False
+        self._entries.move_to_end(key)
+        return value, True
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value, found = self._get_locked(key)
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any],
+                    ttl_for: Optional[Callable[[Any], float]] = None,
+                    retry_on: Tuple[Type[BaseException], ...] = ()) -> Any:
+        """
+        Return the cached value for key, or load it once for all concurrent callers.
+
+        Args:
+            key: Cache key
+            loader: Blocking function producing the value on a miss
+            ttl_for: Maps a loaded value to its TTL in seconds (<= 0 means don't cache)
+            retry_on: Failures that belong to the loading caller rather than the key
+                (e.g. its cancellation); waiters then load again themselves
+        """
+        with self._lock:
+            value, found = self._get_locked(key)
+            if found:
+                self.hits += 1
+                return value
+            inflight = self._inflight.get(key)
+            owner = inflight is None
+            if owner:
+                self.misses += 1
+                inflight = Future()
+                self._inflight[key] = inflight
+            else:
+                self.coalesced += 1
+        if not owner:
+            try:
+                return inflight.result()
+            except retry_on:
+                return self.get_or_load(key, loader, ttl_for, retry_on)
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.set_exception(e)
+            raise
+        # Store before releasing the in-flight slot so no caller slips in between
+        self.set(key, value, ttl_for(value) if ttl_for else None)
+        with self._lock:
+            self._inflight.pop(key, None)
+        inflight.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,192 @@
+"""
+Content-addressed cache for synthesized speech
+Two tiers: an in-memory LRU and a size-capped directory of files
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from log import get_logger
+
+logger = get_logger("tts_cache")
+
+
+class TTSCache:
+    """
+    Synthesized audio keyed by sha256 of (normalized text, voice, model, format).
+
+    New audio goes into both tiers. The memory tier holds the most recently
+    used entries up to `memory_bytes`; the disk tier holds up to `disk_bytes`
+    and survives restarts. Disk hits are read whole, off the event loop,
+    and promoted to the memory tier.
+    Both tiers evict least recently used entries first.
+    """
+
+    def __init__(self, memory_bytes: int = 32 * 1024 * 1024, disk_bytes: int = 512 * 1024 * 1024,
+                 directory: Optional[str] = None):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.directory = directory
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # key -> file size, least recent first
+        self._disk_used = 0
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bytes_served": 0}
+        if directory and disk_bytes > 0:
+            self._load_index()
+
+    @staticmethod
+    def key(text: str, voice: str, model: str, audio_format: str = "mp3") -> str:
+        """Hash of the request; text is NFC-normalized with whitespace collapsed (case is kept: it changes pronunciation)"""
+        normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+        return hashlib.sha256("\0".join((normalized, voice, model, audio_format)).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.audio")
+
+    def _load_index(self):
+        """Rebuild the disk index from the directory, oldest (least recently used) first"""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                # Left over from a write interrupted by a crash
+                os.remove(entry.path)
+            elif entry.name.endswith(".audio") and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-len(".audio")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_used += size
+        self._evict_disk()
+        logger.info("TTS disk cache: %d entries, %d bytes in %s", len(self._disk), self._disk_used, self.directory)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Audio for `key` if it is in the memory tier, else None (doesn't block; follow a None with load())"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                self._stats["bytes_served"] += len(data)
+            return data
+
+    def load(self, key: str) -> Optional[bytes]:
+        """
+        Audio for `key` from either tier, or None on a miss
+
+        Blocking: a disk hit reads the whole file (and is promoted to the
+        memory tier), so call it off the event loop.
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                self._stats["bytes_served"] += len(data)
+                return data
+            if key not in self._disk:
+                self._stats["misses"] += 1
+                return None
+            self._disk.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key))  # Recency survives restarts through the mtime
+        except OSError as e:
+            # Evicted or removed behind our back
+            logger.warning("TTS disk cache read failed for %s: %s", key[:12], e)
+            data = None
+        if not data:
+            self._forget_disk(key)
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["disk_hits"] += 1
+            self._stats["bytes_served"] += len(data)
+        self._store_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store audio in both tiers (blocking: writes the disk copy)"""
+        if not data:
+            return
+        with self._lock:
+            self._stats["stores"] += 1
+        self._store_memory(key, data)
+        if not self.directory or len(data) > self.disk_bytes:
+            return
+        path = self._path(key)
+        try:
+            # Write then rename, so a concurrent reader never sees a half-written file
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning("TTS disk cache write failed: %s", e)
+            return
+        with self._lock:
+            self._disk_used += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            self._evict_disk()
+
+    def _store_memory(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_used -= len(previous)
+            self._memory[key] = data
+            self._memory_used += len(data)
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def _evict_disk(self):
+        """Caller holds the lock"""
+        while self._disk_used > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_used -= size
+            self._stats["evictions"] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _forget_disk(self, key: str):
+        with self._lock:
+            size = self._disk.pop(key, None)
+            if size is not None:
+                self._disk_used -= size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                **self._stats,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_used
+            }
+
+
+def create_tts_cache() -> Optional[TTSCache]:
+    """TTS cache configured from TTS_CACHE, TTS_CACHE_MEMORY_BYTES, TTS_CACHE_DISK_BYTES and TTS_CACHE_DIR"""
+    if os.getenv("TTS_CACHE", "true").lower() != "true":
+        return None
+    return TTSCache(
+        memory_bytes=int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024))),
+        disk_bytes=int(os.getenv("TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024))),
+        directory=os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "jarvis-tts-cache")) or None
+    )
@@ -0,0 +1,121 @@
+"""
+TTS model / format / voice selection
+Picks per request by text length, a time-to-first-audio budget and the client's decoders
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+from metrics import registry
+
+# Formats the speech API can return, fastest first byte first (pcm skips encoding entirely)
+FORMATS_BY_LATENCY = ("pcm", "opus", "aac", "mp3")
+# ... and smallest on the wire first (pcm is ~48 KB/s)
+FORMATS_BY_SIZE = ("opus", "aac", "mp3", "pcm")
+VOICES = {"alloy", "ash", "coral", "echo", "fable", "onyx", "nova", "sage", "shimmer"}
+
+# Starting time-to-first-audio estimates until real measurements come in
+PRIOR_FIRST_AUDIO_MS = {"tts-1": 500.0, "tts-1-hd": 1000.0}
+
+tts_first_audio_seconds = registry.summary("jarvis_tts_first_audio_seconds", "Time to first TTS byte per model and format")
+tts_synthesis_seconds = registry.summary("jarvis_tts_synthesis_seconds", "Full TTS synthesis time per model and format")
+
+
+@dataclass(frozen=True)
+class TTSChoice:
+    model: str
+    voice: str
+    format: str
+
+
+class TTSPolicy:
+    """
+    Short replies (<= `short_chars`) are latency-bound: they get the fast
+    model and the fastest format the client can play. Longer ones favour
+    fidelity and bandwidth: the HD model if its estimated time to first
+    audio fits `budget_ms`, and the most compact format.
+
+    A reply is classed by `chars` when the caller knows its full length.
+    Streamed replies are spoken before they are complete, so they are
+    classed by their first sentence alone: most of them get the fast
+    model, even when the reply turns out long.
+
+    Estimates are an exponentially weighted average of measured first-byte
+    latency per (model, format). Estimates for choices not being taken
+    drift back toward their prior, so a model that was slow for a while
+    gets tried again.
+    """
+
+    def __init__(self, budget_ms: float = 1200, short_chars: int = 120, default_voice: str = "shimmer",
+                 fast_model: str = "tts-1", hd_model: str = "tts-1-hd", alpha: float = 0.2, recovery: float = 0.02):
+        self.budget_ms = budget_ms
+        self.short_chars = short_chars
+        self.default_voice = default_voice
+        self.fast_model = fast_model
+        self.hd_model = hd_model
+        self.alpha = alpha
+        self.recovery = recovery
+        self._estimates: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def estimate_ms(self, model: str, audio_format: str) -> float:
+        with self._lock:
+            return self._estimates.get((model, audio_format), PRIOR_FIRST_AUDIO_MS.get(model, 1000.0))
+
+    def choose(self, text: str, formats: Iterable[str], voice: Optional[str] = None,
+               chars: Optional[int] = None) -> TTSChoice:
+        """
+        Args:
+            text: Text to synthesize
+            formats: Formats the client can decode
+            voice: Voice the client asked for, if any
+            chars: Length of the whole reply `text` belongs to, if known (default: len(text))
+
+        Returns:
+            The model, voice and response format to request
+        """
+        formats = set(formats)
+        short = (len(text) if chars is None else chars) <= self.short_chars
+        order = FORMATS_BY_LATENCY if short else FORMATS_BY_SIZE
+        audio_format = next((f for f in order if f in formats), "mp3")
+        model = self.fast_model
+        if not short and self.estimate_ms(self.hd_model, audio_format) <= self.budget_ms:
+            model = self.hd_model
+        self._recover(model)
+        return TTSChoice(model=model, voice=voice if voice in VOICES else self.default_voice, format=audio_format)
+
+    def _recover(self, chosen_model: str):
+        with self._lock:
+            for key, estimate in self._estimates.items():
+                if key[0] != chosen_model:
+                    prior = PRIOR_FIRST_AUDIO_MS.get(key[0], 1000.0)
+                    self._estimates[key] = estimate + (prior - estimate) * self.recovery
+
+    def record(self, choice: TTSChoice, first_audio_seconds: float, total_seconds: float):
+        """Feed back a measured synthesis"""
+        labels = {"model": choice.model, "format": choice.format}
+        tts_first_audio_seconds.observe(first_audio_seconds, **labels)
+        tts_synthesis_seconds.observe(total_seconds, **labels)
+        key = (choice.model, choice.format)
+        with self._lock:
+            previous = self._estimates.get(key)
+            sample = first_audio_seconds * 1000
+            self._estimates[key] = sample if previous is None else previous + self.alpha * (sample - previous)
+
+    def stats(self) -> Dict[tuple, float]:
+        """Current estimate (ms) per (model, format)"""
+        with self._lock:
+            return dict(self._estimates)
+
+
+def create_tts_policy() -> Optional[TTSPolicy]:
+    """Configured from TTS_POLICY, TTS_LATENCY_BUDGET_MS, TTS_SHORT_TEXT_CHARS and TTS_VOICE"""
+    if os.getenv("TTS_POLICY", "true").lower() != "true":
+        return None
+    return TTSPolicy(
+        budget_ms=float(os.getenv("TTS_LATENCY_BUDGET_MS", "1200")),
+        short_chars=int(os.getenv("TTS_SHORT_TEXT_CHARS", "120")),
+        default_voice=os.getenv("TTS_VOICE", "shimmer")
+    )
@@ -1,31 +1,300 @@
-from openai import OpenAI
-import io
+from openai import AsyncOpenAI
+import asyncio
+import contextlib
+import json
+import re
+import time
+from typing import Iterable, List, Optional
+from log import get_logger
+from tts_cache import TTSCache
+from tts_policy import TTSChoice, TTSPolicy
+
+logger = get_logger("voice")
+
+# The speech API's "pcm" format: raw 16-bit little-endian mono samples at this rate
+PCM_SAMPLE_RATE = 24000
+
+# Not worth speaking: fenced code blocks (an unclosed one runs to the end) and URLs
+_CODE_BLOCK = re.compile(r"```.*?(?:```|$)", re.DOTALL)
+_CLOSED_CODE_BLOCK = re.compile(r"```.*?```", re.DOTALL)
+_MARKDOWN_LINK = re.compile(r"\[([^\]]+)\]\((?:https?://|www\.)[^)]*\)")
+_URL = re.compile(r"(?:https?://|www\.)[^\s)]*[^\s).,!?;:'\"]")
+
+
+def speakable(text: str) -> str:
+    """Text with code blocks removed and URLs read as "the link" (markdown links keep their label)"""
+    text = _CODE_BLOCK.sub(" ", text)
+    text = _MARKDOWN_LINK.sub(r"\1", text)
+    text = _URL.sub("the link", text)
+    return re.sub(r"[ \t]+", " ", text).strip()
+
 
 class VoiceService:
-    def __init__(self, client: OpenAI):
+    def __init__(self, client: AsyncOpenAI, cache: Optional[TTSCache] = None,
+                 model: str = "tts-1-hd", voice: str = "shimmer", policy: Optional[TTSPolicy] = None):
         self.client = client
+        self.cache = cache
+        self.model = model
+        self.voice = voice
+        self.policy = policy
+
+    def choose(self, text: str, formats: Iterable[str] = ("mp3",), voice: Optional[str] = None,
+               chars: Optional[int] = None) -> TTSChoice:
+        """Model, voice and format for `text`; without a policy the configured model and voice as MP3"""
+        if self.policy:
+            return self.policy.choose(text, formats, voice, chars)
+        return TTSChoice(model=self.model, voice=self.voice, format="mp3")
 
-    def generate_speech(self, text):
+    async def stream_speech(self, text, chunk_size: int = 4096, choice: Optional[TTSChoice] = None):
         """
-        Generates speech from text using OpenAI TTS.
-        Returns audio bytes (MP3 format).
+        Streams speech from OpenAI TTS, yielding audio chunks as they arrive
+        so playback can start before synthesis finishes.
+        Text that was synthesized before is served from the cache instead.
+
+        Args:
+            text: Text to speak
+            chunk_size: Chunk length to yield
+            choice: Model, voice and format (default: choose(text), i.e. MP3)
         """
+        choice = choice or self.choose(text)
+        key = self.cache.key(text, choice.voice, choice.model, choice.format) if self.cache else None
+        cached = self.cache.get(key) if key else None
+        if key and cached is None:
+            cached = await asyncio.to_thread(self.cache.load, key)
+        if cached is not None:
+            logger.debug("TTS cache hit for: %s...", text[:50])
+            view = memoryview(cached)
+            for i in range(0, len(view), chunk_size):
+                yield view[i:i + chunk_size]
+            return
+
         try:
-            print(f"Generating speech for: {text[:50]}...")
-            response = self.client.audio.speech.create(
-                model="tts-1-hd",
-                voice="shimmer",
-                input=text
-            )
-            
-            # Get audio data as bytes
-            audio_data = io.BytesIO()
-            for chunk in response.iter_bytes():
-                audio_data.write(chunk)
-            
-            audio_data.seek(0)
-            return audio_data.read()
+            logger.debug("Generating speech (%s, %s) for: %s...", choice.model, choice.format, text[:50])
+            parts = []
+            started = time.perf_counter()
+            first_audio = None
+            async with self.client.audio.speech.with_streaming_response.create(
+                model=choice.model,
+                voice=choice.voice,
+                input=text,
+                response_format=choice.format
+            ) as response:
+                async for chunk in response.iter_bytes(chunk_size):
+                    if first_audio is None:
+                        first_audio = time.perf_counter() - started
+                    if key:
+                        parts.append(chunk)
+                    yield chunk
+            if self.policy and first_audio is not None:
+                self.policy.record(choice, first_audio, time.perf_counter() - started)
+            # Only complete syntheses are cached (an interrupted stream never gets here)
+            if key:
+                await asyncio.to_thread(self.cache.put, key, b"".join(parts))
             
         except Exception as e:
-            print(f"TTS error: {e}")
-            return None
+            logger.error("TTS error: %s", e)
+
+
+class AudioFrameSender:
+    """
+    Sends audio streams to the client framed as:
+        {"type": "audio_start", "seq": n, "format": "mp3"}
+        <binary chunk> ... <binary chunk>
+        {"type": "audio_end", "seq": n, "chunks": k, "bytes": total}
+    The end frame carries "aborted": true if the stream was cut short. seq
+    increases per stream over the life of the connection, so the client can
+    play streams back in order. "pcm" streams also carry "sample_rate".
+
+    `formats` and `voice` are what the client says it can decode and would
+    like to hear; by default only MP3 is sent.
+    """
+
+    def __init__(self, send_text, send_bytes, audio_format: str = "mp3"):
+        self.send_text = send_text
+        self.send_bytes = send_bytes
+        self.audio_format = audio_format
+        self.formats = {audio_format}
+        self.voice = None
+        self.seq = 0
+        # Optional hook called when the first chunk of a stream goes out (latency tracing)
+        self.on_first_audio = None
+
+    async def send_stream(self, chunks, audio_format: Optional[str] = None) -> int:
+        """Forward an async iterator of audio chunks in `audio_format` (default: audio_format); returns bytes sent"""
+        audio_format = audio_format or self.audio_format
+        seq = None
+        count = 0
+        total = 0
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if seq is None:
+                    # Start frame goes out lazily so failed syntheses send nothing
+                    seq = self.seq
+                    self.seq += 1
+                    start = {"type": "audio_start", "seq": seq, "format": audio_format}
+                    if audio_format == "pcm":
+                        start["sample_rate"] = PCM_SAMPLE_RATE
+                    await self.send_text(json.dumps(start))
+                    if self.on_first_audio:
+                        self.on_first_audio()
+                await self.send_bytes(chunk)
+                count += 1
+                total += len(chunk)
+        except BaseException:
+            # Cancelled or failed part-way: close the stream anyway, or the client
+            # keeps waiting for it and plays nothing after it
+            if seq is not None:
+                with contextlib.suppress(Exception):
+                    await self.send_text(json.dumps({
+                        "type": "audio_end",
+                        "seq": seq,
+                        "chunks": count,
+                        "bytes": total,
+                        "aborted": True
+                    }))
+            raise
+        
+        if seq is not None:
+            await self.send_text(json.dumps({
+                "type": "audio_end",
+                "seq": seq,
+                "chunks": count,
+                "bytes": total
+            }))
+        return total
+
+
+class SentenceBuffer:
+    """
+    Accumulates streamed LLM tokens and releases complete sentences.
+    A sentence ends at . ! ? (plus closing quotes/brackets) followed by
+    whitespace, or at a blank line. Common abbreviations don't end a sentence.
+    Code blocks are dropped (text after an opening fence is held until it
+    closes) and URLs are removed from the sentences released.
+    """
+
+    _boundary = re.compile(r'[.!?]+["\')\]]*\s+|\n\s*\n')
+    _abbreviations = {"mr.", "mrs.", "ms.", "dr.", "st.", "vs.", "etc.", "e.g.", "i.e.", "jr.", "sr."}
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, token: str) -> list:
+        """Add a token and return any sentences it completed"""
+        self._pending = _CLOSED_CODE_BLOCK.sub("\n\n", self._pending + token)
+        fence = self._pending.find("```")
+        sentences = []
+        start = 0
+        for match in self._boundary.finditer(self._pending, 0, len(self._pending) if fence < 0 else fence):
+            candidate = speakable(self._pending[start:match.end()])
+            words = candidate.split()
+            if words and words[-1].lower() in self._abbreviations:
+                continue
+            if any(ch.isalnum() for ch in candidate):
+                sentences.append(candidate)
+            start = match.end()
+        self._pending = self._pending[start:]
+        return sentences
+
+    def flush(self):
+        """Return whatever text is left once the stream has ended"""
+        remainder = speakable(self._pending)
+        self._pending = ""
+        return remainder if any(ch.isalnum() for ch in remainder) else None
+
+
+def split_for_speech(text: str, max_chars: int = 300) -> List[str]:
+    """
+    Split a complete response into speakable parts that can be synthesized
+    concurrently: whole sentences packed up to `max_chars`, never across a
+    paragraph. The first sentence stands alone so its audio is ready first.
+    """
+    parts = []
+    for paragraph in re.split(r"\n\s*\n", _CODE_BLOCK.sub("\n\n", text)):
+        buffer = SentenceBuffer()
+        sentences = buffer.feed(paragraph + "\n\n")
+        remainder = buffer.flush()
+        if remainder:
+            sentences.append(remainder)
+        current = ""
+        for sentence in sentences:
+            if current and (not parts or len(current) + 1 + len(sentence) > max_chars):
+                parts.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            parts.append(current)
+    return parts
+
+
+class SpeechStream:
+    """
+    Synthesizes sentences concurrently (bounded) and streams the audio
+    to the client strictly in submission order. The sentence at the head
+    of the queue is forwarded chunk by chunk as it arrives; later ones
+    buffer until it is their turn.
+
+    Model, voice and format are chosen once, for the first sentence, and
+    kept for the rest of the reply so its quality and the client's decoder
+    don't change mid-answer. `expected_chars` is the reply's length when it
+    is known up front; otherwise (a streamed reply) the first sentence
+    decides, which mostly means the fast model (see TTSPolicy).
+    """
+
+    def __init__(self, voice_service: VoiceService, frames: AudioFrameSender, max_concurrency: int = 3,
+                 expected_chars: Optional[int] = None):
+        self.voice_service = voice_service
+        self.frames = frames
+        self.expected_chars = expected_chars
+        self.choice: Optional[TTSChoice] = None
+        self.segments_sent = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queue = asyncio.Queue()
+        self._pending = []
+        self._sender = asyncio.create_task(self._send_in_order())
+
+    def submit(self, text: str):
+        """Start synthesizing a sentence without waiting for earlier ones"""
+        if self.choice is None:
+            self.choice = self.voice_service.choose(text, self.frames.formats, self.frames.voice, self.expected_chars)
+        chunks = asyncio.Queue()
+        self._pending.append(asyncio.create_task(self._synthesize(text, self.choice, chunks)))
+        self._queue.put_nowait((chunks, self.choice.format))
+
+    async def _synthesize(self, text, choice: TTSChoice, chunks: asyncio.Queue):
+        try:
+            async with self._semaphore:
+                async for chunk in self.voice_service.stream_speech(text, choice=choice):
+                    chunks.put_nowait(chunk)
+        finally:
+            chunks.put_nowait(None)
+
+    async def _drain(self, chunks: asyncio.Queue):
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    async def _send_in_order(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            chunks, audio_format = item
+            if await self.frames.send_stream(self._drain(chunks), audio_format):
+                self.segments_sent += 1
+
+    async def finish(self):
+        """Wait until every submitted sentence has been sent"""
+        self._queue.put_nowait(None)
+        await self._sender
+
+    def cancel(self):
+        """Drop any synthesis still in flight"""
+        for task in self._pending:
+            task.cancel()
+        self._sender.cancel()
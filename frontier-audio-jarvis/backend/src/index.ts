@@ -10,6 +10,27 @@ const app = express();
 const port = process.env.PORT || 3001;
 const AI_SERVICE_URL = process.env.AI_SERVICE_URL || 'ws://localhost:8000/ws/ai';
 
+// Log levels; per-frame messages are debug-only and sampled 1 in LOG_SAMPLE_EVERY
+const LOG_LEVELS = { debug: 10, info: 20, warn: 30, error: 40 } as const;
+type LogLevel = keyof typeof LOG_LEVELS;
+const logThreshold = LOG_LEVELS[(process.env.LOG_LEVEL || 'info').toLowerCase() as LogLevel] ?? LOG_LEVELS.info;
+const LOG_SAMPLE_EVERY = Math.max(1, Number(process.env.LOG_SAMPLE_EVERY) || 50);
+const sampleCounts = new Map<string, number>();
+
+const log = {
+    debug: (...args: unknown[]) => { if (logThreshold <= LOG_LEVELS.debug) console.log(...args); },
+    info: (...args: unknown[]) => { if (logThreshold <= LOG_LEVELS.info) console.log(...args); },
+    warn: (...args: unknown[]) => { if (logThreshold <= LOG_LEVELS.warn) console.warn(...args); },
+    error: (...args: unknown[]) => { if (logThreshold <= LOG_LEVELS.error) console.error(...args); },
+    // Message is built lazily so disabled hot-path logs cost one comparison
+    sampled: (key: string, message: () => string) => {
+        if (logThreshold > LOG_LEVELS.debug) return;
+        const count = sampleCounts.get(key) || 0;
+        sampleCounts.set(key, count + 1);
+        if (count % LOG_SAMPLE_EVERY === 0) console.log(`${message()} (sampled 1/${LOG_SAMPLE_EVERY})`);
+    }
+};
+
 // CORS configuration for production
 const allowedOrigins = [
     'http://localhost:3000',
@@ -36,7 +57,7 @@ const server = http.createServer(app);
 const wss = new WebSocketServer({ server });
 
 wss.on('connection', (ws, req) => {
-    console.log(`Client connected. Active connections: ${wss.clients.size}`);
+    log.info(`Client connected. Active connections: ${wss.clients.size}`);
 
     // Extract session_id from request URL
     const url = new URL(req.url || '', `http://${req.headers.host}`);
@@ -47,32 +68,39 @@ wss.on('connection', (ws, req) => {
     if (sessionId) {
         aiServiceUrl.searchParams.append('session_id', sessionId);
     }
+    // Playback capabilities (which TTS formats the client decodes, preferred voice)
+    for (const param of ['audio_formats', 'voice']) {
+        const value = url.searchParams.get(param);
+        if (value) {
+            aiServiceUrl.searchParams.append(param, value);
+        }
+    }
 
-    console.log(`Connecting to AI service at: ${aiServiceUrl.toString()}`);
+    log.info(`Connecting to AI service at: ${aiServiceUrl.toString()}`);
     const aiService = new WebSocket(aiServiceUrl.toString());
 
     aiService.on('open', () => {
-        console.log('Connected to AI Service');
+        log.info('Connected to AI Service');
         ws.send(JSON.stringify({ type: 'system', message: 'AI Service Connected' }));
     });
 
-    aiService.on('message', (data) => {
+    aiService.on('message', (data, isBinary) => {
         // Forward AI response to Frontend
-        // Data from AI service is likely JSON text string
+        // Text frames are JSON events; binary frames are audio chunks and must stay binary
         if (ws.readyState === WebSocket.OPEN) {
-            ws.send(data.toString());
+            ws.send(isBinary ? data : data.toString(), { binary: isBinary });
         }
     });
 
     aiService.on('error', (error) => {
-        console.error('AI Service error:', error);
+        log.error('AI Service error:', error);
         if (ws.readyState === WebSocket.OPEN) {
             ws.send(JSON.stringify({ type: 'error', message: 'AI Service Unavailable' }));
         }
     });
 
     aiService.on('close', () => {
-        console.log('Disconnected from AI Service');
+        log.info('Disconnected from AI Service');
     });
 
     ws.on('message', (message, isBinary) => {
@@ -80,13 +108,15 @@ wss.on('connection', (ws, req) => {
         if (aiService.readyState === WebSocket.OPEN) {
             if (isBinary) {
                 // Binary data (audio chunks) - forward as-is
-                const size = Buffer.isBuffer(message) ? message.length : (message as ArrayBuffer).byteLength;
-                console.log(`Forwarding binary data: ${size} bytes`);
+                log.sampled('forward_binary', () => {
+                    const size = Buffer.isBuffer(message) ? message.length : (message as ArrayBuffer).byteLength;
+                    return `Forwarding binary data: ${size} bytes`;
+                });
                 aiService.send(message);
             } else {
                 // Text data (JSON commands like stop_recording) - forward as text
                 const textMessage = message.toString();
-                console.log(`Forwarding text message: ${textMessage}`);
+                log.debug(`Forwarding text message: ${textMessage}`);
                 aiService.send(textMessage);
             }
         }
@@ -94,7 +124,7 @@ wss.on('connection', (ws, req) => {
 
 
     ws.on('close', () => {
-        console.log(`Client disconnected. Active connections: ${wss.clients.size}`);
+        log.info(`Client disconnected. Active connections: ${wss.clients.size}`);
         if (aiService.readyState === WebSocket.OPEN) {
             aiService.close();
         }
@@ -106,5 +136,5 @@ app.get('/health', (req, res) => {
 });
 
 server.listen(port, () => {
-    console.log(`Backend server running on http://localhost:${port}`);
+    log.info(`Backend server running on http://localhost:${port}`);
 });
@@ -6,7 +6,7 @@ import { useSoundEffects } from '@/hooks/useSoundEffects';
 import { useState, useEffect, useRef } from 'react';
 
 export default function Home() {
-  const { connectionState, messages, sendMessage } = useWebSocket();
+  const { connectionState, messages, sendMessage, isPlayingAudio, hasServerAudio, stopAudio, setAudioMuted } = useWebSocket();
   const [isRecording, setIsRecording] = useState(false);
   const [isProcessing, setIsProcessing] = useState(false);
   const [isMuted, setIsMuted] = useState(false);
@@ -27,6 +27,14 @@ export default function Home() {
 
   // Filter out repetitive "Processed audio" messages to reduce spam
   const filteredMessages = messages.filter((msg, idx, arr) => {
+    // Partial transcriptions are only shown until the final transcription arrives
+    if (msg.type === 'transcription' && msg.partial) {
+      for (let i = idx + 1; i < arr.length; i++) {
+        if (arr[i].type === 'transcription' && !arr[i].partial) return false;
+      }
+      return true;
+    }
+
     // Keep system messages, errors, transcriptions, and status messages
     if (msg.type === 'system' || msg.type === 'error' || msg.type === 'transcription' || msg.type === 'ai_response') return true;
 
@@ -52,8 +60,10 @@ export default function Home() {
         setIsProcessing(false);
         playSound('success');
 
-        // Text-to-Speech for AI response
-        if (!isMuted && lastMessage.text) {
+        // Text-to-Speech for AI response (server audio streams in separately when available)
+        if (hasServerAudio) {
+          // Continuous mode restarts once server playback finishes (see effect below)
+        } else if (!isMuted && lastMessage.text) {
           // Cancel any ongoing speech first
           window.speechSynthesis.cancel();
 
@@ -81,12 +91,34 @@ export default function Home() {
             setIsRecording(true);
           }, 1000);
         }
+      } else if (lastMessage.type === 'utterance_end') {
+        // Server-side VAD heard the end of speech and is already processing the turn
+        playSound('stop');
+        stopRecording();
+        setIsRecording(false);
       } else if (lastMessage.type === 'error') {
         setIsProcessing(false);
         playSound('error');
       }
     }
-  }, [messages, isMuted, playSound, isContinuousMode, startRecording]);
+  }, [messages, isMuted, playSound, isContinuousMode, startRecording, stopRecording, hasServerAudio]);
+
+  // Continuous Mode with server audio: restart recording once playback drains
+  const wasPlayingAudioRef = useRef(false);
+  useEffect(() => {
+    if (wasPlayingAudioRef.current && !isPlayingAudio && isContinuousMode && !isRecording) {
+      setTimeout(() => {
+        playSound('start');
+        startRecording();
+        setIsRecording(true);
+      }, 500);
+    }
+    wasPlayingAudioRef.current = isPlayingAudio;
+  }, [isPlayingAudio, isContinuousMode, isRecording, playSound, startRecording]);
+
+  useEffect(() => {
+    setAudioMuted(isMuted);
+  }, [isMuted, setAudioMuted]);
 
   // Passive Listening (Wake Word) Logic
   useEffect(() => {
@@ -224,6 +256,7 @@ export default function Home() {
   const handleInterrupt = () => {
     // Send interrupt signal to backend
     sendMessage(JSON.stringify({ type: 'interrupt' }));
+    stopAudio();
     setIsProcessing(false);
   };
 
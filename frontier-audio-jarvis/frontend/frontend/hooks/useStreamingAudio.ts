@@ -0,0 +1,245 @@
+import { useCallback, useEffect, useRef, useState } from 'react';
+
+// Server audio framing: audio_start (seq, format) -> binary chunks -> audio_end
+const MIME_TYPES: Record<string, string> = {
+    mp3: 'audio/mpeg',
+    aac: 'audio/aac',
+    opus: 'audio/ogg; codecs=opus',
+    flac: 'audio/flac',
+    wav: 'audio/wav',
+};
+
+const canStream = (mimeType: string) =>
+    typeof window !== 'undefined' && 'MediaSource' in window && MediaSource.isTypeSupported(mimeType);
+
+// Formats to ask the server for: ones that can start playing before the stream ends.
+// "pcm" (raw 16-bit mono samples) is played through Web Audio.
+export function streamableFormats(): string[] {
+    if (typeof window === 'undefined') return ['mp3'];
+    const formats = Object.keys(MIME_TYPES).filter((format) => canStream(MIME_TYPES[format]));
+    if ('AudioContext' in window) formats.push('pcm');
+    return formats.includes('mp3') ? formats : [...formats, 'mp3'];
+}
+
+interface PcmPlayback {
+    context: AudioContext;
+    nextTime: number;
+    // Odd trailing byte of a chunk, completed by the next one
+    carry: Uint8Array | null;
+    sources: Set<AudioBufferSourceNode>;
+    done: () => void;
+}
+
+interface AudioStream {
+    seq: number;
+    mimeType: string;
+    chunks: ArrayBuffer[];
+    ended: boolean;
+    // Raw PCM streams only
+    sampleRate?: number;
+    pcm?: PcmPlayback;
+    // Set once the stream starts playing through MediaSource
+    sourceBuffer?: SourceBuffer;
+    mediaSource?: MediaSource;
+    appended: number;
+}
+
+// Schedule newly arrived PCM chunks back to back on the Web Audio clock
+function schedulePcm(stream: AudioStream) {
+    const pcm = stream.pcm!;
+    while (stream.appended < stream.chunks.length) {
+        let bytes = new Uint8Array(stream.chunks[stream.appended++]);
+        if (pcm.carry) {
+            const joined = new Uint8Array(pcm.carry.length + bytes.length);
+            joined.set(pcm.carry);
+            joined.set(bytes, pcm.carry.length);
+            bytes = joined;
+        }
+        const usable = bytes.length - (bytes.length % 2);
+        pcm.carry = usable < bytes.length ? bytes.slice(usable) : null;
+        if (!usable) continue;
+
+        const samples = new Int16Array(bytes.slice(0, usable).buffer);
+        const buffer = pcm.context.createBuffer(1, samples.length, stream.sampleRate!);
+        const channel = buffer.getChannelData(0);
+        for (let i = 0; i < samples.length; i++) channel[i] = samples[i] / 32768;
+
+        const source = pcm.context.createBufferSource();
+        source.buffer = buffer;
+        source.connect(pcm.context.destination);
+        pcm.nextTime = Math.max(pcm.nextTime, pcm.context.currentTime);
+        source.start(pcm.nextTime);
+        pcm.nextTime += buffer.duration;
+        pcm.sources.add(source);
+        source.onended = () => {
+            pcm.sources.delete(source);
+            if (stream.ended && pcm.sources.size === 0) pcm.done();
+        };
+    }
+    if (stream.ended && pcm.sources.size === 0) pcm.done();
+}
+
+export function useStreamingAudio() {
+    const [isPlaying, setIsPlaying] = useState(false);
+    const [hasServerAudio, setHasServerAudio] = useState(false);
+
+    const queueRef = useRef<AudioStream[]>([]);
+    const receivingRef = useRef<AudioStream | null>(null);
+    const audioRef = useRef<HTMLAudioElement | null>(null);
+    const pcmRef = useRef<PcmPlayback | null>(null);
+    const audioContextRef = useRef<AudioContext | null>(null);
+    const mutedRef = useRef(false);
+
+    // Append any chunks that arrived since the last append (one at a time, as SourceBuffer requires)
+    const pump = useCallback((stream: AudioStream) => {
+        if (stream.pcm) {
+            schedulePcm(stream);
+            return;
+        }
+        const { sourceBuffer, mediaSource } = stream;
+        if (!sourceBuffer || !mediaSource || sourceBuffer.updating || mediaSource.readyState !== 'open') return;
+        if (stream.appended < stream.chunks.length) {
+            sourceBuffer.appendBuffer(stream.chunks[stream.appended++]);
+        } else if (stream.ended) {
+            mediaSource.endOfStream();
+        }
+    }, []);
+
+    const playNext = useCallback(() => {
+        const stream = queueRef.current[0];
+        if (!stream || audioRef.current || pcmRef.current) return;
+        if (mutedRef.current) {
+            queueRef.current.shift();
+            playNext();
+            return;
+        }
+
+        if (stream.sampleRate) {
+            const context = audioContextRef.current ?? (audioContextRef.current = new AudioContext());
+            context.resume().catch(() => {});
+            let finished = false;
+            stream.pcm = {
+                context,
+                // Small lead so the first chunks don't underrun
+                nextTime: context.currentTime + 0.05,
+                carry: null,
+                sources: new Set(),
+                done: () => {
+                    if (finished) return;
+                    finished = true;
+                    pcmRef.current = null;
+                    queueRef.current.shift();
+                    if (queueRef.current.length === 0) setIsPlaying(false);
+                    playNext();
+                },
+            };
+            pcmRef.current = stream.pcm;
+            setIsPlaying(true);
+            pump(stream);
+            return;
+        }
+
+        let audio: HTMLAudioElement;
+        if (canStream(stream.mimeType)) {
+            // Start playback while the rest of the stream is still arriving
+            const mediaSource = new MediaSource();
+            stream.mediaSource = mediaSource;
+            audio = new Audio(URL.createObjectURL(mediaSource));
+            mediaSource.addEventListener('sourceopen', () => {
+                stream.sourceBuffer = mediaSource.addSourceBuffer(stream.mimeType);
+                stream.sourceBuffer.addEventListener('updateend', () => pump(stream));
+                pump(stream);
+            });
+        } else if (stream.ended) {
+            audio = new Audio(URL.createObjectURL(new Blob(stream.chunks, { type: stream.mimeType })));
+        } else {
+            // No MediaSource support for this format: wait for audio_end
+            return;
+        }
+
+        const finish = () => {
+            URL.revokeObjectURL(audio.src);
+            audioRef.current = null;
+            queueRef.current.shift();
+            if (queueRef.current.length === 0) setIsPlaying(false);
+            playNext();
+        };
+        audio.onended = finish;
+        audio.onerror = finish;
+        audioRef.current = audio;
+        setIsPlaying(true);
+        audio.play().catch((e) => {
+            console.error('Error playing audio:', e);
+            finish();
+        });
+    }, [pump]);
+
+    // No more chunks will arrive: let playback finish and move on to the next stream
+    const endStream = useCallback((stream: AudioStream) => {
+        stream.ended = true;
+        if (receivingRef.current === stream) receivingRef.current = null;
+        pump(stream);
+        playNext();
+    }, [pump, playNext]);
+
+    const handleAudioStart = useCallback((seq: number, format = 'mp3', sampleRate?: number) => {
+        // A stream the server never ended (e.g. its turn was cancelled) would block the queue forever
+        if (receivingRef.current) endStream(receivingRef.current);
+        const stream: AudioStream = {
+            seq,
+            mimeType: MIME_TYPES[format] || MIME_TYPES.mp3,
+            chunks: [],
+            ended: false,
+            appended: 0,
+        };
+        if (format === 'pcm') stream.sampleRate = sampleRate || 24000;
+        receivingRef.current = stream;
+        queueRef.current.push(stream);
+        setHasServerAudio(true);
+        playNext();
+    }, [endStream, playNext]);
+
+    const handleAudioChunk = useCallback((chunk: ArrayBuffer) => {
+        const stream = receivingRef.current;
+        if (!stream) return;
+        stream.chunks.push(chunk);
+        pump(stream);
+    }, [pump]);
+
+    // Also sent with "aborted" when the server stops a stream part-way; what arrived still plays
+    const handleAudioEnd = useCallback((seq: number) => {
+        const stream = receivingRef.current;
+        if (!stream || stream.seq !== seq) return;
+        endStream(stream);
+    }, [endStream]);
+
+    const stop = useCallback(() => {
+        audioRef.current?.pause();
+        audioRef.current = null;
+        pcmRef.current?.sources.forEach((source) => {
+            source.onended = null;
+            source.stop();
+        });
+        pcmRef.current = null;
+        queueRef.current = [];
+        receivingRef.current = null;
+        setIsPlaying(false);
+    }, []);
+
+    const setMuted = useCallback((muted: boolean) => {
+        mutedRef.current = muted;
+        if (muted) stop();
+    }, [stop]);
+
+    useEffect(() => stop, [stop]);
+
+    return {
+        isPlaying,
+        hasServerAudio,
+        handleAudioStart,
+        handleAudioChunk,
+        handleAudioEnd,
+        stop,
+        setMuted,
+    };
+}
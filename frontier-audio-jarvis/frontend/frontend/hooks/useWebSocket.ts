@@ -1,4 +1,5 @@
 import { useEffect, useRef, useState, useCallback } from 'react';
+import { streamableFormats, useStreamingAudio } from './useStreamingAudio';
 
 export type ConnectionState = 'connecting' | 'connected' | 'disconnected' | 'error';
 
@@ -9,6 +10,8 @@ export interface Message {
     timestamp?: number;
     has_sources?: boolean;
     source_type?: string;
+    partial?: boolean;
+    segment?: number;
 }
 
 export function useWebSocket(url?: string) {
@@ -20,6 +23,7 @@ export function useWebSocket(url?: string) {
     const wsRef = useRef<WebSocket | null>(null);
     const reconnectTimeoutRef = useRef<NodeJS.Timeout | undefined>(undefined);
     const sessionIdRef = useRef<string>('');
+    const audio = useStreamingAudio();
 
     // Initialize session ID
     useEffect(() => {
@@ -41,7 +45,11 @@ export function useWebSocket(url?: string) {
         if (sessionIdRef.current) {
             wsUrlObj.searchParams.append('session_id', sessionIdRef.current);
         }
+        // Lets the server pick a TTS format this browser can play as it streams
+        wsUrlObj.searchParams.append('audio_formats', streamableFormats().join(','));
         const ws = new WebSocket(wsUrlObj.toString());
+        // ArrayBuffers arrive synchronously, which keeps audio chunks in order
+        ws.binaryType = 'arraybuffer';
 
         ws.onopen = () => {
             console.log('WebSocket connected');
@@ -50,17 +58,22 @@ export function useWebSocket(url?: string) {
 
         ws.onmessage = async (event) => {
             try {
-                // Handle binary audio data
-                if (event.data instanceof Blob) {
-                    console.log('Received audio data, playing...');
-                    const audioUrl = URL.createObjectURL(event.data);
-                    const audio = new Audio(audioUrl);
-                    audio.play().catch(e => console.error('Error playing audio:', e));
+                // Handle binary audio chunks (framed by audio_start / audio_end)
+                if (event.data instanceof ArrayBuffer) {
+                    audio.handleAudioChunk(event.data);
                     return;
                 }
 
                 // Handle text data (JSON)
                 const data = JSON.parse(event.data);
+                if (data.type === 'audio_start') {
+                    audio.handleAudioStart(data.seq, data.format, data.sample_rate);
+                    return;
+                }
+                if (data.type === 'audio_end') {
+                    audio.handleAudioEnd(data.seq);
+                    return;
+                }
                 const message: Message = {
                     ...data,
                     timestamp: Date.now(),
@@ -134,5 +147,9 @@ export function useWebSocket(url?: string) {
         sendMessage,
         connect,
         disconnect,
+        isPlayingAudio: audio.isPlaying,
+        hasServerAudio: audio.hasServerAudio,
+        stopAudio: audio.stop,
+        setAudioMuted: audio.setMuted,
     };
 }